@@ -1,6 +1,7 @@
 import streamlit as st
 from auth import init_session_state, sign_out
-from modules import auth_pages, dashboard, students, teachers, classrooms, groups, payments, schedule, attendance, profile, trackers
+from query_monitor import start_page_log, stop_page_log, show_debug_panel
+from page_registry import pages_for_role, get_page, load_page
 
 # Configuration de la page
 st.set_page_config(
@@ -32,6 +33,8 @@ elif 'logged_in' not in st.session_state:
 
 # Page de connexion/inscription
 if not st.session_state.authenticated:
+    from modules import auth_pages
+
     if st.session_state.show_signup:
         auth_pages.show_signup()
     elif st.session_state.show_reset:
@@ -46,36 +49,19 @@ else:
         st.markdown(f"*Rôle: {st.session_state.user_role}*")
         st.divider()
 
-        # Menu de navigation selon le rôle
+        # Menu de navigation selon le rôle (première page par défaut)
+        page = st.radio(
+            "Navigation",
+            [p['label'] for p in pages_for_role(st.session_state.user_role)],
+            index=0
+        )
+
+        st.divider()
         if st.session_state.user_role == "admin":
-            page = st.radio(
-                "Navigation",
-                [
-                    "📊 Dashboard",
-                    "👥 Étudiants",
-                    "💰 Paiements",
-                    "📈 Suivi de Caisse",
-                    "📚 Groupes",
-                    "👨‍🏫 Enseignants",
-                    "🏫 Salles",
-                    "📅 Planning",
-                    "✅ Présences",
-                    "👤 Mon Profil"
-                ],
-                index=0  # Dashboard par défaut
-            )
+            debug_queries = st.toggle("🐞 Détail des requêtes", key="debug_queries")
         else:
-            page = st.radio(
-                "Navigation",
-                [
-                    "📅 Mon Planning",
-                    "✅ Présences",
-                    "👤 Mon Profil"
-                ],
-                index=0  # Mon Planning par défaut
-            )
+            debug_queries = False
 
-        st.divider()
         if st.button("Déconnexion", width="stretch"):
             sign_out()
             st.session_state.authenticated = False
@@ -87,31 +73,22 @@ else:
                 del st.session_state.teacher_id
             st.rerun()
 
-    # Contenu principal selon la page sélectionnée
+    # Contenu principal selon la page sélectionnée (module importé à la première visite)
+    page_entry = get_page(page, st.session_state.user_role)
+    start_page_log(page_entry['key'] if page_entry else page)
+
     try:
-        if page == "📊 Dashboard":
-            dashboard.show()
-        elif page == "👥 Étudiants":
-            students.show()
-        elif page == "💰 Paiements":
-            payments.show()
-        elif page == "📈 Suivi de Caisse":
-            trackers.show()
-        elif page == "📚 Groupes":
-            groups.show()
-        elif page == "👨‍🏫 Enseignants":
-            teachers.show()
-        elif page == "🏫 Salles":
-            classrooms.show()
-        elif page == "📅 Planning" or page == "📅 Mon Planning":
-            schedule.show()
-        elif page == "✅ Présences":
-            attendance.show()
-        elif page == "👤 Mon Profil":
-            profile.show()
+        if page_entry:
+            load_page(page_entry).show()
         else:
             st.info("Sélectionnez une page dans le menu de gauche")
     except Exception as e:
         st.error(f"❌ Erreur : {str(e)}")
         import traceback
         st.code(traceback.format_exc())
+    finally:
+        query_log = stop_page_log()
+
+    # Requêtes Supabase de la page (admins)
+    if debug_queries:
+        show_debug_panel(query_log, page_entry['tables'] if page_entry else None)
@@ -0,0 +1,82 @@
+"""
+Grille de présence d'un groupe : une ligne par inscription, une colonne par date.
+
+Module sans streamlit, partagé par la page Présences et par generate_group_sheets.py
+(dont les processus de génération n'importent ainsi ni streamlit ni les pages).
+"""
+
+import pandas as pd
+
+
+def get_attendance_matrix(supabase, enrollments, start_date=None, end_date=None, max_dates=None):
+    """
+    Construit la grille de présence étudiants × dates d'un groupe en une seule requête.
+
+    Args:
+        enrollments: Inscriptions du groupe (avec students(first_name, last_name) embarqué)
+        start_date: Première date incluse (optionnel)
+        end_date: Dernière date incluse (optionnel)
+        max_dates: Ne garder que les N dates les plus récentes (optionnel)
+
+    Returns:
+        pd.DataFrame: Une ligne par inscription (index enrollment_id), une colonne 'Étudiant'
+                      puis une colonne par date triée de la plus récente à la plus ancienne
+                      (True/False, NaN si non renseigné)
+    """
+    enrollment_ids = [enr['id'] for enr in enrollments]
+    if not enrollment_ids:
+        return pd.DataFrame()
+
+    query = supabase.table('attendance').select('enrollment_id, date, present').in_('enrollment_id', enrollment_ids)
+    if start_date:
+        query = query.gte('date', start_date.isoformat())
+    if end_date:
+        query = query.lte('date', end_date.isoformat())
+    response = query.execute()
+
+    return build_attendance_matrix(response.data, enrollments, max_dates)
+
+
+def build_attendance_matrix(attendance_rows, enrollments, max_dates=None):
+    """
+    Construit la grille de présence à partir de lignes attendance déjà chargées.
+
+    Args:
+        attendance_rows: Lignes attendance (enrollment_id, date, present)
+        enrollments: Inscriptions du groupe (avec students(first_name, last_name) embarqué)
+        max_dates: Ne garder que les N dates les plus récentes (optionnel)
+
+    Returns:
+        pd.DataFrame: Voir get_attendance_matrix
+    """
+    enrollment_ids = [enr['id'] for enr in enrollments]
+    if not enrollment_ids or not attendance_rows:
+        return pd.DataFrame()
+
+    df = pd.DataFrame(attendance_rows)
+    df['date'] = pd.to_datetime(df['date']).dt.date
+
+    dates = sorted(df['date'].unique(), reverse=True)
+    if max_dates:
+        dates = dates[:max_dates]
+
+    matrix = df.pivot_table(index='enrollment_id', columns='date', values='present', aggfunc='last')
+    matrix = matrix.reindex(index=enrollment_ids, columns=dates)
+
+    names = {}
+    for enr in enrollments:
+        student = enr.get('students') or {}
+        names[enr['id']] = f"{student.get('first_name', 'N/A')} {student.get('last_name', 'N/A')}"
+    matrix.insert(0, 'Étudiant', [names[enrollment_id] for enrollment_id in matrix.index])
+
+    return matrix
+
+
+def format_attendance_matrix(matrix):
+    """Prépare la grille de présence pour l'affichage (✅/❌, dates au format JJ/MM/AAAA)."""
+    display = matrix.copy()
+    date_columns = [col for col in display.columns if col != 'Étudiant']
+    for col in date_columns:
+        display[col] = display[col].map(lambda v: '✅' if v is True or v == 1 else ('❌' if v is False or v == 0 else ''))
+    display.columns = ['Étudiant'] + [col.strftime('%d/%m/%Y') for col in date_columns]
+    return display
@@ -3,9 +3,52 @@ Module d'authentification avec Supabase Auth
 """
 
 import streamlit as st
+from streamlit import runtime
 from utils import get_supabase_client
+from cache import publish_mutation, subscribe_mutations
 from typing import Optional, Dict, Any
 
+# Clé de session du profil résolu : {'access_token', 'profile'}
+PROFILE_CACHE_KEY = '_user_profile'
+
+def fetch_profile(supabase) -> Optional[Dict[str, Any]]:
+    """
+    Résout le profil de l'utilisateur connecté en un seul appel : la fonction SQL
+    get_my_profile (setup_user_profile.sql) joint users et teachers sur auth.uid().
+
+    Returns:
+        Dict avec user_id, email, first_name, last_name, role, email_confirmed, teacher_id
+        ou None si l'utilisateur n'a pas de ligne dans users
+    """
+    response = supabase.rpc('get_my_profile', {}).execute()
+    rows = response.data or []
+    if isinstance(rows, dict):
+        rows = [rows]
+    return rows[0] if rows else None
+
+def _session_profile(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """Profil au format de st.session_state.user_data."""
+    return {
+        "user_id": profile['user_id'],
+        "email": profile['email'],
+        "first_name": profile['first_name'],
+        "last_name": profile['last_name'],
+        "role": profile['role'],
+        "teacher_id": profile.get('teacher_id')
+    }
+
+def _cache_profile(access_token: str, profile: Dict[str, Any]):
+    """Garde le profil en session jusqu'au prochain rafraîchissement du jeton."""
+    if runtime.exists():
+        st.session_state[PROFILE_CACHE_KEY] = {'access_token': access_token, 'profile': profile}
+
+def clear_cached_profile():
+    """Oublie le profil de la session courante (déconnexion, modification du profil)."""
+    if runtime.exists():
+        st.session_state.pop(PROFILE_CACHE_KEY, None)
+
+subscribe_mutations('user_profile', {'users', 'teachers'}, clear_cached_profile)
+
 def sign_up(email: str, password: str, first_name: str, last_name: str, role: str = "teacher") -> Dict[str, Any]:
     """
     Crée un nouveau compte utilisateur
@@ -49,6 +92,7 @@ def sign_up(email: str, password: str, first_name: str, last_name: str, role: st
             }
 
             supabase.table('users').insert(user_data).execute()
+            publish_mutation('users')
 
             # Si c'est un enseignant, créer aussi l'entrée dans teachers
             if role == "teacher":
@@ -59,6 +103,7 @@ def sign_up(email: str, password: str, first_name: str, last_name: str, role: st
                     "email": email
                 }
                 supabase.table('teachers').insert(teacher_data).execute()
+                publish_mutation('teachers')
 
             return {
                 "success": True,
@@ -103,36 +148,24 @@ def sign_in(email: str, password: str) -> Dict[str, Any]:
         })
 
         if response.user:
-            # Récupérer les infos utilisateur depuis la table users
-            user_info = supabase.table('users').select('*').eq('id', response.user.id).execute()
-
-            if user_info.data:
-                user_data = user_info.data[0]
+            # Profil complet (users + teacher_id) en un seul appel
+            profile = fetch_profile(supabase)
 
+            if profile:
                 # Vérifier si l'email est confirmé
-                if not user_data.get('email_confirmed', False):
+                if not profile.get('email_confirmed', False):
                     return {
                         "success": False,
                         "message": "Votre compte n'a pas encore été activé par un administrateur. Veuillez patienter."
                     }
 
-                # Si c'est un enseignant, récupérer aussi l'ID enseignant
-                teacher_id = None
-                if user_data['role'] == 'teacher':
-                    teacher_info = supabase.table('teachers').select('id').eq('user_id', response.user.id).execute()
-                    if teacher_info.data:
-                        teacher_id = teacher_info.data[0]['id']
+                user_data = _session_profile(profile)
+                if response.session:
+                    _cache_profile(response.session.access_token, user_data)
 
                 return {
                     "success": True,
-                    "data": {
-                        "user_id": response.user.id,
-                        "email": user_data['email'],
-                        "first_name": user_data['first_name'],
-                        "last_name": user_data['last_name'],
-                        "role": user_data['role'],
-                        "teacher_id": teacher_id
-                    }
+                    "data": dict(user_data)
                 }
             else:
                 return {
@@ -167,6 +200,7 @@ def sign_out() -> Dict[str, Any]:
     supabase = get_supabase_client()
 
     try:
+        clear_cached_profile()
         supabase.auth.sign_out()
         return {
             "success": True,
@@ -204,7 +238,8 @@ def reset_password(email: str) -> Dict[str, Any]:
 
 def get_current_user() -> Optional[Dict[str, Any]]:
     """
-    Récupère l'utilisateur actuellement connecté
+    Récupère l'utilisateur actuellement connecté. Le profil est gardé en session
+    tant que le jeton d'accès ne change pas (un appel get_my_profile par rafraîchissement).
 
     Returns:
         Dict avec les infos utilisateur ou None
@@ -212,31 +247,22 @@ def get_current_user() -> Optional[Dict[str, Any]]:
     supabase = get_supabase_client()
 
     try:
-        user = supabase.auth.get_user()
-        if user:
-            # Récupérer les infos depuis la table users
-            user_info = supabase.table('users').select('*').eq('id', user.user.id).execute()
-
-            if user_info.data:
-                user_data = user_info.data[0]
-
-                # Si enseignant, récupérer l'ID
-                teacher_id = None
-                if user_data['role'] == 'teacher':
-                    teacher_info = supabase.table('teachers').select('id').eq('user_id', user.user.id).execute()
-                    if teacher_info.data:
-                        teacher_id = teacher_info.data[0]['id']
-
-                return {
-                    "user_id": user.user.id,
-                    "email": user_data['email'],
-                    "first_name": user_data['first_name'],
-                    "last_name": user_data['last_name'],
-                    "role": user_data['role'],
-                    "teacher_id": teacher_id
-                }
-
-        return None
+        # Session locale (rafraîchie par le client si le jeton a expiré) : pas d'appel réseau
+        session = supabase.auth.get_session()
+        if not session:
+            return None
+
+        cached = st.session_state.get(PROFILE_CACHE_KEY) if runtime.exists() else None
+        if cached and cached['access_token'] == session.access_token:
+            return dict(cached['profile'])
+
+        profile = fetch_profile(supabase)
+        if not profile:
+            return None
+
+        user_data = _session_profile(profile)
+        _cache_profile(session.access_token, user_data)
+        return dict(user_data)
     except:
         return None
 
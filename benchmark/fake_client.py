@@ -0,0 +1,474 @@
+"""
+Client Supabase en mémoire reproduisant le sous-ensemble de PostgREST utilisé par l'application :
+select (colonnes, ressources embarquées, count, head, agrégat embarqué (count)),
+eq/neq/in_/gte/lte/gt/lt/ilike/or_ (y compris sur une ressource embarquée : 'enrollments.enrollment_active'),
+order/limit/range, insert/update/delete/upsert et les fonctions rpc / vues des scripts setup_*.sql.
+
+Chaque execute() est enregistré dans query_monitor comme une vraie requête HTTP,
+ce qui permet de mesurer le nombre d'appels d'une page sans réseau.
+"""
+
+import copy
+import json
+import time
+from datetime import date, datetime
+from query_monitor import record_query
+
+
+class FakeResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+def _singular(table):
+    """students -> student, academic_years -> academic_year, schedule -> schedule"""
+    return table[:-1] if table.endswith('s') else table
+
+
+def _parse_columns(columns):
+    """
+    Découpe une liste de colonnes PostgREST en champs simples et ressources embarquées.
+
+    Returns:
+        tuple: (liste des champs, liste de (table embarquée, colonnes embarquées))
+    """
+    fields, embeds = [], []
+    depth, current = 0, ''
+
+    for char in columns + ',':
+        if char == ',' and depth == 0:
+            part = current.strip()
+            if part:
+                if '(' in part:
+                    name, inner = part.split('(', 1)
+                    embeds.append((name.strip(), inner[:-1]))
+                else:
+                    fields.append(part)
+            current = ''
+            continue
+        depth += char == '('
+        depth -= char == ')'
+        current += char
+
+    return fields, embeds
+
+
+def _compare_key(value):
+    """Clé de tri tolérant None, nombres, dates et chaînes."""
+    return (value is None, str(value) if isinstance(value, (date, datetime)) else value)
+
+
+def _comparable(value, other):
+    """Valeur comparée numériquement si les deux opérandes sont des nombres, sinon comme texte (dates ISO)."""
+    if isinstance(value, (int, float)) and isinstance(other, (int, float)):
+        return value
+    return str(value)
+
+
+class FakeQuery:
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.operation = 'select'
+        self.columns = '*'
+        self.count_method = None
+        self.head = False
+        self.payload = None
+        self.on_conflict = None
+        self.filters = []
+        self.filter_labels = []
+        # Ressource embarquée -> filtres sur ses lignes (sans filtrer les lignes parentes)
+        self.embed_filters = {}
+        self.orders = []
+        self.offset = 0
+        self.row_limit = None
+
+    # Opérations
+
+    def select(self, *columns, count=None, head=None):
+        self.columns = ','.join(columns) if columns else '*'
+        self.count_method = count
+        self.head = bool(head)
+        return self
+
+    def insert(self, payload):
+        self.operation = 'insert'
+        self.payload = payload
+        return self
+
+    def upsert(self, payload, on_conflict=None):
+        self.operation = 'upsert'
+        self.payload = payload
+        self.on_conflict = on_conflict
+        return self
+
+    def update(self, payload):
+        self.operation = 'update'
+        self.payload = payload
+        return self
+
+    def delete(self):
+        self.operation = 'delete'
+        return self
+
+    # Filtres
+
+    def _add_filter(self, label, predicate):
+        self.filters.append(predicate)
+        self.filter_labels.append(label)
+        return self
+
+    def eq(self, column, value):
+        if '.' in column:
+            embed, column = column.split('.', 1)
+            self.embed_filters.setdefault(embed, []).append(lambda row: row.get(column) == value)
+            self.filter_labels.append(f"{embed}.{column}=eq.{value}")
+            return self
+        return self._add_filter(f"{column}=eq.{value}", lambda row: row.get(column) == value)
+
+    def neq(self, column, value):
+        return self._add_filter(f"{column}=neq.{value}", lambda row: row.get(column) != value)
+
+    def in_(self, column, values):
+        values = set(values)
+        return self._add_filter(f"{column}=in.({len(values)})", lambda row: row.get(column) in values)
+
+    def gte(self, column, value):
+        return self._add_filter(f"{column}=gte.{value}", lambda row: row.get(column) is not None and _comparable(row[column], value) >= _comparable(value, row[column]))
+
+    def lte(self, column, value):
+        return self._add_filter(f"{column}=lte.{value}", lambda row: row.get(column) is not None and _comparable(row[column], value) <= _comparable(value, row[column]))
+
+    def gt(self, column, value):
+        return self._add_filter(f"{column}=gt.{value}", lambda row: row.get(column) is not None and _comparable(row[column], value) > _comparable(value, row[column]))
+
+    def lt(self, column, value):
+        return self._add_filter(f"{column}=lt.{value}", lambda row: row.get(column) is not None and _comparable(row[column], value) < _comparable(value, row[column]))
+
+    def ilike(self, column, pattern):
+        needle = pattern.strip('*%').lower()
+        return self._add_filter(f"{column}=ilike.{pattern}", lambda row: needle in str(row.get(column) or '').lower())
+
+    def or_(self, filters):
+        """Seuls les filtres de la forme colonne.ilike.*texte* sont pris en charge."""
+        conditions = []
+        for condition in filters.split(','):
+            column, _, pattern = condition.split('.', 2)
+            conditions.append((column, pattern.strip('*%').lower()))
+        return self._add_filter(
+            f"or=({filters})",
+            lambda row: any(needle in str(row.get(column) or '').lower() for column, needle in conditions)
+        )
+
+    # Tri et pagination
+
+    def order(self, column, desc=False):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, size):
+        self.row_limit = size
+        return self
+
+    def range(self, start, end):
+        self.offset = start
+        self.row_limit = end - start + 1
+        return self
+
+    # Exécution
+
+    def execute(self):
+        started = time.perf_counter()
+        self.client._indexes = {}
+        response = getattr(self, f'_execute_{self.operation}')()
+        latency_ms = (time.perf_counter() - started) * 1000
+
+        record_query({
+            'method': {'select': 'GET', 'insert': 'POST', 'upsert': 'POST', 'update': 'PATCH', 'delete': 'DELETE'}[self.operation],
+            'table': self.table,
+            'filters': '&'.join(self.filter_labels),
+            'status': 200,
+            'rows': len(response.data) if isinstance(response.data, list) else None,
+            'bytes': len(json.dumps(response.data, default=str)),
+            'latency_ms': latency_ms
+        })
+        return response
+
+    def _matching_rows(self):
+        return [row for row in self.client.rows(self.table) if all(f(row) for f in self.filters)]
+
+    def _execute_select(self):
+        rows = self._matching_rows()
+
+        for column, desc in reversed(self.orders):
+            rows = sorted(rows, key=lambda row: _compare_key(row.get(column)), reverse=desc)
+
+        count = len(rows) if self.count_method else None
+        end = None if self.row_limit is None else self.offset + self.row_limit
+        rows = rows[self.offset:end]
+
+        if self.head:
+            return FakeResponse([], count)
+
+        return FakeResponse([self.client.shape(self.table, row, self.columns, self.embed_filters) for row in rows], count)
+
+    def _execute_insert(self):
+        payload = self.payload if isinstance(self.payload, list) else [self.payload]
+        return FakeResponse([self.client.insert(self.table, row) for row in payload])
+
+    def _execute_upsert(self):
+        payload = self.payload if isinstance(self.payload, list) else [self.payload]
+        keys = [key.strip() for key in (self.on_conflict or 'id').split(',')]
+        saved = []
+
+        for new_row in payload:
+            existing = [
+                row for row in self.client.tables.setdefault(self.table, [])
+                if all(row.get(key) == new_row.get(key) for key in keys)
+            ]
+            if existing:
+                existing[0].update(new_row)
+                saved.append(copy.deepcopy(existing[0]))
+            else:
+                saved.append(self.client.insert(self.table, new_row))
+
+        return FakeResponse(saved)
+
+    def _execute_update(self):
+        rows = self._matching_rows()
+        for row in rows:
+            row.update(self.payload)
+        return FakeResponse(copy.deepcopy(rows))
+
+    def _execute_delete(self):
+        rows = self._matching_rows()
+        ids = {id(row) for row in rows}
+        self.client.tables[self.table] = [row for row in self.client.tables.get(self.table, []) if id(row) not in ids]
+        return FakeResponse(copy.deepcopy(rows))
+
+
+class FakeRpc:
+    def __init__(self, client, name, params):
+        self.client = client
+        self.name = name
+        self.params = params or {}
+
+    def execute(self):
+        started = time.perf_counter()
+        data = getattr(self.client, f'rpc_{self.name}')(**self.params)
+        record_query({
+            'method': 'POST',
+            'table': f'rpc/{self.name}',
+            'filters': '',
+            'status': 200,
+            'rows': len(data) if isinstance(data, list) else None,
+            'bytes': len(json.dumps(data, default=str)),
+            'latency_ms': (time.perf_counter() - started) * 1000
+        })
+        return FakeResponse(data)
+
+
+class FakeSupabase:
+    """
+    Base en mémoire : dict table -> liste de lignes.
+    Les vues et tables maintenues par triggers (enrollment_balances, cash_position,
+    dashboard_*) sont recalculées à la lecture.
+    """
+
+    def __init__(self, tables=None):
+        self.tables = {name: [dict(row) for row in rows] for name, rows in (tables or {}).items()}
+        self.next_ids = {
+            name: max([row['id'] for row in rows if isinstance(row.get('id'), int)] + [0]) + 1
+            for name, rows in self.tables.items()
+        }
+        self._indexes = {}
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def from_(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, name, params=None):
+        return FakeRpc(self, name, params)
+
+    # Stockage
+
+    def insert(self, table, row):
+        row = dict(row)
+        if 'id' not in row and table not in ('enrollment_balances', 'cash_position'):
+            row['id'] = self.next_ids.get(table, 1)
+            self.next_ids[table] = row['id'] + 1
+        if table == 'payments' and 'payment_date' not in row:
+            row['payment_date'] = datetime.now().isoformat()
+        if table == 'cash_register_resets' and 'reset_date' not in row:
+            row['reset_date'] = datetime.now().isoformat()
+        self.tables.setdefault(table, []).append(row)
+        return copy.deepcopy(row)
+
+    def rows(self, table):
+        derived = getattr(self, f'view_{table}', None)
+        return derived() if derived else self.tables.get(table, [])
+
+    def shape(self, table, row, columns, embed_filters=None):
+        """Projette une ligne sur les colonnes demandées et résout les ressources embarquées."""
+        fields, embeds = _parse_columns(columns)
+        embed_filters = embed_filters or {}
+
+        shaped = dict(row) if '*' in fields else {field: row.get(field) for field in fields}
+
+        for embed, embed_columns in embeds:
+            foreign_key = f"{_singular(embed)}_id"
+            if foreign_key in row:
+                # Plusieurs-à-un : objet (ou None)
+                targets = self._index(embed, 'id').get(row[foreign_key])
+                shaped[embed] = self.shape(embed, targets[0], embed_columns) if targets else None
+            else:
+                # Un-à-plusieurs : liste
+                back_key = f"{_singular(table)}_id"
+                children = [
+                    r for r in self._index(embed, back_key).get(row.get('id'), [])
+                    if all(f(r) for f in embed_filters.get(embed, []))
+                ]
+                if embed_columns.strip() == 'count':
+                    shaped[embed] = [{'count': len(children)}]
+                else:
+                    shaped[embed] = [self.shape(embed, r, embed_columns) for r in children]
+
+        return copy.deepcopy(shaped)
+
+    def _index(self, table, key):
+        """Index table -> {valeur de key: lignes}, construit une fois par requête."""
+        if (table, key) not in self._indexes:
+            index = {}
+            for row in self.rows(table):
+                index.setdefault(row.get(key), []).append(row)
+            self._indexes[(table, key)] = index
+        return self._indexes[(table, key)]
+
+    # Vues et tables dérivées (équivalents des scripts setup_*.sql)
+
+    def _paid_by(self, key):
+        totals, last_dates = {}, {}
+        for payment in self.tables.get('payments', []):
+            owner = payment.get(key)
+            totals[owner] = totals.get(owner, 0) + payment['amount']
+            last_dates[owner] = max(last_dates.get(owner) or '', str(payment.get('payment_date') or '')) or None
+        return totals, last_dates
+
+    def view_enrollment_balances(self):
+        paid, last_dates = self._paid_by('enrollment_id')
+        return [
+            {
+                'enrollment_id': enr['id'],
+                'total_course_fee': enr.get('total_course_fee', 0),
+                'paid_total': paid.get(enr['id'], 0),
+                'remaining': enr.get('total_course_fee', 0) - paid.get(enr['id'], 0),
+                'last_payment_date': last_dates.get(enr['id'])
+            }
+            for enr in self.tables.get('enrollments', [])
+        ]
+
+    def view_dashboard_ready_groups(self):
+        languages = {l['id']: l['name'] for l in self.tables.get('languages', [])}
+        rows = []
+        for group in self.tables.get('groups', []):
+            enrolled = sum(
+                1 for enr in self.tables.get('enrollments', [])
+                if enr['group_id'] == group['id'] and enr.get('enrollment_active')
+            )
+            if enrolled >= (group.get('min_students') or 0):
+                rows.append({
+                    'id': group['id'],
+                    'name': group['name'],
+                    'language': languages.get(group.get('language_id')),
+                    'level': group.get('level'),
+                    'mode': group.get('mode'),
+                    'enrolled_count': enrolled,
+                    'min_students': group.get('min_students')
+                })
+        return rows
+
+    def view_cash_position(self):
+        resets = sorted(self.tables.get('cash_register_resets', []), key=lambda r: str(r['reset_date']))
+        last = resets[-1] if resets else None
+        since = [
+            p for p in self.tables.get('payments', [])
+            if last is None or str(p.get('payment_date')) >= str(last['reset_date'])
+        ]
+        cash = [p for p in since if p.get('payment_method') == 'liquide']
+        online = [p for p in since if p.get('payment_method') == 'en_ligne']
+        return [{
+            'id': 1,
+            'last_reset_id': last['id'] if last else None,
+            'last_reset_date': last['reset_date'] if last else None,
+            'last_reset_by': last['reset_by'] if last else None,
+            'amount_left': last.get('amount_left', 0) if last else 0,
+            'cash_since_reset': sum(p['amount'] for p in cash),
+            'cash_count_since_reset': len(cash),
+            'online_since_reset': sum(p['amount'] for p in online),
+            'online_count_since_reset': len(online)
+        }]
+
+    # Fonctions rpc
+
+    def rpc_get_dashboard_metrics(self):
+        groups = {g['id']: g for g in self.tables.get('groups', [])}
+        languages = {l['id']: l['name'] for l in self.tables.get('languages', [])}
+        active = [enr for enr in self.tables.get('enrollments', []) if enr.get('enrollment_active')]
+
+        students_by_language = {}
+        for enr in active:
+            language = languages.get(groups.get(enr['group_id'], {}).get('language_id'))
+            if language is not None:
+                students_by_language[language] = students_by_language.get(language, 0) + 1
+
+        groups_by_mode, payments_by_method = {}, {}
+        for group in groups.values():
+            groups_by_mode[group.get('mode')] = groups_by_mode.get(group.get('mode'), 0) + 1
+        for payment in self.tables.get('payments', []):
+            method = payment.get('payment_method')
+            payments_by_method[method] = payments_by_method.get(method, 0) + payment['amount']
+
+        return {
+            'total_students': len(self.tables.get('students', [])),
+            'total_payments': sum(p['amount'] for p in self.tables.get('payments', [])),
+            'total_groups': len(groups),
+            'active_enrollments': len(active),
+            'students_by_language': [
+                {'language': name, 'students': count} for name, count in sorted(students_by_language.items())
+            ],
+            'groups_by_mode': [{'mode': mode, 'groups': count} for mode, count in sorted(groups_by_mode.items(), key=lambda i: str(i[0]))],
+            'payments_by_method': [{'method': m, 'total': t} for m, t in sorted(payments_by_method.items(), key=lambda i: str(i[0]))]
+        }
+
+    def rpc_get_attendance_rates(self, p_group_id=None, p_start_date=None, p_end_date=None):
+        enrollments = {
+            enr['id']: enr for enr in self.tables.get('enrollments', [])
+            if p_group_id is None or enr['group_id'] == p_group_id
+        }
+        students = {s['id']: s for s in self.tables.get('students', [])}
+        rates = {}
+
+        for row in self.tables.get('attendance', []):
+            enr = enrollments.get(row['enrollment_id'])
+            if not enr:
+                continue
+            if (p_start_date and str(row['date']) < p_start_date) or (p_end_date and str(row['date']) > p_end_date):
+                continue
+            student = students.get(enr['student_id'], {})
+            stats = rates.setdefault(student.get('id'), {
+                'student_id': student.get('id'),
+                'first_name': student.get('first_name'),
+                'last_name': student.get('last_name'),
+                'student_code': student.get('student_code'),
+                'total': 0, 'present': 0, 'absent': 0
+            })
+            stats['total'] += 1
+            stats['present' if row['present'] else 'absent'] += 1
+
+        for stats in rates.values():
+            stats['rate'] = round(stats['present'] * 100 / stats['total'], 1) if stats['total'] else 0
+
+        return sorted(rates.values(), key=lambda s: (s['last_name'] or '', s['first_name'] or '', s['student_id']))
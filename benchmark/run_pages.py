@@ -0,0 +1,167 @@
+"""
+Benchmark hors ligne des pages : chaque modules/<page>.show() est exécuté via AppTest
+contre le client en mémoire (benchmark/fake_client.py) rempli par benchmark/seed.py.
+
+Pour chaque page : temps du premier affichage (cache froid), temps médian des réaffichages
+(reruns), nombre de requêtes, lignes et octets, et comparaison avec QUERY_BUDGETS.
+
+Usage:
+    python -m benchmark.run_pages [--students 500] [--repeat 3] [--pages dashboard,payments] [--check-budget]
+
+Exemple:
+    python -m benchmark.run_pages --students 5000 --check-budget
+"""
+
+import argparse
+import logging
+import statistics
+import sys
+import time
+from datetime import date
+from streamlit.testing.v1 import AppTest
+from benchmark.fake_client import FakeSupabase
+from benchmark.seed import generate_dataset, REFERENCE_DATE
+from query_monitor import summarize_page_log, check_query_budget, QueryBudgetExceeded
+
+# AppTest exécute les pages hors serveur : ignorer les avertissements "missing ScriptRunContext".
+# Un filtre plutôt qu'un niveau : streamlit réinitialise le niveau de ses loggers en chargeant sa configuration.
+logging.getLogger('streamlit.runtime.scriptrunner_utils.script_run_context').addFilter(
+    lambda record: 'missing ScriptRunContext' not in record.getMessage()
+)
+
+# Page -> rôle de l'utilisateur connecté
+PAGES = {
+    'dashboard': 'admin',
+    'students': 'admin',
+    'payments': 'admin',
+    'trackers': 'admin',
+    'groups': 'admin',
+    'teachers': 'admin',
+    'classrooms': 'admin',
+    'schedule': 'admin',
+    'attendance': 'admin',
+    'profile': 'teacher'
+}
+
+
+def _render_page(page):
+    """Script AppTest : affiche une page en journalisant ses requêtes."""
+    import importlib
+    import streamlit as st
+    from query_monitor import start_page_log, stop_page_log
+
+    module = importlib.import_module(f'modules.{page}')
+    start_page_log(page)
+    try:
+        module.show()
+    finally:
+        st.session_state['_benchmark_log'] = stop_page_log()
+
+
+def _session_for(role, teacher):
+    """État de session d'un utilisateur connecté (équivalent de auth.init_session_state + login)."""
+    user_data = {
+        'user_id': 'admin' if role == 'admin' else teacher['user_id'],
+        'email': 'admin@torii.dz' if role == 'admin' else teacher['email'],
+        'role': role,
+        'first_name': 'Admin' if role == 'admin' else teacher['first_name'],
+        'last_name': 'Torii' if role == 'admin' else teacher['last_name'],
+        'teacher_id': None if role == 'admin' else teacher['id']
+    }
+    session = {
+        'authenticated': True,
+        'logged_in': True,
+        'user_data': user_data,
+        'user_role': role,
+        'user_name': f"{user_data['first_name']} {user_data['last_name']}"
+    }
+    if role != 'admin':
+        session['teacher_id'] = teacher['id']
+    return session
+
+
+def benchmark_page(page, client, repeat=3, timeout=120):
+    """
+    Mesure une page : un premier affichage puis repeat - 1 réaffichages dans la même session.
+
+    Returns:
+        dict: page, cold_ms, warm_ms, queries (premier affichage), warm_queries, rows, bytes, budget, log, error
+    """
+    at = AppTest.from_function(_render_page, args=(page,), default_timeout=timeout)
+    at.session_state['_supabase_client'] = client
+    for key, value in _session_for(PAGES[page], client.tables['teachers'][0]).items():
+        at.session_state[key] = value
+
+    timings, logs = [], []
+    for _ in range(max(1, repeat)):
+        started = time.perf_counter()
+        at.run()
+        timings.append((time.perf_counter() - started) * 1000)
+        logs.append(at.session_state['_benchmark_log'])
+        if at.exception:
+            break
+
+    summary = summarize_page_log(logs[0])
+    return {
+        'page': page,
+        'cold_ms': timings[0],
+        'warm_ms': statistics.median(timings[1:]) if len(timings) > 1 else None,
+        'queries': summary['queries'],
+        'warm_queries': len(logs[-1]['queries']) if len(logs) > 1 else None,
+        'rows': summary['rows'],
+        'bytes': summary['bytes'],
+        'budget': summary['budget'],
+        'log': logs[0],
+        'error': at.exception[0].message if at.exception else None
+    }
+
+
+def print_report(results):
+    """Affiche le tableau des résultats."""
+    print(f"\n{'Page':<12}{'1er (ms)':>10}{'rerun (ms)':>12}{'Requêtes':>10}{'rerun':>7}{'Budget':>8}{'Lignes':>9}{'Ko':>9}")
+    print('-' * 77)
+    for r in results:
+        warm_ms = f"{r['warm_ms']:,.0f}" if r['warm_ms'] is not None else '-'
+        warm_queries = r['warm_queries'] if r['warm_queries'] is not None else '-'
+        budget = r['budget'] if r['budget'] is not None else '-'
+        flag = ' ⚠' if r['budget'] is not None and r['queries'] > r['budget'] else ''
+        print(f"{r['page']:<12}{r['cold_ms']:>10,.0f}{warm_ms:>12}{r['queries']:>10}{warm_queries:>7}{budget:>8}{r['rows']:>9,}{r['bytes'] / 1024:>9,.0f}{flag}")
+        if r['error']:
+            print(f"  ❌ {r['error']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark hors ligne des pages Streamlit")
+    parser.add_argument('--students', type=int, default=500, help="Nombre d'étudiants générés")
+    parser.add_argument('--years', type=int, default=1, help="Nombre d'années académiques générées")
+    parser.add_argument('--seed', type=int, default=42, help="Graine du jeu de données")
+    parser.add_argument('--today', type=date.fromisoformat, default=REFERENCE_DATE, help="Date de référence du jeu de données (AAAA-MM-JJ)")
+    parser.add_argument('--repeat', type=int, default=3, help="Nombre d'affichages par page")
+    parser.add_argument('--pages', default=','.join(PAGES), help="Pages à mesurer, séparées par des virgules")
+    parser.add_argument('--check-budget', action='store_true', help="Code de sortie 1 si une page dépasse son budget")
+    args = parser.parse_args(argv)
+
+    print(f"Génération de {args.students} étudiant(s) sur {args.years} an(s) (graine {args.seed})...")
+    dataset = generate_dataset(students=args.students, years=args.years, seed=args.seed, today=args.today)
+
+    results = []
+    for page in [p.strip() for p in args.pages.split(',') if p.strip()]:
+        # Chaque page part du même jeu de données
+        results.append(benchmark_page(page, FakeSupabase(dataset), repeat=args.repeat))
+
+    print_report(results)
+
+    failures = [r for r in results if r['error']]
+    if args.check_budget:
+        for r in results:
+            try:
+                check_query_budget(r['log'])
+            except QueryBudgetExceeded as e:
+                print(f"\n❌ {e}")
+                failures.append(r)
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
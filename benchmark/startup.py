@@ -0,0 +1,100 @@
+"""
+Benchmark de démarrage : temps jusqu'au premier affichage de la page de connexion
+et mémoire (RSS) du processus, mesurés dans un interpréteur neuf à chaque essai
+(imports à froid, comme au démarrage du serveur).
+
+Usage:
+    python -m benchmark.startup [--repeat 5] [--output startup_history.jsonl]
+
+Avec --output, une ligne JSON par exécution (date, commit, médianes) est ajoutée au fichier
+pour suivre l'évolution d'une version à l'autre.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Exécuté dans un sous-processus : une mesure, imprimée en JSON sur la dernière ligne
+_PROBE = """
+import json, logging, resource, sys, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+logging.getLogger('streamlit.runtime.scriptrunner_utils.script_run_context').addFilter(
+    lambda record: 'missing ScriptRunContext' not in record.getMessage()
+)
+at = AppTest.from_file('app.py', default_timeout=60)
+at.run()
+elapsed = (time.perf_counter() - started) * 1000
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({
+    'first_render_ms': elapsed,
+    'rss_mb': rss_kb / 1024,
+    'pandas_loaded': 'pandas' in sys.modules,
+    'page_modules': sorted(m for m in sys.modules if m.startswith('modules.')),
+    'error': at.exception[0].message if at.exception else None
+}))
+"""
+
+
+def measure_startup():
+    """
+    Lance une mesure dans un interpréteur neuf.
+
+    Returns:
+        dict: first_render_ms, rss_mb, pandas_loaded, page_modules, error
+    """
+    result = subprocess.run(
+        [sys.executable, '-c', _PROBE], cwd=ROOT, capture_output=True, text=True, timeout=120
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "échec du sous-processus")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _git_revision():
+    """Commit courant (None hors dépôt git)."""
+    result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True)
+    return result.stdout.strip() or None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de démarrage (page de connexion)")
+    parser.add_argument('--repeat', type=int, default=5, help="Nombre de mesures")
+    parser.add_argument('--output', help="Fichier JSON Lines auquel ajouter le résultat")
+    args = parser.parse_args(argv)
+
+    runs = [measure_startup() for _ in range(max(1, args.repeat))]
+    last = runs[-1]
+
+    summary = {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'revision': _git_revision(),
+        'runs': len(runs),
+        'first_render_ms': round(statistics.median(r['first_render_ms'] for r in runs), 1),
+        'rss_mb': round(statistics.median(r['rss_mb'] for r in runs), 1),
+        'pandas_loaded': last['pandas_loaded'],
+        'page_modules': last['page_modules']
+    }
+
+    print(f"Premier affichage (médiane de {len(runs)}) : {summary['first_render_ms']:,.0f} ms")
+    print(f"RSS : {summary['rss_mb']:,.1f} Mo")
+    print(f"pandas chargé : {'oui' if summary['pandas_loaded'] else 'non'}")
+    print(f"Modules de pages importés : {', '.join(summary['page_modules']) or 'aucun'}")
+    if last['error']:
+        print(f"❌ {last['error']}")
+
+    if args.output:
+        with open(args.output, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(summary, ensure_ascii=False) + '\n')
+
+    return 1 if last['error'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+import copy
+import re
+import threading
+import time
+from utils import get_supabase_client
+
+# Durée de vie (secondes) des tables de référence en cache
+REFERENCE_TTLS = {
+    'languages': 3600,
+    'academic_years': 3600,
+    'classrooms': 900,
+    'teachers': 600,
+    'groups': 300
+}
+
+# Tables mises à jour par triggers quand une table source est modifiée
+DERIVED_TABLES = {
+    'payments': {'enrollment_balances', 'cash_position'},
+    'enrollments': {'enrollment_balances'},
+    'cash_register_resets': {'cash_position'}
+}
+
+# Cache partagé par toutes les sessions du processus (et par les scripts) :
+# (table, colonnes, tri) -> {'data', 'loaded_at', 'tables'}
+_store = {}
+# Version de chaque table, incrémentée à chaque invalidation
+_table_versions = {}
+_store_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_cache_stats = {}
+
+# Abonnés du bus de mutations : nom -> (tables lues, fonction d'éviction)
+_subscribers = {}
+
+
+def _record(table, outcome):
+    """Incrémente le compteur hits/misses d'une table."""
+    with _stats_lock:
+        table_stats = _cache_stats.setdefault(table, {'hits': 0, 'misses': 0})
+        table_stats[outcome] += 1
+
+
+def get_reference_data(table, columns='*', order=None):
+    """
+    Lit une table de référence (languages, groups, classrooms, teachers, academic_years)
+    en passant par le cache du processus, partagé par toutes les sessions.
+
+    Args:
+        table: Nom de la table (clé de REFERENCE_TTLS)
+        columns: Colonnes du select (les ressources embarquées comme languages(name)
+                 rendent l'entrée dépendante de ces tables pour l'invalidation)
+        order: Colonne de tri (optionnel)
+
+    Returns:
+        list: Lignes de la table (copie, modifiable sans altérer le cache)
+    """
+    key = (table, columns, order)
+    tables = {table, *re.findall(r'(\w+)\(', columns)}
+    with _store_lock:
+        entry = _store.get(key)
+        versions = {name: _table_versions.get(name, 0) for name in tables}
+
+    if entry and time.monotonic() - entry['loaded_at'] < REFERENCE_TTLS.get(table, 300):
+        _record(table, 'hits')
+        return copy.deepcopy(entry['data'])
+
+    _record(table, 'misses')
+
+    supabase = get_supabase_client()
+    query = supabase.table(table).select(columns)
+    if order:
+        query = query.order(order)
+    data = query.execute().data or []
+
+    # Une écriture survenue pendant la lecture rend le résultat possiblement périmé :
+    # on le renvoie sans le mettre en cache
+    with _store_lock:
+        if all(_table_versions.get(name, 0) == version for name, version in versions.items()):
+            _store[key] = {
+                'data': data,
+                'loaded_at': time.monotonic(),
+                'tables': tables
+            }
+    return copy.deepcopy(data)
+
+
+def invalidate_reference_data(*tables):
+    """
+    Supprime du cache du processus toutes les entrées qui lisent l'une des tables
+    données (directement ou via une ressource embarquée), pour toutes les sessions.
+    À appeler après chaque écriture.
+
+    Args:
+        tables: Noms des tables modifiées
+    """
+    with _store_lock:
+        for table in tables:
+            _table_versions[table] = _table_versions.get(table, 0) + 1
+        for key in [key for key, entry in _store.items() if entry['tables'] & set(tables)]:
+            del _store[key]
+
+
+def get_cache_stats():
+    """
+    Retourne les compteurs du cache de référence.
+
+    Returns:
+        dict: table -> {'hits', 'misses', 'hit_rate'}
+    """
+    with _stats_lock:
+        stats = {table: dict(table_stats) for table, table_stats in _cache_stats.items()}
+
+    for table_stats in stats.values():
+        total = table_stats['hits'] + table_stats['misses']
+        table_stats['hit_rate'] = table_stats['hits'] / total if total else 0
+
+    return stats
+
+
+def subscribe_mutations(name, tables, evict):
+    """
+    Abonne un cache au bus de mutations.
+
+    Args:
+        name: Identifiant de l'abonné (un nouvel abonnement du même nom remplace l'ancien)
+        tables: Tables lues par le cache
+        evict: Fonction sans argument appelée quand l'une de ces tables est modifiée
+               (par exemple la méthode clear d'une fonction st.cache_data)
+    """
+    with _stats_lock:
+        _subscribers[name] = (frozenset(tables), evict)
+
+
+def publish_mutation(*tables):
+    """
+    Déclare les tables modifiées par une écriture. À appeler après l'écriture
+    et avant st.rerun() : les résultats en cache qui lisent ces tables (ou les
+    tables dérivées maintenues par triggers) sont évincés.
+
+    Args:
+        tables: Noms des tables modifiées
+    """
+    touched = set(tables)
+    for table in tables:
+        touched |= DERIVED_TABLES.get(table, set())
+
+    invalidate_reference_data(*touched)
+
+    with _stats_lock:
+        subscribers = list(_subscribers.values())
+
+    for watched, evict in subscribers:
+        if watched & touched:
+            evict()
@@ -8,10 +8,13 @@ Génère 3 documents par groupe :
 3. Feuille de suivi des paiements
 
 Usage:
-    python generate_group_sheets.py <group_id>
+    python generate_group_sheets.py <group_id> [output_folder]
+    python generate_group_sheets.py --all [output_folder]
+    python generate_group_sheets.py --groups 1,2,3 [output_folder]
 
 Exemple:
     python generate_group_sheets.py 1
+    python generate_group_sheets.py --all feuilles_rentree
 """
 
 import sys
@@ -21,25 +24,17 @@ from docx.shared import Pt, Inches, Cm
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.oxml.ns import qn
 from docx.oxml import OxmlElement
-from supabase import create_client
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 from dotenv import load_dotenv
+from utils import get_supabase_client, get_connection_stats, fetch_all_rows, fetch_rows_in
+from attendance_matrix import build_attendance_matrix
 
 # Charger les variables d'environnement
 load_dotenv()
 
 
-def get_supabase_client():
-    """Crée et retourne un client Supabase."""
-    url = os.getenv("SUPABASE_URL")
-    key = os.getenv("SUPABASE_KEY")
-
-    if not url or not key:
-        raise ValueError("SUPABASE_URL et SUPABASE_KEY doivent être définis dans .env ou secrets.toml")
-
-    return create_client(url, key)
-
-
 def set_cell_border(cell, **kwargs):
     """
     Définit les bordures d'une cellule de tableau.
@@ -60,115 +55,178 @@ def set_cell_border(cell, **kwargs):
             tcPr.append(element)
 
 
-def get_group_data(group_id):
-    """
-    Récupère toutes les données d'un groupe.
-    """
-    supabase = get_supabase_client()
-
-    print(f"Récupération des données pour le groupe {group_id}...")
-
-    # Récupérer les informations du groupe avec la langue
-    group_response = supabase.table('groups').select(
-        '*, languages(name)'
-    ).eq('id', group_id).execute()
+DAY_TRANSLATION = {
+    'Mon': 'Lundi',
+    'Tue': 'Mardi',
+    'Wed': 'Mercredi',
+    'Thu': 'Jeudi',
+    'Fri': 'Vendredi',
+    'Sat': 'Samedi',
+    'Sun': 'Dimanche'
+}
 
-    if not group_response.data:
-        print(f"❌ Groupe {group_id} non trouvé")
-        return None
 
-    group_data = group_response.data[0]
-    print(f"✓ Groupe trouvé: {group_data['name']}")
+def fetch_groups_data(group_ids=None):
+    """
+    Précharge en quelques requêtes groupées les données de plusieurs groupes :
+    groupes, planning, enseignants, inscriptions actives, paiements et présences.
 
-    # Récupérer le planning du groupe avec les salles
-    schedule_response = supabase.table('schedule').select(
-        '*, classrooms(name, location)'
-    ).eq('group_id', group_id).execute()
+    Args:
+        group_ids: Liste des IDs de groupes (None pour tous les groupes)
 
-    # Récupérer les enseignants du groupe
-    teachers_response = supabase.table('group_teacher').select(
-        '*, teachers(first_name, last_name)'
-    ).eq('group_id', group_id).execute()
+    Returns:
+        dict: group_id -> données du groupe (même format que get_group_data)
+    """
+    supabase = get_supabase_client()
 
+    if group_ids is None:
+        groups = fetch_all_rows(lambda: supabase.table('groups').select('*, languages(name)', count='exact').order('id'))
+    else:
+        groups = fetch_rows_in(
+            lambda: supabase.table('groups').select('*, languages(name)', count='exact').order('id'),
+            'id', group_ids
+        )
+
+    ids = [g['id'] for g in groups]
+    if not ids:
+        return {}
+
+    schedules = fetch_rows_in(
+        lambda: supabase.table('schedule').select('*, classrooms(name, location)', count='exact').order('id'),
+        'group_id', ids
+    )
+    group_teachers = fetch_rows_in(
+        lambda: supabase.table('group_teacher').select('*, teachers(first_name, last_name)', count='exact').order('id'),
+        'group_id', ids
+    )
+    enrollments = fetch_rows_in(
+        lambda: supabase.table('enrollments').select(
+            '*, students(id, first_name, last_name, student_code)', count='exact'
+        ).eq('enrollment_active', True).order('id'),
+        'group_id', ids
+    )
+
+    student_ids = [enr['student_id'] for enr in enrollments if enr.get('students')]
+    payments = fetch_rows_in(
+        lambda: supabase.table('payments').select('student_id, amount, payment_date', count='exact').order('payment_date').order('id'),
+        'student_id', student_ids
+    )
+    attendance_rows = fetch_rows_in(
+        lambda: supabase.table('attendance').select('enrollment_id, date, present', count='exact').order('id'),
+        'enrollment_id', [enr['id'] for enr in enrollments]
+    )
+
+    # Regroupement en mémoire
+    schedules_by_group = {}
+    for sched in schedules:
+        schedules_by_group.setdefault(sched['group_id'], []).append(sched)
+
+    teachers_by_group = {}
+    for gt in group_teachers:
+        teachers_by_group.setdefault(gt['group_id'], []).append(gt)
+
+    enrollments_by_group = {}
+    for enr in enrollments:
+        enrollments_by_group.setdefault(enr['group_id'], []).append(enr)
+
+    payments_by_student = {}
+    for payment in payments:
+        payments_by_student.setdefault(payment['student_id'], []).append(payment)
+
+    attendance_by_enrollment = {}
+    for row in attendance_rows:
+        attendance_by_enrollment.setdefault(row['enrollment_id'], []).append(row)
+
+    groups_data = {}
+    for group in groups:
+        group_enrollments = enrollments_by_group.get(group['id'], [])
+        group_attendance = [
+            row for enr in group_enrollments for row in attendance_by_enrollment.get(enr['id'], [])
+        ]
+        groups_data[group['id']] = _build_group_data(
+            group,
+            schedules_by_group.get(group['id'], []),
+            teachers_by_group.get(group['id'], []),
+            group_enrollments,
+            payments_by_student,
+            group_attendance
+        )
+
+    return groups_data
+
+
+def _build_group_data(group_data, schedules, group_teachers, enrollments, payments_by_student, attendance_rows):
+    """
+    Assemble les données d'un groupe à partir des lignes déjà chargées.
+    """
     teachers_names = []
-    if teachers_response.data:
-        for gt in teachers_response.data:
-            teacher = gt.get('teachers', {})
-            if teacher:
-                teachers_names.append(f"{teacher['first_name']} {teacher['last_name']}")
-
-    # Récupérer les étudiants actifs avec informations de paiement
-    enrollments_response = supabase.table('enrollments').select(
-        '*, students(id, first_name, last_name, student_code)'
-    ).eq('group_id', group_id).eq('enrollment_active', True).execute()
+    for gt in group_teachers:
+        teacher = gt.get('teachers', {})
+        if teacher:
+            teachers_names.append(f"{teacher['first_name']} {teacher['last_name']}")
 
     students_list = []
-    if enrollments_response.data:
-        for enr in enrollments_response.data:
-            student = enr.get('students', {})
-            if student:
-                student_id = student['id']
-
-                # Récupérer les paiements de l'étudiant (triés par date)
-                payments_response = supabase.table('payments').select('*').eq(
-                    'student_id', student_id
-                ).order('payment_date').execute()
-
-                # Liste des paiements individuels
-                payment_list = []
-                if payments_response.data:
-                    for payment in payments_response.data[:3]:  # Limiter à 3 premiers paiements
-                        payment_list.append(payment['amount'])
-
-                total_paid = sum([p['amount'] for p in payments_response.data]) if payments_response.data else 0
-                total_course_fee = enr.get('total_course_fee', 0)
-                remaining = total_course_fee - total_paid
-
-                # Frais d'inscription (on considère qu'il faut au moins 1000 DA)
-                registration_paid = total_paid >= 1000
-
-                # Si tout payé en une fois
-                paid_in_full = total_paid >= total_course_fee and len(payments_response.data) == 1
-
-                students_list.append({
-                    'first_name': student['first_name'],
-                    'last_name': student['last_name'],
-                    'student_code': student.get('student_code', 'N/A'),
-                    'total_course_fee': total_course_fee,
-                    'total_paid': total_paid,
-                    'remaining': remaining,
-                    'registration_paid': registration_paid,
-                    'paid_in_full': paid_in_full,
-                    'payments': payment_list  # Liste des paiements individuels
-                })
-
-    print(f"✓ {len(students_list)} étudiant(s) actif(s)")
+    for enr in enrollments:
+        student = enr.get('students', {})
+        if student:
+            # Paiements de l'étudiant (triés par date)
+            student_payments = payments_by_student.get(student['id'], [])
+
+            # Liste des paiements individuels
+            payment_list = [payment['amount'] for payment in student_payments[:3]]  # Limiter à 3 premiers paiements
+
+            total_paid = sum([p['amount'] for p in student_payments])
+            total_course_fee = enr.get('total_course_fee', 0)
+            remaining = total_course_fee - total_paid
+
+            # Frais d'inscription (on considère qu'il faut au moins 1000 DA)
+            registration_paid = total_paid >= 1000
+
+            # Si tout payé en une fois
+            paid_in_full = total_paid >= total_course_fee and len(student_payments) == 1
+
+            students_list.append({
+                'enrollment_id': enr['id'],
+                'first_name': student['first_name'],
+                'last_name': student['last_name'],
+                'student_code': student.get('student_code', 'N/A'),
+                'total_course_fee': total_course_fee,
+                'total_paid': total_paid,
+                'remaining': remaining,
+                'registration_paid': registration_paid,
+                'paid_in_full': paid_in_full,
+                'payments': payment_list  # Liste des paiements individuels
+            })
+
+    # Présences déjà enregistrées depuis le début du groupe (12 premières séances)
+    if group_data.get('start_date'):
+        start_date = group_data['start_date'][:10]
+        attendance_rows = [row for row in attendance_rows if row['date'][:10] >= start_date]
+    attendance_matrix = build_attendance_matrix(attendance_rows, enrollments)
+
+    attendance_dates = []
+    if not attendance_matrix.empty:
+        attendance_dates = sorted([col for col in attendance_matrix.columns if col != 'Étudiant'])[:12]
+    for student in students_list:
+        student['attendance'] = [
+            attendance_matrix.at[student['enrollment_id'], att_date] if student['enrollment_id'] in attendance_matrix.index else None
+            for att_date in attendance_dates
+        ]
 
     # Formater les informations de planning
     schedule_info = []
-    if schedule_response.data:
-        day_translation = {
-            'Mon': 'Lundi',
-            'Tue': 'Mardi',
-            'Wed': 'Mercredi',
-            'Thu': 'Jeudi',
-            'Fri': 'Vendredi',
-            'Sat': 'Samedi',
-            'Sun': 'Dimanche'
-        }
-
-        for sched in schedule_response.data:
-            day_fr = day_translation.get(sched['day_of_week'], sched['day_of_week'])
-            classroom_name = 'En ligne' if sched.get('is_online') else (
-                sched.get('classrooms', {}).get('name', 'N/A') if sched.get('classrooms') else 'N/A'
-            )
-
-            schedule_info.append({
-                'day': day_fr,
-                'start_time': sched['start_time'],
-                'end_time': sched['end_time'],
-                'classroom': classroom_name
-            })
+    for sched in schedules:
+        day_fr = DAY_TRANSLATION.get(sched['day_of_week'], sched['day_of_week'])
+        classroom_name = 'En ligne' if sched.get('is_online') else (
+            sched.get('classrooms', {}).get('name', 'N/A') if sched.get('classrooms') else 'N/A'
+        )
+
+        schedule_info.append({
+            'day': day_fr,
+            'start_time': sched['start_time'],
+            'end_time': sched['end_time'],
+            'classroom': classroom_name
+        })
 
     # Déterminer le mode de cours
     mode = group_data.get('mode', '')
@@ -182,10 +240,29 @@ def get_group_data(group_id):
         'start_date': group_data.get('start_date', 'N/A'),
         'schedule': schedule_info,
         'students': students_list,
+        'attendance_dates': attendance_dates,
         'is_online': is_online
     }
 
 
+def get_group_data(group_id):
+    """
+    Récupère toutes les données d'un groupe.
+    """
+    print(f"Récupération des données pour le groupe {group_id}...")
+
+    group_data = fetch_groups_data([group_id]).get(group_id)
+
+    if group_data is None:
+        print(f"❌ Groupe {group_id} non trouvé")
+        return None
+
+    print(f"✓ Groupe trouvé: {group_data['group_name']}")
+    print(f"✓ {len(group_data['students'])} étudiant(s) actif(s)")
+
+    return group_data
+
+
 def create_attendance_sheet(group_data):
     """
     Crée une feuille de présence en mode paysage avec 12 séances.
@@ -277,9 +354,11 @@ def create_attendance_sheet(group_data):
     date_row.cells[0].text = 'Date'
     date_row.cells[0].merge(date_row.cells[1])
 
+    attendance_dates = group_data.get('attendance_dates', [])
     for i in range(12):
         cell = date_row.cells[i + 2]
-        cell.text = ''  # À remplir manuellement
+        # Dates des séances déjà enregistrées, sinon à remplir manuellement
+        cell.text = attendance_dates[i].strftime('%d/%m') if i < len(attendance_dates) else ''
         for paragraph in cell.paragraphs:
             paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
 
@@ -294,10 +373,17 @@ def create_attendance_sheet(group_data):
             for run in paragraph.runs:
                 run.font.size = Pt(10)
 
-        # Cellules de présence vides
+        # Présences déjà enregistrées, cellules vides pour les séances à venir
+        attendance = student.get('attendance', [])
         for i in range(12):
             cell = row.cells[i + 2]
-            cell.text = ''
+            present = attendance[i] if i < len(attendance) else None
+            if present is True or present == 1:
+                cell.text = '✓'
+            elif present is False or present == 0:
+                cell.text = '✗'
+            else:
+                cell.text = ''
 
     # Ajuster la largeur des colonnes
     # Colonne nom plus large
@@ -639,19 +725,120 @@ def generate_group_sheets(group_id, output_folder='feuilles_groupe'):
     print(f"{'='*60}\n")
 
 
+def _save_group_documents(group_data, output_folder):
+    """
+    Crée et enregistre les 3 documents d'un groupe (exécuté dans un processus de travail).
+
+    Returns:
+        list: Noms des fichiers générés
+    """
+    filenames = []
+    group_slug = group_data['group_name'].replace(' ', '_')
+
+    for prefix, create_sheet in (
+        ('Presence', create_attendance_sheet),
+        ('Contenu', create_content_sheet),
+        ('Paiements', create_payment_tracking_sheet)
+    ):
+        filename = f"{prefix}_{group_slug}.docx"
+        create_sheet(group_data).save(os.path.join(output_folder, filename))
+        filenames.append(filename)
+
+    return filenames
+
+
+def generate_groups_sheets(group_ids=None, output_folder='feuilles_groupe', max_workers=None):
+    """
+    Génère les feuilles de plusieurs groupes : préchargement groupé puis création
+    des documents en parallèle dans un pool de processus.
+
+    Args:
+        group_ids: Liste des IDs de groupes (None pour tous les groupes)
+        output_folder: Dossier de sortie pour les feuilles générées
+        max_workers: Nombre de processus (par défaut : nombre de CPU)
+    """
+    print(f"\n{'='*60}")
+    print(f"Génération des feuilles pour {'tous les groupes' if group_ids is None else f'{len(group_ids)} groupe(s)'}")
+    print(f"{'='*60}\n")
+
+    total_start = time.perf_counter()
+
+    # Étape 1 : préchargement
+    requests_before = get_connection_stats()['requests']
+    stage_start = time.perf_counter()
+    groups_data = fetch_groups_data(group_ids)
+    fetch_time = time.perf_counter() - stage_start
+    request_count = get_connection_stats()['requests'] - requests_before
+    print(f"⏱  Préchargement : {fetch_time:.2f}s ({request_count} requête(s), {len(groups_data)} groupe(s))")
+
+    if group_ids is not None:
+        missing = [gid for gid in group_ids if gid not in groups_data]
+        if missing:
+            print(f"⚠ Groupe(s) non trouvé(s) : {', '.join(str(gid) for gid in missing)}")
+
+    if not groups_data:
+        print("❌ Aucun groupe à générer")
+        return
+
+    os.makedirs(output_folder, exist_ok=True)
+    print(f"📁 Dossier de sortie: {os.path.abspath(output_folder)}\n")
+
+    # Étape 2 : génération des documents en parallèle
+    stage_start = time.perf_counter()
+    generated = 0
+    errors = 0
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(_save_group_documents, group_data, output_folder): group_data['group_name']
+            for group_data in groups_data.values()
+        }
+        for future in as_completed(futures):
+            group_name = futures[future]
+            try:
+                filenames = future.result()
+                generated += len(filenames)
+                print(f"  ✓ {group_name} ({len(filenames)} documents)")
+            except Exception as e:
+                errors += 1
+                print(f"  ❌ {group_name} : {str(e)}")
+
+    build_time = time.perf_counter() - stage_start
+    print(f"\n⏱  Génération des documents : {build_time:.2f}s")
+
+    total_time = time.perf_counter() - total_start
+    print(f"\n{'='*60}")
+    print(f"✅ {generated} document(s) générés pour {len(groups_data) - errors} groupe(s) en {total_time:.2f}s")
+    if errors:
+        print(f"❌ {errors} groupe(s) en erreur")
+    print(f"📂 Emplacement: {os.path.abspath(output_folder)}")
+    print(f"{'='*60}\n")
+
+
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
+    if len(sys.argv) < 2 or (sys.argv[1] == '--groups' and len(sys.argv) < 3):
         print("Usage: python generate_group_sheets.py <group_id> [output_folder]")
+        print("       python generate_group_sheets.py --all [output_folder]")
+        print("       python generate_group_sheets.py --groups 1,2,3 [output_folder]")
         print("\nExemples:")
         print("  python generate_group_sheets.py 1")
         print("  python generate_group_sheets.py 1 mes_feuilles")
+        print("  python generate_group_sheets.py --all")
+        print("  python generate_group_sheets.py --groups 1,2,3 mes_feuilles")
         sys.exit(1)
 
-    group_id = int(sys.argv[1])
-    output_folder = sys.argv[2] if len(sys.argv) > 2 else 'feuilles_groupe'
-
     try:
-        generate_group_sheets(group_id, output_folder)
+        if sys.argv[1] == '--all':
+            output_folder = sys.argv[2] if len(sys.argv) > 2 else 'feuilles_groupe'
+            generate_groups_sheets(None, output_folder)
+        elif sys.argv[1] == '--groups':
+            group_ids = [int(gid) for gid in sys.argv[2].split(',') if gid.strip()]
+            output_folder = sys.argv[3] if len(sys.argv) > 3 else 'feuilles_groupe'
+            generate_groups_sheets(group_ids, output_folder)
+        else:
+            group_id = int(sys.argv[1])
+            output_folder = sys.argv[2] if len(sys.argv) > 2 else 'feuilles_groupe'
+            generate_group_sheets(group_id, output_folder)
     except Exception as e:
         print(f"\n❌ Erreur: {str(e)}")
         import traceback
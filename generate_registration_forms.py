@@ -14,37 +14,29 @@ import os
 from docx import Document
 from docx.shared import Pt, Inches
 from docx.enum.text import WD_ALIGN_PARAGRAPH
-from supabase import create_client
 from datetime import datetime
 from dotenv import load_dotenv
+from utils import get_supabase_client, fetch_rows_in
 
 # Charger les variables d'environnement
 load_dotenv()
 
 
-def get_supabase_client():
-    """Crée et retourne un client Supabase."""
-    url = os.getenv("SUPABASE_URL")
-    key = os.getenv("SUPABASE_KEY")
-
-    if not url or not key:
-        raise ValueError("SUPABASE_URL et SUPABASE_KEY doivent être définis dans .env ou secrets.toml")
-
-    return create_client(url, key)
-
-
 def get_group_students_data(group_id):
     """
     Récupère toutes les données nécessaires pour générer les fiches d'inscription
     des étudiants d'un groupe donné.
+
+    Une requête par table pour tout le groupe (groupe avec planning et enseignants,
+    inscriptions, étudiants, paiements), puis jointure en mémoire.
     """
     supabase = get_supabase_client()
 
     print(f"Récupération des données pour le groupe {group_id}...")
 
-    # Récupérer les informations du groupe avec la langue
+    # Récupérer le groupe avec la langue, le planning (salles) et les enseignants
     group_response = supabase.table('groups').select(
-        '*, languages(name)'
+        '*, languages(name), schedule(*, classrooms(name, location)), group_teacher(teachers(first_name, last_name))'
     ).eq('id', group_id).execute()
 
     if not group_response.data:
@@ -65,88 +57,85 @@ def get_group_students_data(group_id):
 
     print(f"✓ {len(enrollments_response.data)} étudiant(s) trouvé(s)")
 
+    student_ids = [enrollment['student_id'] for enrollment in enrollments_response.data]
+
+    # Récupérer tous les étudiants du groupe
+    students = fetch_rows_in(
+        lambda: supabase.table('students').select('*', count='exact').order('id'),
+        'id', student_ids
+    )
+    students_by_id = {student['id']: student for student in students}
+
+    # Récupérer tous les paiements des étudiants du groupe
+    # Note: Les paiements ne sont pas liés à un groupe spécifique dans le schéma
+    payments = fetch_rows_in(
+        lambda: supabase.table('payments').select('student_id, amount', count='exact').order('id'),
+        'student_id', student_ids
+    )
+    paid_by_student = {}
+    for payment in payments:
+        paid_by_student[payment['student_id']] = paid_by_student.get(payment['student_id'], 0) + payment['amount']
+
+    # Enseignants du groupe
+    teachers_names = []
+    for gt in group_data.get('group_teacher') or []:
+        teacher = gt.get('teachers', {})
+        if teacher:
+            teachers_names.append(f"{teacher['first_name']} {teacher['last_name']}")
+
+    # Formater les informations de planning
+    schedule_info = []
+    day_translation = {
+        'Mon': 'Lundi',
+        'Tue': 'Mardi',
+        'Wed': 'Mercredi',
+        'Thu': 'Jeudi',
+        'Fri': 'Vendredi',
+        'Sat': 'Samedi',
+        'Sun': 'Dimanche'
+    }
+
+    for sched in group_data.get('schedule') or []:
+        day_fr = day_translation.get(sched['day_of_week'], sched['day_of_week'])
+        start_time = sched['start_time']
+        end_time = sched['end_time']
+
+        classroom_name = 'En ligne' if sched.get('is_online') else (
+            sched.get('classrooms', {}).get('name', 'N/A') if sched.get('classrooms') else 'N/A'
+        )
+
+        schedule_info.append({
+            'day': day_fr,
+            'start_time': start_time,
+            'end_time': end_time,
+            'classroom': classroom_name
+        })
+
+    # Déterminer le type de cours à partir du mode
+    mode = group_data.get('mode', '')
+    mode_translation = {
+        'online_group': 'En ligne - Groupe',
+        'online_individual': 'En ligne - Individuel',
+        'presential_group': 'Présentiel - Groupe',
+        'presential_individual': 'Présentiel - Individuel'
+    }
+    course_mode = mode_translation.get(mode, mode)
+
     students_data = []
 
     for enrollment in enrollments_response.data:
-        student_id = enrollment['student_id']
+        student = students_by_id.get(enrollment['student_id'])
 
-        # Récupérer les informations de l'étudiant
-        student_response = supabase.table('students').select('*').eq('id', student_id).execute()
-
-        if not student_response.data:
+        if not student:
             continue
 
-        student = student_response.data[0]
-
         # Récupérer l'email et le téléphone
         email = student.get('email', 'N/A')
         phone_number = student.get('phone_number', 'N/A')
 
-        # Récupérer les paiements de l'étudiant
-        # Note: Les paiements ne sont pas liés à un groupe spécifique dans le schéma
-        payments_response = supabase.table('payments').select('*').eq(
-            'student_id', student_id
-        ).execute()
-
-        total_paid = sum([p['amount'] for p in payments_response.data]) if payments_response.data else 0
+        total_paid = paid_by_student.get(student['id'], 0)
         has_paid_minimum = total_paid >= 1000
 
-        # Récupérer le planning du groupe avec les salles
-        schedule_response = supabase.table('schedule').select(
-            '*, classrooms(name, location)'
-        ).eq('group_id', group_id).execute()
-
-        # Récupérer les enseignants du groupe
-        teachers_response = supabase.table('group_teacher').select(
-            '*, teachers(first_name, last_name)'
-        ).eq('group_id', group_id).execute()
-
-        teachers_names = []
-        if teachers_response.data:
-            for gt in teachers_response.data:
-                teacher = gt.get('teachers', {})
-                if teacher:
-                    teachers_names.append(f"{teacher['first_name']} {teacher['last_name']}")
-
-        # Formater les informations de planning
-        schedule_info = []
-        if schedule_response.data:
-            day_translation = {
-                'Mon': 'Lundi',
-                'Tue': 'Mardi',
-                'Wed': 'Mercredi',
-                'Thu': 'Jeudi',
-                'Fri': 'Vendredi',
-                'Sat': 'Samedi',
-                'Sun': 'Dimanche'
-            }
-
-            for sched in schedule_response.data:
-                day_fr = day_translation.get(sched['day_of_week'], sched['day_of_week'])
-                start_time = sched['start_time']
-                end_time = sched['end_time']
-
-                classroom_name = 'En ligne' if sched.get('is_online') else (
-                    sched.get('classrooms', {}).get('name', 'N/A') if sched.get('classrooms') else 'N/A'
-                )
-
-                schedule_info.append({
-                    'day': day_fr,
-                    'start_time': start_time,
-                    'end_time': end_time,
-                    'classroom': classroom_name
-                })
-
-        # Déterminer le type de cours à partir du mode
-        mode = group_data.get('mode', '')
-        mode_translation = {
-            'online_group': 'En ligne - Groupe',
-            'online_individual': 'En ligne - Individuel',
-            'presential_group': 'Présentiel - Groupe',
-            'presential_individual': 'Présentiel - Individuel'
-        }
-        course_mode = mode_translation.get(mode, mode)
-
         # Compiler toutes les données pour cet étudiant
         student_data = {
             'student_code': student.get('student_code', 'N/A'),
@@ -14,25 +14,14 @@ import os
 from docx import Document
 from docx.shared import Pt, Inches
 from docx.enum.text import WD_ALIGN_PARAGRAPH
-from supabase import create_client
 from datetime import datetime
 from dotenv import load_dotenv
+from utils import get_supabase_client
 
 # Charger les variables d'environnement
 load_dotenv()
 
 
-def get_supabase_client():
-    """Crée et retourne un client Supabase."""
-    url = os.getenv("SUPABASE_URL")
-    key = os.getenv("SUPABASE_KEY")
-
-    if not url or not key:
-        raise ValueError("SUPABASE_URL et SUPABASE_KEY doivent être définis dans .env ou secrets.toml")
-
-    return create_client(url, key)
-
-
 def get_group_teacher_data(group_id):
     """
     Récupère toutes les données nécessaires pour générer les fiches enseignants
@@ -1,8 +1,150 @@
 import streamlit as st
 import pandas as pd
 from utils import get_supabase_client
+from cache import get_reference_data, publish_mutation
+from attendance_matrix import get_attendance_matrix, format_attendance_matrix
 from datetime import datetime, date, timedelta
 
+def get_day_attendance(supabase, enrollment_ids, attendance_date):
+    """
+    Récupère les présences d'une date pour toutes les inscriptions d'un groupe en une requête.
+
+    Returns:
+        dict: enrollment_id -> ligne attendance
+    """
+    if not enrollment_ids:
+        return {}
+
+    response = supabase.table('attendance').select('*').in_('enrollment_id', enrollment_ids).eq('date', attendance_date.isoformat()).execute()
+    return {att['enrollment_id']: att for att in response.data}
+
+def save_attendance(supabase, attendance_data, existing_attendance, attendance_date):
+    """
+    Enregistre les présences d'une date en un seul upsert sur (enrollment_id, date).
+    Seules les lignes nouvelles ou modifiées sont envoyées.
+
+    Args:
+        attendance_data: enrollment_id -> présent (bool)
+        existing_attendance: présences déjà enregistrées (voir get_day_attendance)
+        attendance_date: date du cours
+
+    Returns:
+        int: Nombre de lignes créées ou modifiées
+    """
+    changes = [
+        {
+            'enrollment_id': enrollment_id,
+            'date': attendance_date.isoformat(),
+            'present': present
+        }
+        for enrollment_id, present in attendance_data.items()
+        if enrollment_id not in existing_attendance or existing_attendance[enrollment_id]['present'] != present
+    ]
+
+    if changes:
+        supabase.table('attendance').upsert(changes, on_conflict='enrollment_id,date').execute()
+        publish_mutation('attendance')
+
+    return len(changes)
+
+def get_attendance_rates(supabase, group_id=None, start_date=None, end_date=None):
+    """
+    Récupère le taux de présence par étudiant, agrégé côté serveur (fonction SQL get_attendance_rates).
+    La fonction retourne un seul tableau jsonb, qui n'est pas tronqué par max-rows de PostgREST.
+
+    Args:
+        group_id: Limiter à un groupe (optionnel)
+        start_date: Première date incluse (optionnel)
+        end_date: Dernière date incluse (optionnel)
+
+    Returns:
+        list: student_id, first_name, last_name, student_code, total, present, absent, rate
+    """
+    response = supabase.rpc('get_attendance_rates', {
+        'p_group_id': group_id,
+        'p_start_date': start_date.isoformat() if start_date else None,
+        'p_end_date': end_date.isoformat() if end_date else None
+    }).execute()
+
+    return response.data or []
+
+@st.fragment
+def roll_call_section(supabase, group_options, key_prefix, show_history=False):
+    """
+    Prise de présences d'un groupe à une date. Fragment : changer de groupe ou de date
+    ne réexécute que cette section (inscrits, présences du jour et historique).
+
+    Args:
+        group_options: libellé -> groupe
+        key_prefix: Préfixe des clés des widgets (une section par rôle)
+        show_history: Afficher la grille des 10 dernières séances
+    """
+    selected_group = st.selectbox("Sélectionner un groupe", list(group_options.keys()), key=f"{key_prefix}group")
+
+    if not selected_group:
+        return
+
+    group_data = group_options[selected_group]
+
+    # Sélectionner la date
+    attendance_date = st.date_input("Date du cours", value=date.today(), key=f"{key_prefix}date")
+
+    # Récupérer les étudiants inscrits
+    enrollments = supabase.table('enrollments').select('*, students(first_name, last_name, student_code)').eq('group_id', group_data['id']).eq('enrollment_active', True).execute()
+
+    if not enrollments.data:
+        st.info("Aucun étudiant inscrit dans ce groupe")
+        return
+
+    st.divider()
+    st.subheader(f"Liste de présence - {attendance_date.strftime('%d/%m/%Y')}")
+
+    # Vérifier si des présences existent déjà pour cette date
+    existing_attendance = get_day_attendance(supabase, [enr['id'] for enr in enrollments.data], attendance_date)
+
+    # Formulaire de présence : cocher une case ne déclenche aucune réexécution
+    with st.form(f"{key_prefix}attendance_form"):
+        attendance_data = {}
+
+        for enr in enrollments.data:
+            student = enr.get('students', {})
+            student_name = f"{student.get('first_name', 'N/A')} {student.get('last_name', 'N/A')} ({student.get('student_code', 'N/A')})"
+
+            # Si présence déjà enregistrée, utiliser cette valeur par défaut
+            default_value = existing_attendance.get(enr['id'], {}).get('present', False)
+
+            col1, col2 = st.columns([3, 1])
+            with col1:
+                st.write(student_name)
+            with col2:
+                present = st.checkbox("Présent", value=default_value, key=f"{key_prefix}att_{enr['id']}")
+
+            attendance_data[enr['id']] = present
+
+        submitted = st.form_submit_button("Enregistrer les présences", width="stretch")
+
+        if submitted:
+            try:
+                changed_count = save_attendance(supabase, attendance_data, existing_attendance, attendance_date)
+                st.success(f"✅ Présences enregistrées avec succès pour {len(attendance_data)} étudiants ({changed_count} modification(s))!")
+                st.rerun()
+
+            except Exception as e:
+                st.error(f"Erreur : {str(e)}")
+
+    if show_history:
+        # Afficher l'historique des présences pour ce groupe
+        st.divider()
+        st.subheader("Historique des Présences")
+
+        # Grille étudiants × 10 dernières dates
+        matrix = get_attendance_matrix(supabase, enrollments.data, max_dates=10)
+
+        if not matrix.empty:
+            st.dataframe(format_attendance_matrix(matrix), width="stretch", hide_index=True)
+        else:
+            st.info("Aucune présence enregistrée pour ce groupe")
+
 def show():
     st.title("✅ Gestion des Présences")
 
@@ -26,103 +168,12 @@ def show_teacher_attendance(supabase):
             return
 
         # Récupérer les groupes de l'enseignant
-        group_teacher = supabase.table('group_teacher').select('*, groups(name, level, languages(name))').eq('teacher_id', teacher_id).execute()
+        group_teacher = supabase.table('group_teacher').select('*, groups(id, name, level, languages(name))').eq('teacher_id', teacher_id).execute()
 
         if group_teacher.data:
             # Sélectionner le groupe
             group_options = {f"{gt['groups']['name']} ({gt['groups']['languages']['name'] if gt['groups'].get('languages') else 'N/A'}, Niveau {gt['groups']['level']})": gt['groups'] for gt in group_teacher.data if gt.get('groups')}
-            selected_group = st.selectbox("Sélectionner un groupe", list(group_options.keys()))
-
-            if selected_group:
-                group_data = group_options[selected_group]
-
-                # Sélectionner la date
-                attendance_date = st.date_input("Date du cours", value=date.today())
-
-                # Récupérer les étudiants inscrits
-                enrollments = supabase.table('enrollments').select('*, students(first_name, last_name, student_code)').eq('group_id', group_data['id']).eq('enrollment_active', True).execute()
-
-                if enrollments.data:
-                    st.divider()
-                    st.subheader(f"Liste de présence - {attendance_date.strftime('%d/%m/%Y')}")
-
-                    # Vérifier si des présences existent déjà pour cette date
-                    existing_attendance = {}
-                    for enr in enrollments.data:
-                        att = supabase.table('attendance').select('*').eq('enrollment_id', enr['id']).eq('date', attendance_date.isoformat()).execute()
-                        if att.data:
-                            existing_attendance[enr['id']] = att.data[0]
-
-                    # Formulaire de présence
-                    with st.form("attendance_form"):
-                        attendance_data = {}
-
-                        for enr in enrollments.data:
-                            student = enr.get('students', {})
-                            student_name = f"{student.get('first_name', 'N/A')} {student.get('last_name', 'N/A')} ({student.get('student_code', 'N/A')})"
-
-                            # Si présence déjà enregistrée, utiliser cette valeur par défaut
-                            default_value = existing_attendance.get(enr['id'], {}).get('present', False)
-
-                            col1, col2 = st.columns([3, 1])
-                            with col1:
-                                st.write(student_name)
-                            with col2:
-                                present = st.checkbox("Présent", value=default_value, key=f"att_{enr['id']}")
-
-                            attendance_data[enr['id']] = present
-
-                        submitted = st.form_submit_button("Enregistrer les présences", width="stretch")
-
-                        if submitted:
-                            try:
-                                success_count = 0
-                                for enrollment_id, present in attendance_data.items():
-                                    # Vérifier si présence existe déjà
-                                    if enrollment_id in existing_attendance:
-                                        # Mettre à jour
-                                        supabase.table('attendance').update({'present': present}).eq('id', existing_attendance[enrollment_id]['id']).execute()
-                                    else:
-                                        # Insérer nouvelle présence
-                                        new_attendance = {
-                                            'enrollment_id': enrollment_id,
-                                            'date': attendance_date.isoformat(),
-                                            'present': present
-                                        }
-                                        supabase.table('attendance').insert(new_attendance).execute()
-
-                                    success_count += 1
-
-                                st.success(f"✅ Présences enregistrées avec succès pour {success_count} étudiants!")
-                                st.rerun()
-
-                            except Exception as e:
-                                st.error(f"Erreur : {str(e)}")
-
-                    # Afficher l'historique des présences pour ce groupe
-                    st.divider()
-                    st.subheader("Historique des Présences")
-
-                    # Récupérer toutes les dates de présence
-                    all_attendance = supabase.table('attendance').select('date').in_('enrollment_id', [e['id'] for e in enrollments.data]).execute()
-
-                    if all_attendance.data:
-                        dates = sorted(list(set([att['date'] for att in all_attendance.data])), reverse=True)
-
-                        for att_date in dates[:10]:  # Afficher les 10 dernières dates
-                            with st.expander(f"📅 {datetime.fromisoformat(att_date).strftime('%d/%m/%Y')}"):
-                                for enr in enrollments.data:
-                                    student = enr.get('students', {})
-                                    att = supabase.table('attendance').select('*').eq('enrollment_id', enr['id']).eq('date', att_date).execute()
-
-                                    if att.data:
-                                        status = "✅ Présent" if att.data[0]['present'] else "❌ Absent"
-                                        st.write(f"{student.get('first_name', 'N/A')} {student.get('last_name', 'N/A')}: {status}")
-                    else:
-                        st.info("Aucune présence enregistrée pour ce groupe")
-
-                else:
-                    st.info("Aucun étudiant inscrit dans ce groupe")
+            roll_call_section(supabase, group_options, key_prefix="teacher_", show_history=True)
 
         else:
             st.info("Vous n'êtes assigné à aucun groupe")
@@ -143,9 +194,10 @@ def show_admin_attendance(supabase):
 
             with col1:
                 # Sélectionner le groupe
-                groups = supabase.table('groups').select('*, languages(name)').execute()
-                if groups.data:
-                    group_options = ["Tous"] + [f"{g['name']} ({g['languages']['name'] if g.get('languages') else 'N/A'})" for g in groups.data]
+                groups = get_reference_data('groups', '*, languages(name)')
+                if groups:
+                    group_ids_by_label = {f"{g['name']} ({g['languages']['name'] if g.get('languages') else 'N/A'})": g['id'] for g in groups}
+                    group_options = ["Tous"] + list(group_ids_by_label.keys())
                     selected_group = st.selectbox("Groupe", group_options)
                 else:
                     selected_group = "Tous"
@@ -196,6 +248,16 @@ def show_admin_attendance(supabase):
                     df = pd.DataFrame(attendance_list)
                     st.dataframe(df, width="stretch", hide_index=True)
 
+                    # Grille de présence du groupe sélectionné
+                    if selected_group != "Tous":
+                        group_id = group_ids_by_label[selected_group]
+                        group_enrollments = supabase.table('enrollments').select('id, students(first_name, last_name)').eq('group_id', group_id).execute()
+                        matrix = get_attendance_matrix(supabase, group_enrollments.data, start_date=start_date, end_date=end_date)
+
+                        if not matrix.empty:
+                            st.markdown("**Grille de présence**")
+                            st.dataframe(format_attendance_matrix(matrix), width="stretch", hide_index=True)
+
                     # Statistiques rapides
                     col1, col2, col3 = st.columns(3)
 
@@ -223,71 +285,10 @@ def show_admin_attendance(supabase):
 
         # Sélectionner le groupe
         try:
-            groups = supabase.table('groups').select('*, languages(name)').execute()
-            if groups.data:
-                group_options = {f"{g['name']} ({g['languages']['name'] if g.get('languages') else 'N/A'}, Niveau {g['level']})": g for g in groups.data}
-                selected_group = st.selectbox("Sélectionner un groupe", list(group_options.keys()), key="admin_group")
-
-                if selected_group:
-                    group_data = group_options[selected_group]
-
-                    # Sélectionner la date
-                    attendance_date = st.date_input("Date du cours", value=date.today(), key="admin_date")
-
-                    # Récupérer les étudiants inscrits
-                    enrollments = supabase.table('enrollments').select('*, students(first_name, last_name, student_code)').eq('group_id', group_data['id']).eq('enrollment_active', True).execute()
-
-                    if enrollments.data:
-                        st.divider()
-
-                        # Vérifier si des présences existent déjà
-                        existing_attendance = {}
-                        for enr in enrollments.data:
-                            att = supabase.table('attendance').select('*').eq('enrollment_id', enr['id']).eq('date', attendance_date.isoformat()).execute()
-                            if att.data:
-                                existing_attendance[enr['id']] = att.data[0]
-
-                        # Formulaire de présence
-                        with st.form("admin_attendance_form"):
-                            attendance_data = {}
-
-                            for enr in enrollments.data:
-                                student = enr.get('students', {})
-                                student_name = f"{student.get('first_name', 'N/A')} {student.get('last_name', 'N/A')} ({student.get('student_code', 'N/A')})"
-
-                                default_value = existing_attendance.get(enr['id'], {}).get('present', False)
-
-                                col1, col2 = st.columns([3, 1])
-                                with col1:
-                                    st.write(student_name)
-                                with col2:
-                                    present = st.checkbox("Présent", value=default_value, key=f"admin_att_{enr['id']}")
-
-                                attendance_data[enr['id']] = present
-
-                            submitted = st.form_submit_button("Enregistrer les présences", width="stretch")
-
-                            if submitted:
-                                try:
-                                    for enrollment_id, present in attendance_data.items():
-                                        if enrollment_id in existing_attendance:
-                                            supabase.table('attendance').update({'present': present}).eq('id', existing_attendance[enrollment_id]['id']).execute()
-                                        else:
-                                            new_attendance = {
-                                                'enrollment_id': enrollment_id,
-                                                'date': attendance_date.isoformat(),
-                                                'present': present
-                                            }
-                                            supabase.table('attendance').insert(new_attendance).execute()
-
-                                    st.success("✅ Présences enregistrées avec succès!")
-                                    st.rerun()
-
-                                except Exception as e:
-                                    st.error(f"Erreur : {str(e)}")
-
-                    else:
-                        st.info("Aucun étudiant inscrit dans ce groupe")
+            groups = get_reference_data('groups', '*, languages(name)')
+            if groups:
+                group_options = {f"{g['name']} ({g['languages']['name'] if g.get('languages') else 'N/A'}, Niveau {g['level']})": g for g in groups}
+                roll_call_section(supabase, group_options, key_prefix="admin_")
 
             else:
                 st.error("Aucun groupe disponible")
@@ -299,43 +300,46 @@ def show_admin_attendance(supabase):
         st.subheader("📊 Statistiques de Présence")
 
         try:
-            # Taux de présence par étudiant
-            students = supabase.table('students').select('*').execute()
-
-            if students.data:
-                student_stats = []
-
-                for student in students.data:
-                    # Récupérer toutes les présences de l'étudiant
-                    enrollments = supabase.table('enrollments').select('id').eq('student_id', student['id']).execute()
-
-                    if enrollments.data:
-                        enrollment_ids = [e['id'] for e in enrollments.data]
-                        attendance = supabase.table('attendance').select('*').in_('enrollment_id', enrollment_ids).execute()
-
-                        if attendance.data:
-                            total = len(attendance.data)
-                            present = len([att for att in attendance.data if att['present']])
-                            rate = (present / total * 100) if total > 0 else 0
-
-                            student_stats.append({
-                                'Étudiant': f"{student['first_name']} {student['last_name']}",
-                                'Code': student.get('student_code', 'N/A'),
-                                'Total Cours': total,
-                                'Présent': present,
-                                'Absent': total - present,
-                                'Taux de Présence': f"{rate:.1f}%"
-                            })
-
-                if student_stats:
-                    df_stats = pd.DataFrame(student_stats)
-                    st.dataframe(df_stats, width="stretch", hide_index=True)
-
-                    # Moyenne générale
-                    avg_rate = sum([float(s['Taux de Présence'].replace('%', '')) for s in student_stats]) / len(student_stats)
-                    st.metric("Taux de Présence Moyen", f"{avg_rate:.1f}%")
-                else:
-                    st.info("Aucune statistique disponible")
+            # Filtres optionnels
+            col1, col2, col3 = st.columns(3)
+
+            with col1:
+                groups = get_reference_data('groups', 'id, name, languages(name)')
+                stats_group_options = {"Tous": None}
+                for g in groups:
+                    stats_group_options[f"{g['name']} ({g['languages']['name'] if g.get('languages') else 'N/A'})"] = g['id']
+                selected_stats_group = st.selectbox("Groupe", list(stats_group_options.keys()), key="stats_group")
+
+            with col2:
+                stats_start_date = st.date_input("Date de début", value=None, key="stats_start_date")
+
+            with col3:
+                stats_end_date = st.date_input("Date de fin", value=None, key="stats_end_date")
+
+            # Taux de présence par étudiant (agrégé côté serveur)
+            rates = get_attendance_rates(supabase, stats_group_options[selected_stats_group], stats_start_date, stats_end_date)
+
+            student_stats = []
+
+            for rate in rates:
+                student_stats.append({
+                    'Étudiant': f"{rate['first_name']} {rate['last_name']}",
+                    'Code': rate.get('student_code') or 'N/A',
+                    'Total Cours': rate['total'],
+                    'Présent': rate['present'],
+                    'Absent': rate['absent'],
+                    'Taux de Présence': f"{float(rate['rate']):.1f}%"
+                })
+
+            if student_stats:
+                df_stats = pd.DataFrame(student_stats)
+                st.dataframe(df_stats, width="stretch", hide_index=True)
+
+                # Moyenne générale
+                avg_rate = sum([float(s['Taux de Présence'].replace('%', '')) for s in student_stats]) / len(student_stats)
+                st.metric("Taux de Présence Moyen", f"{avg_rate:.1f}%")
+            else:
+                st.info("Aucune statistique disponible")
 
         except Exception as e:
             st.error(f"Erreur : {str(e)}")
@@ -1,6 +1,19 @@
 import streamlit as st
 import pandas as pd
 from utils import get_supabase_client
+from cache import publish_mutation
+
+def get_classrooms_with_schedule(supabase):
+    """
+    Récupère toutes les salles avec leurs créneaux planifiés en une seule requête.
+
+    Returns:
+        list: Salles avec schedule(day_of_week, start_time, end_time, groups(name, languages(name))) embarqué
+    """
+    response = supabase.table('classrooms').select(
+        '*, schedule(day_of_week, start_time, end_time, groups(name, languages(name)))'
+    ).order('name').execute()
+    return response.data or []
 
 def show():
     st.title("🏫 Gestion des Salles")
@@ -13,21 +26,18 @@ def show():
         st.subheader("Liste des Salles")
 
         try:
-            classrooms_response = supabase.table('classrooms').select('*').order('name').execute()
+            classrooms = get_classrooms_with_schedule(supabase)
 
-            if classrooms_response.data:
+            if classrooms:
                 classrooms_list = []
-                for classroom in classrooms_response.data:
-                    # Compter les cours assignés
-                    schedules = supabase.table('schedule').select('*', count='exact').eq('classroom_id', classroom['id']).execute()
-
+                for classroom in classrooms:
                     classrooms_list.append({
                         'ID': classroom['id'],
                         'Nom': classroom['name'],
                         'Localisation': classroom.get('location', 'N/A'),
                         'Capacité': classroom.get('capacity', 'N/A'),
                         'Équipements': classroom.get('equipments', 'N/A'),
-                        'Cours': schedules.count
+                        'Cours': len(classroom.get('schedule') or [])
                     })
 
                 df = pd.DataFrame(classrooms_list)
@@ -39,7 +49,7 @@ def show():
                 st.divider()
                 st.subheader("Détails et Actions")
 
-                for classroom in classrooms_response.data:
+                for classroom in classrooms:
                     with st.expander(f"{classroom['name']} - {classroom.get('location', 'N/A')}"):
                         col1, col2 = st.columns([2, 1])
 
@@ -49,12 +59,12 @@ def show():
                             st.write(f"**Équipements:** {classroom.get('equipments', 'N/A')}")
 
                             # Afficher le planning
-                            schedules = supabase.table('schedule').select('*, groups(name, languages(name))').eq('classroom_id', classroom['id']).execute()
+                            schedules = classroom.get('schedule') or []
 
-                            if schedules.data:
+                            if schedules:
                                 st.markdown("**Planning:**")
-                                for sch in schedules.data:
-                                    group = sch.get('groups', {})
+                                for sch in schedules:
+                                    group = sch.get('groups') or {}
                                     lang_name = group.get('languages', {}).get('name', 'N/A') if group.get('languages') else 'N/A'
                                     st.write(f"- {sch['day_of_week']}: {sch['start_time']} - {sch['end_time']} | {group.get('name', 'N/A')} ({lang_name})")
                             else:
@@ -64,6 +74,7 @@ def show():
                             if st.button("Supprimer", key=f"delete_{classroom['id']}", type="primary"):
                                 try:
                                     supabase.table('classrooms').delete().eq('id', classroom['id']).execute()
+                                    publish_mutation('classrooms')
                                     st.success("Salle supprimée")
                                     st.rerun()
                                 except Exception as e:
@@ -106,6 +117,7 @@ def show():
                             }
 
                             response = supabase.table('classrooms').insert(new_classroom).execute()
+                            publish_mutation('classrooms')
 
                             if response.data:
                                 st.success("✅ Salle ajoutée avec succès!")
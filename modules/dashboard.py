@@ -1,8 +1,21 @@
 import streamlit as st
 import pandas as pd
 from utils import get_supabase_client
+from cache import get_reference_data
+from receivables import load_receivables_data, compute_receivables, aging_summary, receivables_report_csv
 from datetime import datetime
 
+def get_dashboard_metrics(supabase):
+    """
+    Récupère les KPIs du dashboard agrégés côté serveur (fonction SQL get_dashboard_metrics).
+
+    Returns:
+        dict: total_students, total_payments, total_groups, active_enrollments,
+              students_by_language, groups_by_mode, payments_by_method
+    """
+    response = supabase.rpc('get_dashboard_metrics').execute()
+    return response.data or {}
+
 def show():
     st.title("📊 Dashboard")
 
@@ -13,8 +26,8 @@ def show():
 
     with col1:
         try:
-            languages_response = supabase.table('languages').select('*').execute()
-            languages = ["Toutes"] + [lang['name'] for lang in languages_response.data] if languages_response.data else ["Toutes"]
+            all_languages = get_reference_data('languages')
+            languages = ["Toutes"] + [lang['name'] for lang in all_languages] if all_languages else ["Toutes"]
         except:
             languages = ["Toutes"]
         selected_language = st.selectbox("Langue", languages)
@@ -37,35 +50,31 @@ def show():
     col1, col2, col3, col4 = st.columns(4)
 
     try:
-        # Total étudiants
-        students_response = supabase.table('students').select('*', count='exact').execute()
-        total_students = students_response.count
-
-        # Total paiements
-        payments_response = supabase.table('payments').select('amount').execute()
-        total_payments = sum([p['amount'] for p in payments_response.data]) if payments_response.data else 0
-
-        # Groupes actifs
-        groups_response = supabase.table('groups').select('*', count='exact').execute()
-        total_groups = groups_response.count
-
-        # Inscriptions actives
-        enrollments_response = supabase.table('enrollments').select('*', count='exact').eq('enrollment_active', True).execute()
-        active_enrollments = enrollments_response.count
+        metrics = get_dashboard_metrics(supabase)
 
         with col1:
-            st.metric("Total Étudiants", total_students)
+            st.metric("Total Étudiants", metrics.get('total_students', 0))
 
         with col2:
-            st.metric("Paiements Reçus", f"{total_payments:,.0f} DA")
+            st.metric("Paiements Reçus", f"{metrics.get('total_payments', 0):,.0f} DA")
 
         with col3:
-            st.metric("Groupes", total_groups)
+            st.metric("Groupes", metrics.get('total_groups', 0))
 
         with col4:
-            st.metric("Inscriptions Actives", active_enrollments)
+            st.metric("Inscriptions Actives", metrics.get('active_enrollments', 0))
+
+        # Répartition des paiements par méthode
+        payments_by_method = {p['method']: p['total'] for p in metrics.get('payments_by_method', [])}
+        if payments_by_method:
+            col5, col6 = st.columns(2)
+            with col5:
+                st.metric("💵 Liquide", f"{payments_by_method.get('liquide', 0):,.0f} DA")
+            with col6:
+                st.metric("💳 En Ligne", f"{payments_by_method.get('en_ligne', 0):,.0f} DA")
 
     except Exception as e:
+        metrics = {}
         st.error(f"Erreur lors du chargement des statistiques : {str(e)}")
 
     st.divider()
@@ -75,72 +84,39 @@ def show():
 
     with col1:
         st.subheader("📚 Étudiants par Langue")
-        try:
-            # Récupérer les inscriptions avec les langues
-            query = """
-                SELECT l.name, COUNT(DISTINCT e.student_id) as count
-                FROM enrollments e
-                JOIN groups g ON e.group_id = g.id
-                JOIN languages l ON g.language_id = l.id
-                WHERE e.enrollment_active = true
-                GROUP BY l.name
-            """
-            enrollments_lang = supabase.table('enrollments').select('*, groups(*, languages(*))').eq('enrollment_active', True).execute()
-
-            # Compter manuellement
-            lang_count = {}
-            for enr in enrollments_lang.data:
-                if enr.get('groups') and enr['groups'].get('languages'):
-                    lang_name = enr['groups']['languages']['name']
-                    lang_count[lang_name] = lang_count.get(lang_name, 0) + 1
-
-            if lang_count:
-                df_lang = pd.DataFrame(list(lang_count.items()), columns=['Langue', 'Étudiants'])
-                st.bar_chart(df_lang.set_index('Langue'))
-            else:
-                st.info("Aucune donnée disponible")
-        except Exception as e:
-            st.error(f"Erreur : {str(e)}")
+        students_by_language = metrics.get('students_by_language', [])
+        if students_by_language:
+            df_lang = pd.DataFrame(students_by_language).rename(columns={'language': 'Langue', 'students': 'Étudiants'})
+            st.bar_chart(df_lang.set_index('Langue'))
+        else:
+            st.info("Aucune donnée disponible")
 
     with col2:
         st.subheader("📊 Types de Cours")
-        try:
-            groups_data = supabase.table('groups').select('mode').execute()
-            if groups_data.data:
-                mode_count = {}
-                for g in groups_data.data:
-                    mode = g['mode']
-                    mode_count[mode] = mode_count.get(mode, 0) + 1
-
-                df_modes = pd.DataFrame(list(mode_count.items()), columns=['Mode', 'Groupes'])
-                st.bar_chart(df_modes.set_index('Mode'))
-            else:
-                st.info("Aucune donnée disponible")
-        except Exception as e:
-            st.error(f"Erreur : {str(e)}")
+        groups_by_mode = metrics.get('groups_by_mode', [])
+        if groups_by_mode:
+            df_modes = pd.DataFrame(groups_by_mode).rename(columns={'mode': 'Mode', 'groups': 'Groupes'})
+            st.bar_chart(df_modes.set_index('Mode'))
+        else:
+            st.info("Aucune donnée disponible")
 
     st.divider()
 
     # Groupes prêts à démarrer
     st.subheader("🚀 Groupes Prêts à Démarrer")
     try:
-        groups = supabase.table('groups').select('*, languages(name)').execute()
+        groups = supabase.table('dashboard_ready_groups').select('*').order('name').execute()
 
         ready_groups = []
         for group in groups.data:
-            # Compter les étudiants inscrits
-            enrollments = supabase.table('enrollments').select('*', count='exact').eq('group_id', group['id']).eq('enrollment_active', True).execute()
-            enrolled_count = enrollments.count
-
-            if enrolled_count >= group['min_students']:
-                ready_groups.append({
-                    'Nom': group['name'],
-                    'Langue': group['languages']['name'] if group.get('languages') else 'N/A',
-                    'Niveau': group['level'],
-                    'Mode': group['mode'],
-                    'Inscrits': enrolled_count,
-                    'Minimum': group['min_students']
-                })
+            ready_groups.append({
+                'Nom': group['name'],
+                'Langue': group.get('language') or 'N/A',
+                'Niveau': group['level'],
+                'Mode': group['mode'],
+                'Inscrits': group['enrolled_count'],
+                'Minimum': group['min_students']
+            })
 
         if ready_groups:
             df_ready = pd.DataFrame(ready_groups)
@@ -152,32 +128,47 @@ def show():
 
     st.divider()
 
-    # Étudiants avec paiement restant
+    # Étudiants avec paiement restant (filtres appliqués aux créances)
     st.subheader("💳 Étudiants avec Paiement Restant")
     try:
-        enrollments = supabase.table('enrollments').select('*, students(first_name, last_name, email)').execute()
-
-        debt_list = []
-        for enr in enrollments.data:
-            # Calculer les paiements effectués
-            payments = supabase.table('payments').select('amount').eq('student_id', enr['student_id']).execute()
-            total_paid = sum([p['amount'] for p in payments.data]) if payments.data else 0
-
-            remaining = enr['total_course_fee'] - total_paid
-
-            if remaining > 0:
-                student = enr.get('students', {})
-                debt_list.append({
-                    'Étudiant': f"{student.get('first_name', 'N/A')} {student.get('last_name', 'N/A')}",
-                    'Email': student.get('email', 'N/A'),
-                    'Total Cours': f"{enr['total_course_fee']:,.0f} DA",
-                    'Payé': f"{total_paid:,.0f} DA",
-                    'Restant': f"{remaining:,.0f} DA"
-                })
-
-        if debt_list:
-            df_debt = pd.DataFrame(debt_list)
+        receivables = compute_receivables(load_receivables_data(supabase))
+
+        if selected_language != "Toutes":
+            receivables = receivables[receivables['language'] == selected_language]
+        if selected_year != "Toutes":
+            receivables = receivables[receivables['enrollment_year'] == selected_year]
+        if selected_mode != "Tous":
+            receivables = receivables[receivables['mode'] == selected_mode]
+        if selected_level != "Tous":
+            receivables = receivables[receivables['level'].astype(str) == selected_level]
+
+        if not receivables.empty:
+            # Ancienneté depuis le dernier paiement
+            summary = aging_summary(receivables)
+            aging_cols = st.columns(len(summary) + 1)
+            with aging_cols[0]:
+                st.metric("Total Restant", f"{receivables['remaining'].sum():,.0f} DA", f"{len(receivables)} inscription(s)", delta_color="off")
+            for col, (bucket, row) in zip(aging_cols[1:], summary.iterrows()):
+                with col:
+                    st.metric(bucket, f"{row['remaining']:,.0f} DA", f"{row['count']} inscription(s)", delta_color="off")
+
+            df_debt = pd.DataFrame({
+                'Étudiant': receivables['student'],
+                'Email': receivables['email'].fillna('N/A'),
+                'Groupe': receivables['group'].fillna('N/A'),
+                'Total Cours': receivables['total_course_fee'].map(lambda v: f"{v:,.0f} DA"),
+                'Payé': receivables['paid'].map(lambda v: f"{v:,.0f} DA"),
+                'Restant': receivables['remaining'].map(lambda v: f"{v:,.0f} DA"),
+                'Ancienneté': receivables['aging'].astype(str)
+            })
             st.dataframe(df_debt, width="stretch")
+
+            st.download_button(
+                "📥 Télécharger le rapport des créances (CSV)",
+                receivables_report_csv(receivables),
+                file_name=f"creances_{datetime.now().strftime('%Y%m%d')}.csv",
+                mime="text/csv"
+            )
         else:
             st.success("Tous les paiements sont à jour!")
     except Exception as e:
@@ -1,6 +1,41 @@
 import streamlit as st
 import pandas as pd
 from utils import get_supabase_client
+from cache import get_reference_data, publish_mutation
+
+def get_groups_with_counts(supabase):
+    """
+    Récupère tous les groupes avec leurs enseignants et le nombre d'inscriptions actives
+    en une seule requête (agrégat count embarqué, sans charger les inscriptions).
+
+    Returns:
+        list: Groupes enrichis de 'enrolled_count' (inscriptions actives) et 'teacher_count'
+    """
+    groups_response = supabase.table('groups').select(
+        '*, languages(name), '
+        'group_teacher(teacher_id, teachers(first_name, last_name, email)), '
+        'enrollments(count)'
+    ).eq('enrollments.enrollment_active', True).order('name').execute()
+
+    groups = groups_response.data or []
+    for group in groups:
+        counts = group.pop('enrollments', None) or [{'count': 0}]
+        group['enrolled_count'] = counts[0]['count']
+        group['teacher_count'] = len(group.get('group_teacher') or [])
+
+    return groups
+
+def get_group_roster(supabase, group_id):
+    """
+    Récupère les inscriptions d'un groupe avec leurs étudiants.
+
+    Returns:
+        list: Inscriptions (enrollment_active, level, students embarqué)
+    """
+    response = supabase.table('enrollments').select(
+        'enrollment_active, level, students(first_name, last_name, email, student_code)'
+    ).eq('group_id', group_id).order('id').execute()
+    return response.data or []
 
 def show():
     st.title("📚 Gestion des Groupes")
@@ -13,19 +48,13 @@ def show():
         st.subheader("Liste des Groupes")
 
         try:
-            groups_response = supabase.table('groups').select('*, languages(name)').order('name').execute()
+            groups = get_groups_with_counts(supabase)
 
-            if groups_response.data:
+            if groups:
                 groups_list = []
-                for group in groups_response.data:
-                    # Compter les étudiants inscrits
-                    enrollments = supabase.table('enrollments').select('*', count='exact').eq('group_id', group['id']).eq('enrollment_active', True).execute()
-
-                    # Compter les enseignants
-                    teachers = supabase.table('group_teacher').select('*', count='exact').eq('group_id', group['id']).execute()
-
+                for group in groups:
                     lang_name = group.get('languages', {}).get('name', 'N/A') if group.get('languages') else 'N/A'
-                    status = "✅ Prêt" if enrollments.count >= group['min_students'] else f"⏳ {enrollments.count}/{group['min_students']}"
+                    status = "✅ Prêt" if group['enrolled_count'] >= group['min_students'] else f"⏳ {group['enrolled_count']}/{group['min_students']}"
 
                     groups_list.append({
                         'ID': group['id'],
@@ -34,8 +63,8 @@ def show():
                         'Niveau': group['level'],
                         'Mode': group['mode'],
                         'Durée': f"{group['duration_months']} mois",
-                        'Étudiants': f"{enrollments.count}/{group['min_students']}",
-                        'Enseignants': teachers.count,
+                        'Étudiants': f"{group['enrolled_count']}/{group['min_students']}",
+                        'Enseignants': group['teacher_count'],
                         'Statut': status
                     })
 
@@ -49,14 +78,17 @@ def show():
                     ready = len([g for g in groups_list if '✅' in g['Statut']])
                     st.metric("Groupes Prêts", ready)
                 with col3:
-                    total_students = sum([int(g['Étudiants'].split('/')[0]) for g in groups_list])
+                    total_students = sum([g['enrolled_count'] for g in groups])
                     st.metric("Total Inscrits", total_students)
 
                 # Détails des groupes
                 st.divider()
                 st.subheader("Détails et Actions")
 
-                for group in groups_response.data:
+                # Liste des enseignants chargée une seule fois pour tous les groupes
+                teachers_all = get_reference_data('teachers')
+
+                for group in groups:
                     lang_name = group.get('languages', {}).get('name', 'N/A') if group.get('languages') else 'N/A'
                     with st.expander(f"{group['name']} - {lang_name} (Niveau {group['level']})"):
                         col1, col2 = st.columns([2, 1])
@@ -80,17 +112,18 @@ def show():
                             if st.button(f"Passer en tarif {nouveau_tarif}", key=f"toggle_pricing_{group['id']}"):
                                 try:
                                     supabase.table('groups').update({'is_old_pricing': not is_old}).eq('id', group['id']).execute()
+                                    publish_mutation('groups')
                                     st.success(f"Tarification changée en {nouveau_tarif}")
                                     st.rerun()
                                 except Exception as e:
                                     st.error(f"Erreur : {str(e)}")
 
                             # Afficher les enseignants
-                            group_teachers = supabase.table('group_teacher').select('*, teachers(first_name, last_name, email)').eq('group_id', group['id']).execute()
+                            group_teachers = group.get('group_teacher') or []
 
-                            if group_teachers.data:
+                            if group_teachers:
                                 st.markdown("**Enseignants:**")
-                                for gt in group_teachers.data:
+                                for gt in group_teachers:
                                     teacher = gt.get('teachers', {})
                                     st.write(f"- {teacher.get('first_name', 'N/A')} {teacher.get('last_name', 'N/A')} ({teacher.get('email', 'N/A')})")
 
@@ -98,6 +131,7 @@ def show():
                                     if st.button(f"Retirer {teacher.get('first_name', '')} {teacher.get('last_name', '')}", key=f"remove_teacher_{group['id']}_{gt['teacher_id']}"):
                                         try:
                                             supabase.table('group_teacher').delete().eq('group_id', group['id']).eq('teacher_id', gt['teacher_id']).execute()
+                                            publish_mutation('group_teacher')
                                             st.success("Enseignant retiré")
                                             st.rerun()
                                         except Exception as e:
@@ -107,9 +141,8 @@ def show():
 
                             # Ajouter un enseignant
                             st.markdown("**Ajouter un enseignant:**")
-                            teachers_all = supabase.table('teachers').select('*').execute()
-                            if teachers_all.data:
-                                teacher_options = {f"{t['first_name']} {t['last_name']}": t['id'] for t in teachers_all.data}
+                            if teachers_all:
+                                teacher_options = {f"{t['first_name']} {t['last_name']}": t['id'] for t in teachers_all}
                                 selected_teacher = st.selectbox("Sélectionner un enseignant", list(teacher_options.keys()), key=f"add_teacher_{group['id']}")
 
                                 if st.button("Ajouter l'enseignant", key=f"add_teacher_btn_{group['id']}"):
@@ -120,28 +153,31 @@ def show():
                                             st.warning("Cet enseignant est déjà assigné à ce groupe")
                                         else:
                                             supabase.table('group_teacher').insert({'group_id': group['id'], 'teacher_id': teacher_options[selected_teacher]}).execute()
+                                            publish_mutation('group_teacher')
                                             st.success("Enseignant ajouté")
                                             st.rerun()
                                     except Exception as e:
                                         st.error(f"Erreur : {str(e)}")
 
-                            # Afficher les étudiants
+                            # Afficher les étudiants (chargés seulement pour le groupe consulté)
                             st.divider()
-                            enrollments = supabase.table('enrollments').select('*, students(first_name, last_name, email, student_code)').eq('group_id', group['id']).execute()
-
-                            if enrollments.data:
-                                st.markdown("**Étudiants inscrits:**")
-                                for enr in enrollments.data:
-                                    student = enr.get('students', {})
-                                    status_icon = "✅" if enr['enrollment_active'] else "❌"
-                                    st.write(f"{status_icon} {student.get('first_name', 'N/A')} {student.get('last_name', 'N/A')} - {student.get('student_code', 'N/A')} (Niveau {enr['level']})")
-                            else:
-                                st.info("Aucun étudiant inscrit")
+                            if st.toggle("Afficher les étudiants inscrits", key=f"show_roster_{group['id']}"):
+                                enrollments = get_group_roster(supabase, group['id'])
+
+                                if enrollments:
+                                    st.markdown("**Étudiants inscrits:**")
+                                    for enr in enrollments:
+                                        student = enr.get('students') or {}
+                                        status_icon = "✅" if enr['enrollment_active'] else "❌"
+                                        st.write(f"{status_icon} {student.get('first_name', 'N/A')} {student.get('last_name', 'N/A')} - {student.get('student_code', 'N/A')} (Niveau {enr['level']})")
+                                else:
+                                    st.info("Aucun étudiant inscrit")
 
                         with col2:
                             if st.button("Supprimer", key=f"delete_{group['id']}", type="primary"):
                                 try:
                                     supabase.table('groups').delete().eq('id', group['id']).execute()
+                                    publish_mutation('groups', 'enrollments', 'schedule', 'group_teacher')
                                     st.success("Groupe supprimé")
                                     st.rerun()
                                 except Exception as e:
@@ -161,9 +197,9 @@ def show():
 
             # Récupérer les langues
             try:
-                languages = supabase.table('languages').select('*').execute()
-                if languages.data:
-                    lang_options = {lang['name']: lang['id'] for lang in languages.data}
+                languages = get_reference_data('languages')
+                if languages:
+                    lang_options = {lang['name']: lang['id'] for lang in languages}
                     selected_language = st.selectbox("Langue *", list(lang_options.keys()))
                 else:
                     st.error("Aucune langue disponible. Veuillez d'abord ajouter des langues.")
@@ -209,6 +245,7 @@ def show():
                             new_group['start_date'] = start_date.isoformat()
 
                         response = supabase.table('groups').insert(new_group).execute()
+                        publish_mutation('groups')
 
                         if response.data:
                             st.success("✅ Groupe ajouté avec succès!")
@@ -1,6 +1,8 @@
 import streamlit as st
 import pandas as pd
-from utils import get_supabase_client
+from utils import get_supabase_client, get_cash_position
+from cache import get_reference_data, publish_mutation
+from modules.students import student_picker
 from datetime import datetime
 
 # Tarifs des cours - Structure simplifiée
@@ -72,6 +74,54 @@ def mark_registration_fee_as_paid(supabase, student_id):
     Marque les frais d'inscription comme payés pour cet étudiant.
     """
     supabase.table('students').update({'registration_fee_paid': True}).eq('id', student_id).execute()
+    publish_mutation('students')
+
+def get_balance(enrollment):
+    """
+    Extrait le solde d'une inscription chargée avec enrollment_balances(paid_total, remaining, last_payment_date).
+
+    Returns:
+        dict: paid_total, remaining, last_payment_date
+    """
+    balance = enrollment.get('enrollment_balances')
+    if isinstance(balance, list):
+        balance = balance[0] if balance else None
+
+    if not balance:
+        # Inscription sans ligne de solde : aucun paiement enregistré
+        return {
+            'paid_total': 0,
+            'remaining': enrollment.get('total_course_fee', 0),
+            'last_payment_date': None
+        }
+
+    return balance
+
+def get_enrollment_balance(supabase, enrollment_id):
+    """
+    Lit le solde d'une inscription (enrollment_balances embarqué, une lecture indexée).
+    Sans ligne de solde, même repli que get_balance : rien payé, tout le cours restant.
+
+    Returns:
+        dict: paid_total, remaining, last_payment_date
+    """
+    response = supabase.table('enrollments').select(
+        'total_course_fee, enrollment_balances(paid_total, remaining, last_payment_date)'
+    ).eq('id', enrollment_id).execute()
+
+    return get_balance(response.data[0]) if response.data else {'paid_total': 0, 'remaining': 0, 'last_payment_date': None}
+
+def get_payment_history(supabase, enrollment_id):
+    """
+    Récupère l'historique des paiements d'une inscription, du plus récent au plus ancien.
+
+    Returns:
+        list: Lignes payments
+    """
+    response = supabase.table('payments').select(
+        'amount, payment_date, payment_method, receipt_link'
+    ).eq('enrollment_id', enrollment_id).order('payment_date', desc=True).execute()
+    return response.data or []
 
 def calculate_course_fee(language, mode, is_old_pricing=False, hours=10):
     """
@@ -122,7 +172,8 @@ def show():
 
         try:
             enrollments_response = supabase.table('enrollments').select(
-                '*, students(first_name, last_name, email, student_code), groups(name, mode, duration_months, languages(name))'
+                '*, students(first_name, last_name, email, student_code), groups(name, mode, duration_months, languages(name)), '
+                'enrollment_balances(paid_total, remaining, last_payment_date)'
             ).order('enrollment_date', desc=True).execute()
 
             if enrollments_response.data:
@@ -133,11 +184,10 @@ def show():
                     group = enr.get('groups', {})
                     lang_name = group.get('languages', {}).get('name', 'N/A') if group.get('languages') else 'N/A'
 
-                    # Calculer le total payé pour CETTE inscription uniquement
-                    payments = supabase.table('payments').select('amount').eq('enrollment_id', enr['id']).execute()
-                    total_paid = sum([p['amount'] for p in payments.data]) if payments.data else 0
-
-                    remaining = enr['total_course_fee'] - total_paid
+                    # Solde de CETTE inscription uniquement
+                    balance = get_balance(enr)
+                    total_paid = balance['paid_total']
+                    remaining = balance['remaining']
                     status = "✅ Active" if enr['enrollment_active'] else "❌ Inactive"
 
                     enrollments_list.append({
@@ -170,55 +220,31 @@ def show():
                 with col4:
                     # Afficher les statistiques de paiements (liquide vs en ligne)
                     try:
-                        # Paiements liquides en caisse
-                        last_reset = supabase.table('cash_register_resets').select('reset_date, amount_left, reset_by').order('reset_date', desc=True).limit(1).execute()
-
-                        if last_reset.data:
-                            last_reset_date = last_reset.data[0]['reset_date']
-                            amount_left_last_time = last_reset.data[0].get('amount_left', 0) or 0
-                            last_reset_by = last_reset.data[0].get('reset_by', 'N/A')
-
-                            # Compter UNIQUEMENT les paiements LIQUIDES depuis la dernière signature
-                            cash_payments = supabase.table('payments').select('amount').gte('payment_date', last_reset_date).eq('payment_method', 'liquide').execute()
-                            cash_total = sum([p['amount'] for p in cash_payments.data]) if cash_payments.data else 0
-
-                            # Montant total en caisse = argent laissé + nouveaux paiements liquides
-                            cash_register_amount = amount_left_last_time + cash_total
-
-                            # Compter les paiements EN LIGNE depuis la dernière signature
-                            online_payments = supabase.table('payments').select('amount').gte('payment_date', last_reset_date).eq('payment_method', 'en_ligne').execute()
-                            online_total = sum([p['amount'] for p in online_payments.data]) if online_payments.data else 0
+                        # Montant total en caisse = argent laissé + nouveaux paiements liquides
+                        position = get_cash_position()
+                        online_total = position['online_since_reset']
 
+                        if position['last_reset_date']:
                             # Afficher la métrique caisse
-                            reset_datetime = datetime.fromisoformat(last_reset_date.replace('Z', '+00:00'))
+                            reset_datetime = datetime.fromisoformat(position['last_reset_date'].replace('Z', '+00:00'))
                             last_reset_text = reset_datetime.strftime('%d/%m/%Y')
-                            st.metric("💵 Caisse (Liquide)", f"{cash_register_amount:,.0f} DA",
+                            st.metric("💵 Caisse (Liquide)", f"{position['current_amount']:,.0f} DA",
                                      delta=f"Dernier comptage: {last_reset_text}")
                         else:
                             # Pas de signature précédente
-                            cash_payments = supabase.table('payments').select('amount').eq('payment_method', 'liquide').execute()
-                            cash_register_amount = sum([p['amount'] for p in cash_payments.data]) if cash_payments.data else 0
-
-                            online_payments = supabase.table('payments').select('amount').eq('payment_method', 'en_ligne').execute()
-                            online_total = sum([p['amount'] for p in online_payments.data]) if online_payments.data else 0
-
-                            st.metric("💵 Caisse (Liquide)", f"{cash_register_amount:,.0f} DA", delta="Aucun comptage")
+                            st.metric("💵 Caisse (Liquide)", f"{position['current_amount']:,.0f} DA", delta="Aucun comptage")
                     except Exception as e:
+                        online_total = None
                         st.metric("💵 Caisse", "Erreur", delta=str(e))
 
                 # Deuxième ligne de métriques pour les paiements en ligne
                 st.divider()
                 col5, col6, col7, col8 = st.columns(4)
                 with col5:
-                    try:
-                        # Total paiements en ligne
-                        if 'online_total' in locals():
-                            st.metric("💳 Paiements En Ligne", f"{online_total:,.0f} DA")
-                        else:
-                            online_payments = supabase.table('payments').select('amount').eq('payment_method', 'en_ligne').execute()
-                            online_total = sum([p['amount'] for p in online_payments.data]) if online_payments.data else 0
-                            st.metric("💳 Paiements En Ligne", f"{online_total:,.0f} DA")
-                    except Exception as e:
+                    # Total paiements en ligne depuis la dernière signature
+                    if online_total is not None:
+                        st.metric("💳 Paiements En Ligne", f"{online_total:,.0f} DA")
+                    else:
                         st.metric("💳 En Ligne", "Erreur")
 
                 # Détails des inscriptions
@@ -240,26 +266,24 @@ def show():
                             st.write(f"**Mode:** {group.get('mode', 'N/A')}")
                             st.write(f"**Total Cours:** {enr['total_course_fee']:,.0f} DA")
 
-                            # Historique des paiements pour CETTE inscription uniquement
-                            payments = supabase.table('payments').select('*').eq('enrollment_id', enr['id']).order('payment_date', desc=True).execute()
-
-                            if payments.data:
-                                total_paid = sum([p['amount'] for p in payments.data])
-                                remaining = enr['total_course_fee'] - total_paid
-
-                                st.write(f"**Total Payé:** {total_paid:,.0f} DA")
-                                st.write(f"**Restant:** {remaining:,.0f} DA")
-
-                                st.markdown("**Historique des paiements:**")
-                                for payment in payments.data:
-                                    date = payment.get('payment_date', 'N/A')
-                                    if date != 'N/A':
-                                        date = datetime.fromisoformat(date.replace('Z', '+00:00')).strftime('%d/%m/%Y %H:%M')
-                                    receipt = payment.get('receipt_link')
-                                    receipt_text = f" - [📄 Reçu]({receipt})" if receipt else ""
-                                    # Afficher l'icône de la méthode de paiement
-                                    method_icon = "💵" if payment.get('payment_method') == 'liquide' else "💳"
-                                    st.write(f"- {method_icon} {payment['amount']:,.0f} DA le {date}{receipt_text}")
+                            # Solde de CETTE inscription (enrollment_balances embarqué)
+                            balance = get_balance(enr)
+
+                            if balance['last_payment_date']:
+                                st.write(f"**Total Payé:** {balance['paid_total']:,.0f} DA")
+                                st.write(f"**Restant:** {balance['remaining']:,.0f} DA")
+
+                                # Historique chargé seulement pour l'inscription consultée
+                                if st.toggle("Historique des paiements", key=f"payment_history_{enr['id']}"):
+                                    for payment in get_payment_history(supabase, enr['id']):
+                                        date = payment.get('payment_date') or 'N/A'
+                                        if date != 'N/A':
+                                            date = datetime.fromisoformat(date.replace('Z', '+00:00')).strftime('%d/%m/%Y %H:%M')
+                                        receipt = payment.get('receipt_link')
+                                        receipt_text = f" - [📄 Reçu]({receipt})" if receipt else ""
+                                        # Afficher l'icône de la méthode de paiement
+                                        method_icon = "💵" if payment.get('payment_method') == 'liquide' else "💳"
+                                        st.write(f"- {method_icon} {payment['amount']:,.0f} DA le {date}{receipt_text}")
                             else:
                                 st.warning("Aucun paiement enregistré")
 
@@ -270,6 +294,7 @@ def show():
                             if st.button("Supprimer", key=f"delete_enr_{enr['id']}", type="primary"):
                                 try:
                                     supabase.table('enrollments').delete().eq('id', enr['id']).execute()
+                                    publish_mutation('enrollments')
                                     st.success("Inscription supprimée")
                                     st.rerun()
                                 except Exception as e:
@@ -282,358 +307,366 @@ def show():
             st.error(f"Erreur : {str(e)}")
 
     with tab2:
-        st.subheader("Nouvelle Inscription")
-
-        with st.form("new_enrollment_form"):
-            # Sélectionner l'étudiant
-            try:
-                students = supabase.table('students').select('*').order('created_at', desc=True).execute()
-                if students.data:
-                    student_options = {f"{s['first_name']} {s['last_name']} ({s.get('student_code', 'N/A')})": s for s in students.data}
-                    selected_student = st.selectbox("Étudiant *", list(student_options.keys()))
-                else:
-                    st.error("Aucun étudiant disponible")
-                    selected_student = None
-            except Exception as e:
-                st.error(f"Erreur : {str(e)}")
-                selected_student = None
-
-            # Sélectionner le groupe
-            try:
-                groups = supabase.table('groups').select('*, languages(name)').execute()
-                if groups.data:
-                    group_options = {}
-                    for g in groups.data:
-                        lang_name = g['languages']['name'] if g.get('languages') else 'N/A'
-                        tarif = "OLD" if g.get('is_old_pricing', False) else "NEW"
-                        label = f"{g['name']} ({lang_name}, {tarif})"
-                        group_options[label] = g
-                    selected_group = st.selectbox("Groupe *", list(group_options.keys()))
-                else:
-                    st.error("Aucun groupe disponible")
-                    selected_group = None
-            except Exception as e:
-                st.error(f"Erreur : {str(e)}")
-                selected_group = None
+        new_enrollment_section(supabase)
 
-            # Créer une clé unique si on a un groupe et un étudiant sélectionnés
-            form_key = None
-            if selected_group and selected_student:
-                group_data_temp = group_options[selected_group]
-                student_data_temp = student_options[selected_student]
-                form_key = f"{group_data_temp['id']}_{student_data_temp['id']}"
+    with tab3:
+        payment_section(supabase)
 
-            # Afficher le champ niveau avec une clé dynamique si disponible
-            if form_key:
-                level = st.number_input("Niveau *", min_value=1, value=1, key=f"level_{form_key}")
-            else:
-                level = st.number_input("Niveau *", min_value=1, value=1)
+@st.fragment
+def new_enrollment_section(supabase):
+    """
+    Formulaire de nouvelle inscription. Fragment : la recherche d'étudiant et le choix
+    du groupe ne réexécutent que cette section (pas la liste des inscriptions).
+    """
+    st.subheader("Nouvelle Inscription")
 
-            # CHECKBOX OLD/NEW - UNE SEULE définition pour être capturée au submit
-            st.divider()
+    # Sélectionner l'étudiant (hors formulaire pour filtrer pendant la saisie)
+    try:
+        selected_student = student_picker(supabase, key="enrollment_student")
+    except Exception as e:
+        st.error(f"Erreur : {str(e)}")
+        selected_student = None
 
-            # Déterminer la valeur par défaut de la checkbox
-            if selected_group and selected_student:
-                group_data_for_checkbox = group_options[selected_group]
-                default_old_pricing = group_data_for_checkbox.get('is_old_pricing', False)
-                checkbox_disabled = False
-                checkbox_help = "Cochez pour appliquer l'ancien tarif à cet étudiant"
+    with st.form("new_enrollment_form"):
+        # Sélectionner le groupe
+        try:
+            groups = get_reference_data('groups', '*, languages(name)')
+            if groups:
+                group_options = {}
+                for g in groups:
+                    lang_name = g['languages']['name'] if g.get('languages') else 'N/A'
+                    tarif = "OLD" if g.get('is_old_pricing', False) else "NEW"
+                    label = f"{g['name']} ({lang_name}, {tarif})"
+                    group_options[label] = g
+                selected_group = st.selectbox("Groupe *", list(group_options.keys()))
             else:
-                default_old_pricing = False
-                checkbox_disabled = True
-                checkbox_help = "Sélectionnez d'abord un étudiant et un groupe"
-
-            # UNE SEULE checkbox (pas deux!)
-            use_old_pricing = st.checkbox(
-                "Appliquer l'ancienne tarification (OLD) pour cet étudiant",
-                value=default_old_pricing,
-                disabled=checkbox_disabled,
-                key=f"use_old_pricing_{form_key}" if form_key else "use_old_pricing_default",
-                help=checkbox_help
-            )
-
-            # Calculer automatiquement les frais
-            if selected_group and selected_student:
-                group_data = group_options[selected_group]
-                student_data = student_options[selected_student]
-
-                lang_name = group_data['languages']['name'] if group_data.get('languages') else 'Japonais'
-                mode = group_data['mode']
-                duration = group_data['duration_months']
-
-                # Calculer le prix du cours selon le choix de tarification
-                if 'individual' in mode:
-                    hours = st.number_input("Nombre d'heures", min_value=1, value=10, key=f"hours_{form_key}")
-                    course_fee = calculate_course_fee(lang_name, mode, use_old_pricing, hours)
-                else:
-                    course_fee = calculate_course_fee(lang_name, mode, use_old_pricing)
+                st.error("Aucun groupe disponible")
+                selected_group = None
+        except Exception as e:
+            st.error(f"Erreur : {str(e)}")
+            selected_group = None
+
+        # Créer une clé unique si on a un groupe et un étudiant sélectionnés
+        form_key = None
+        if selected_group and selected_student:
+            group_data_temp = group_options[selected_group]
+            student_data_temp = selected_student
+            form_key = f"{group_data_temp['id']}_{student_data_temp['id']}"
+
+        # Afficher le champ niveau avec une clé dynamique si disponible
+        if form_key:
+            level = st.number_input("Niveau *", min_value=1, value=1, key=f"level_{form_key}")
+        else:
+            level = st.number_input("Niveau *", min_value=1, value=1)
+
+        # CHECKBOX OLD/NEW - UNE SEULE définition pour être capturée au submit
+        st.divider()
+
+        # Déterminer la valeur par défaut de la checkbox
+        if selected_group and selected_student:
+            group_data_for_checkbox = group_options[selected_group]
+            default_old_pricing = group_data_for_checkbox.get('is_old_pricing', False)
+            checkbox_disabled = False
+            checkbox_help = "Cochez pour appliquer l'ancien tarif à cet étudiant"
+        else:
+            default_old_pricing = False
+            checkbox_disabled = True
+            checkbox_help = "Sélectionnez d'abord un étudiant et un groupe"
+
+        # UNE SEULE checkbox (pas deux!)
+        use_old_pricing = st.checkbox(
+            "Appliquer l'ancienne tarification (OLD) pour cet étudiant",
+            value=default_old_pricing,
+            disabled=checkbox_disabled,
+            key=f"use_old_pricing_{form_key}" if form_key else "use_old_pricing_default",
+            help=checkbox_help
+        )
+
+        # Calculer automatiquement les frais
+        if selected_group and selected_student:
+            group_data = group_options[selected_group]
+            student_data = selected_student
+
+            lang_name = group_data['languages']['name'] if group_data.get('languages') else 'Japonais'
+            mode = group_data['mode']
+            duration = group_data['duration_months']
+
+            # Calculer le prix du cours selon le choix de tarification
+            if 'individual' in mode:
+                hours = st.number_input("Nombre d'heures", min_value=1, value=10, key=f"hours_{form_key}")
+                course_fee = calculate_course_fee(lang_name, mode, use_old_pricing, hours)
+            else:
+                course_fee = calculate_course_fee(lang_name, mode, use_old_pricing)
 
-                # Vérifier si les frais d'inscription ont déjà été payés cette année
-                registration_fee_paid = get_student_registration_status(supabase, student_data['id'])
+            # Vérifier si les frais d'inscription ont déjà été payés cette année
+            registration_fee_paid = get_student_registration_status(supabase, student_data['id'])
 
-                # Calculer le montant total (sera sauvegardé dans enrollments.total_course_fee)
-                total_fee = course_fee + (0 if registration_fee_paid else INSCRIPTION_FEE)
+            # Calculer le montant total (sera sauvegardé dans enrollments.total_course_fee)
+            total_fee = course_fee + (0 if registration_fee_paid else INSCRIPTION_FEE)
 
-                # Champ du montant du premier paiement
-                st.divider()
-                if 'individual' in mode and 'online' in mode:
-                    # Cours individuels en ligne : paiement intégral obligatoire
-                    payment_amount = st.number_input(
-                        "Montant du premier paiement (DA) *",
-                        min_value=float(total_fee),
-                        value=float(total_fee),
-                        step=1000.0,
-                        key=f"payment_amount_{form_key}"
-                    )
-                else:
-                    # Autres cours : paiement flexible
-                    payment_amount = st.number_input(
-                        "Montant du premier paiement (DA) *",
-                        min_value=0.0,
-                        value=float(total_fee),
-                        step=1000.0,
-                        key=f"payment_amount_{form_key}"
-                    )
-
-                # Méthode de paiement
-                payment_method = st.selectbox(
-                    "Méthode de paiement *",
-                    ["💵 Liquide", "💳 En Ligne"],
-                    help="Sélectionnez si le paiement est en liquide ou en ligne"
+            # Champ du montant du premier paiement
+            st.divider()
+            if 'individual' in mode and 'online' in mode:
+                # Cours individuels en ligne : paiement intégral obligatoire
+                payment_amount = st.number_input(
+                    "Montant du premier paiement (DA) *",
+                    min_value=float(total_fee),
+                    value=float(total_fee),
+                    step=1000.0,
+                    key=f"payment_amount_{form_key}"
                 )
             else:
-                total_fee = 0
-                course_fee = 0
-                payment_amount = 0
-                registration_fee_paid = False
-                payment_method = "💵 Liquide"
-                hours = 10
-
-            st.markdown("*Les champs marqués d'un astérisque sont obligatoires*")
-
-            submitted = st.form_submit_button("Créer l'inscription", use_container_width=True)
-
-            if submitted:
-                if selected_student and selected_group:
-                    try:
-                        student_data = student_options[selected_student]
-                        group_data = group_options[selected_group]
-
-                        # RECALCULER total_fee au moment du submit avec les vraies valeurs
-                        # (car dans un formulaire Streamlit, les variables ne se mettent pas à jour dynamiquement)
-                        lang_name = group_data['languages']['name'] if group_data.get('languages') else 'Japonais'
-                        mode = group_data['mode']
-                        duration = group_data['duration_months']
-
-                        # DEBUG: Afficher use_old_pricing au moment du submit
-                        st.write(f"DEBUG SUBMIT: use_old_pricing = {use_old_pricing}")
-
-                        # Utiliser use_old_pricing et hours capturés au submit
-                        if 'individual' in mode:
-                            course_fee = calculate_course_fee(lang_name, mode, use_old_pricing, hours)
-                        else:
-                            course_fee = calculate_course_fee(lang_name, mode, use_old_pricing)
-
-                        st.write(f"DEBUG SUBMIT: course_fee = {course_fee} DA")
-
-                        # Recalculer total_fee avec le bon course_fee
-                        registration_fee_paid_submit = get_student_registration_status(supabase, student_data['id'])
-                        total_fee = course_fee + (0 if registration_fee_paid_submit else INSCRIPTION_FEE)
-
-                        st.write(f"DEBUG SUBMIT: total_fee = {total_fee} DA (course_fee {course_fee} + frais {0 if registration_fee_paid_submit else INSCRIPTION_FEE})")
-
-                        # Vérifier les conditions d'activation
-                        enrollment_active = False
-
-                        if 'individual' in mode and 'online' in mode:
-                            # Paiement intégral requis pour cours individuels en ligne
-                            if payment_amount >= total_fee:
-                                enrollment_active = True
-                        else:
-                            # Pour les autres cours
-                            if registration_fee_paid_submit:
-                                # Frais d'inscription déjà payés : activer dès qu'il y a un paiement
-                                enrollment_active = True
-                            else:
-                                # Frais d'inscription pas encore payés : activer si paiement >= 1000 DA
-                                if payment_amount >= INSCRIPTION_FEE:
-                                    enrollment_active = True
-
-                        # Créer l'inscription
-                        new_enrollment = {
-                            'student_id': student_data['id'],
-                            'group_id': group_data['id'],
-                            'level': level,
-                            'total_course_fee': total_fee,
-                            'enrollment_active': enrollment_active
-                        }
-
-                        enr_response = supabase.table('enrollments').insert(new_enrollment).execute()
-
-                        if enr_response.data:
-                            # Convertir la méthode de paiement
-                            method_value = 'liquide' if '💵' in payment_method else 'en_ligne'
-
-                            # Enregistrer le premier paiement lié à cette inscription
-                            new_payment = {
-                                'student_id': student_data['id'],
-                                'enrollment_id': enr_response.data[0]['id'],
-                                'amount': payment_amount,
-                                'payment_method': method_value,
-                                'receipt_link': None
-                            }
-
-                            pay_response = supabase.table('payments').insert(new_payment).execute()
-
-                            if pay_response.data:
-                                # Si c'est le premier enrollment et paiement >= 1000 DA, marquer les frais comme payés
-                                if not registration_fee_paid_submit and payment_amount >= INSCRIPTION_FEE:
-                                    mark_registration_fee_as_paid(supabase, student_data['id'])
-
-                                status_msg = "activée" if enrollment_active else "créée (paiement insuffisant pour activation)"
-                                st.success(f"✅ Inscription {status_msg} avec succès!")
-                                st.rerun()
-                            else:
-                                st.error("Inscription créée mais erreur lors de l'enregistrement du paiement")
-                        else:
-                            st.error("Erreur lors de la création de l'inscription")
-
-                    except Exception as e:
-                        st.error(f"Erreur : {str(e)}")
-                else:
-                    st.warning("Veuillez sélectionner un étudiant et un groupe")
-
-    with tab3:
-        st.subheader("Enregistrer un Paiement")
-
-        with st.form("add_payment_form"):
-            # Sélectionner l'étudiant
-            try:
-                students = supabase.table('students').select('*').order('created_at', desc=True).execute()
-                if students.data:
-                    student_options = {f"{s['first_name']} {s['last_name']} ({s.get('student_code', 'N/A')})": s for s in students.data}
-                    selected_student = st.selectbox("Étudiant *", list(student_options.keys()), key="payment_student")
-
-                    # Sélectionner l'inscription
-                    selected_enrollment = None
-                    enrollment_options = {}
-                    if selected_student:
-                        student_data = student_options[selected_student]
-                        enrollments = supabase.table('enrollments').select('*, groups(name, languages(name))').eq('student_id', student_data['id']).execute()
-
-                        if enrollments.data:
-                            for enr in enrollments.data:
-                                group = enr.get('groups', {})
-                                lang_name = group.get('languages', {}).get('name', 'N/A') if group.get('languages') else 'N/A'
-
-                                # Calculer le solde pour cette inscription
-                                payments = supabase.table('payments').select('amount').eq('enrollment_id', enr['id']).execute()
-                                total_paid = sum([p['amount'] for p in payments.data]) if payments.data else 0
-                                remaining = enr['total_course_fee'] - total_paid
-
-                                status_icon = "✅" if enr['enrollment_active'] else "❌"
-                                label = f"{group.get('name', 'N/A')} ({lang_name}) - Restant: {remaining:,.0f} DA {status_icon}"
-                                enrollment_options[label] = enr
-
-                            selected_enrollment = st.selectbox("Inscription *", list(enrollment_options.keys()), key="payment_enrollment")
-
-                            # Afficher le détail du solde pour l'inscription sélectionnée
-                            if selected_enrollment:
-                                enr_data = enrollment_options[selected_enrollment]
-                                payments = supabase.table('payments').select('amount').eq('enrollment_id', enr_data['id']).execute()
-                                total_paid = sum([p['amount'] for p in payments.data]) if payments.data else 0
-                                remaining = enr_data['total_course_fee'] - total_paid
-
-                                if remaining > 0:
-                                    st.warning(f"💰 Montant restant pour cette inscription: {remaining:,.0f} DA")
-                                else:
-                                    st.success("✅ Cette inscription est entièrement payée")
-                        else:
-                            st.info("Aucune inscription pour cet étudiant")
-                else:
-                    st.error("Aucun étudiant disponible")
-                    selected_student = None
-            except Exception as e:
-                st.error(f"Erreur : {str(e)}")
-                selected_student = None
-                selected_enrollment = None
-
-            amount = st.number_input("Montant du paiement (DA) *", min_value=100.0, step=100.0)
-            receipt_link = st.text_input("Lien du reçu (URL)")
+                # Autres cours : paiement flexible
+                payment_amount = st.number_input(
+                    "Montant du premier paiement (DA) *",
+                    min_value=0.0,
+                    value=float(total_fee),
+                    step=1000.0,
+                    key=f"payment_amount_{form_key}"
+                )
 
             # Méthode de paiement
-            payment_method_tab3 = st.selectbox(
+            payment_method = st.selectbox(
                 "Méthode de paiement *",
                 ["💵 Liquide", "💳 En Ligne"],
-                help="Sélectionnez si le paiement est en liquide ou en ligne",
-                key="payment_method_tab3"
+                help="Sélectionnez si le paiement est en liquide ou en ligne"
             )
+        else:
+            total_fee = 0
+            course_fee = 0
+            payment_amount = 0
+            registration_fee_paid = False
+            payment_method = "💵 Liquide"
+            hours = 10
+
+        st.markdown("*Les champs marqués d'un astérisque sont obligatoires*")
+
+        submitted = st.form_submit_button("Créer l'inscription", use_container_width=True)
+
+        if submitted:
+            if selected_student and selected_group:
+                try:
+                    student_data = selected_student
+                    group_data = group_options[selected_group]
+
+                    # RECALCULER total_fee au moment du submit avec les vraies valeurs
+                    # (car dans un formulaire Streamlit, les variables ne se mettent pas à jour dynamiquement)
+                    lang_name = group_data['languages']['name'] if group_data.get('languages') else 'Japonais'
+                    mode = group_data['mode']
+                    duration = group_data['duration_months']
+
+                    # DEBUG: Afficher use_old_pricing au moment du submit
+                    st.write(f"DEBUG SUBMIT: use_old_pricing = {use_old_pricing}")
+
+                    # Utiliser use_old_pricing et hours capturés au submit
+                    if 'individual' in mode:
+                        course_fee = calculate_course_fee(lang_name, mode, use_old_pricing, hours)
+                    else:
+                        course_fee = calculate_course_fee(lang_name, mode, use_old_pricing)
+
+                    st.write(f"DEBUG SUBMIT: course_fee = {course_fee} DA")
+
+                    # Recalculer total_fee avec le bon course_fee
+                    registration_fee_paid_submit = get_student_registration_status(supabase, student_data['id'])
+                    total_fee = course_fee + (0 if registration_fee_paid_submit else INSCRIPTION_FEE)
+
+                    st.write(f"DEBUG SUBMIT: total_fee = {total_fee} DA (course_fee {course_fee} + frais {0 if registration_fee_paid_submit else INSCRIPTION_FEE})")
+
+                    # Vérifier les conditions d'activation
+                    enrollment_active = False
+
+                    if 'individual' in mode and 'online' in mode:
+                        # Paiement intégral requis pour cours individuels en ligne
+                        if payment_amount >= total_fee:
+                            enrollment_active = True
+                    else:
+                        # Pour les autres cours
+                        if registration_fee_paid_submit:
+                            # Frais d'inscription déjà payés : activer dès qu'il y a un paiement
+                            enrollment_active = True
+                        else:
+                            # Frais d'inscription pas encore payés : activer si paiement >= 1000 DA
+                            if payment_amount >= INSCRIPTION_FEE:
+                                enrollment_active = True
 
-            st.markdown("*Les champs marqués d'un astérisque sont obligatoires*")
+                    # Créer l'inscription
+                    new_enrollment = {
+                        'student_id': student_data['id'],
+                        'group_id': group_data['id'],
+                        'level': level,
+                        'total_course_fee': total_fee,
+                        'enrollment_active': enrollment_active
+                    }
 
-            submitted = st.form_submit_button("Enregistrer le paiement", use_container_width=True)
-
-            if submitted:
-                if selected_student and selected_enrollment and amount > 0:
-                    try:
-                        student_data = student_options[selected_student]
-                        enr_data = enrollment_options[selected_enrollment]
+                    enr_response = supabase.table('enrollments').insert(new_enrollment).execute()
+                    publish_mutation('enrollments')
 
+                    if enr_response.data:
                         # Convertir la méthode de paiement
-                        method_value = 'liquide' if '💵' in payment_method_tab3 else 'en_ligne'
+                        method_value = 'liquide' if '💵' in payment_method else 'en_ligne'
 
-                        # Enregistrer le paiement lié à cette inscription
+                        # Enregistrer le premier paiement lié à cette inscription
                         new_payment = {
                             'student_id': student_data['id'],
-                            'enrollment_id': enr_data['id'],
-                            'amount': amount,
+                            'enrollment_id': enr_response.data[0]['id'],
+                            'amount': payment_amount,
                             'payment_method': method_value,
-                            'receipt_link': receipt_link if receipt_link else None
+                            'receipt_link': None
                         }
 
-                        response = supabase.table('payments').insert(new_payment).execute()
+                        pay_response = supabase.table('payments').insert(new_payment).execute()
+                        publish_mutation('payments')
 
-                        if response.data:
-                            # Marquer les frais d'inscription comme payés si nécessaire
-                            student_reg_status = get_student_registration_status(supabase, student_data['id'])
-                            if not student_reg_status and amount >= INSCRIPTION_FEE:
+                        if pay_response.data:
+                            # Si c'est le premier enrollment et paiement >= 1000 DA, marquer les frais comme payés
+                            if not registration_fee_paid_submit and payment_amount >= INSCRIPTION_FEE:
                                 mark_registration_fee_as_paid(supabase, student_data['id'])
 
-                            # Vérifier si on doit activer cette inscription
-                            if not enr_data['enrollment_active']:
-                                # Recalculer le total payé pour cette inscription
-                                payments = supabase.table('payments').select('amount').eq('enrollment_id', enr_data['id']).execute()
-                                total_paid = sum([p['amount'] for p in payments.data]) if payments.data else 0
-
-                                group = enr_data.get('groups', {})
-                                mode = group.get('mode', '')
-
-                                should_activate = False
-
-                                if 'individual' in mode and 'online' in mode:
-                                    # Vérifier si paiement intégral pour cours individuels en ligne
-                                    if total_paid >= enr_data['total_course_fee']:
-                                        should_activate = True
-                                else:
-                                    # Vérifier si minimum atteint
-                                    # Si frais d'inscription déjà payés, activer immédiatement
-                                    # Sinon, activer si total_paid >= 1000 DA
-                                    if student_reg_status or total_paid >= INSCRIPTION_FEE:
-                                        should_activate = True
-
-                                if should_activate:
-                                    supabase.table('enrollments').update({'enrollment_active': True}).eq('id', enr_data['id']).execute()
-                                    st.success("✅ Paiement enregistré et inscription activée!")
-                                else:
-                                    st.success("✅ Paiement enregistré avec succès!")
-                            else:
-                                st.success("✅ Paiement enregistré avec succès!")
-
+                            status_msg = "activée" if enrollment_active else "créée (paiement insuffisant pour activation)"
+                            st.success(f"✅ Inscription {status_msg} avec succès!")
                             st.rerun()
                         else:
-                            st.error("Erreur lors de l'enregistrement du paiement")
+                            st.error("Inscription créée mais erreur lors de l'enregistrement du paiement")
+                    else:
+                        st.error("Erreur lors de la création de l'inscription")
 
-                    except Exception as e:
-                        st.error(f"Erreur : {str(e)}")
+                except Exception as e:
+                    st.error(f"Erreur : {str(e)}")
+            else:
+                st.warning("Veuillez sélectionner un étudiant et un groupe")
+
+@st.fragment
+def payment_section(supabase):
+    """
+    Formulaire d'enregistrement d'un paiement. Fragment : la recherche d'étudiant ne
+    réexécute que cette section ; après l'écriture, st.rerun() rafraîchit toute la page.
+    """
+    st.subheader("Enregistrer un Paiement")
+
+    # Sélectionner l'étudiant (hors formulaire pour filtrer pendant la saisie)
+    try:
+        selected_student = student_picker(supabase, key="payment_student")
+    except Exception as e:
+        st.error(f"Erreur : {str(e)}")
+        selected_student = None
+
+    with st.form("add_payment_form"):
+        try:
+            # Sélectionner l'inscription
+            selected_enrollment = None
+            enrollment_options = {}
+            if selected_student:
+                student_data = selected_student
+                enrollments = supabase.table('enrollments').select(
+                    '*, groups(name, mode, languages(name)), enrollment_balances(paid_total, remaining, last_payment_date)'
+                ).eq('student_id', student_data['id']).execute()
+
+                if enrollments.data:
+                    for enr in enrollments.data:
+                        group = enr.get('groups', {})
+                        lang_name = group.get('languages', {}).get('name', 'N/A') if group.get('languages') else 'N/A'
+
+                        # Solde de cette inscription
+                        remaining = get_balance(enr)['remaining']
+
+                        status_icon = "✅" if enr['enrollment_active'] else "❌"
+                        label = f"{group.get('name', 'N/A')} ({lang_name}) - Restant: {remaining:,.0f} DA {status_icon}"
+                        enrollment_options[label] = enr
+
+                    selected_enrollment = st.selectbox("Inscription *", list(enrollment_options.keys()), key="payment_enrollment")
+
+                    # Afficher le détail du solde pour l'inscription sélectionnée
+                    if selected_enrollment:
+                        enr_data = enrollment_options[selected_enrollment]
+                        remaining = get_balance(enr_data)['remaining']
+
+                        if remaining > 0:
+                            st.warning(f"💰 Montant restant pour cette inscription: {remaining:,.0f} DA")
+                        else:
+                            st.success("✅ Cette inscription est entièrement payée")
                 else:
-                    st.warning("Veuillez sélectionner un étudiant, une inscription et saisir un montant")
+                    st.info("Aucune inscription pour cet étudiant")
+        except Exception as e:
+            st.error(f"Erreur : {str(e)}")
+            selected_enrollment = None
+
+        amount = st.number_input("Montant du paiement (DA) *", min_value=100.0, step=100.0)
+        receipt_link = st.text_input("Lien du reçu (URL)")
+
+        # Méthode de paiement
+        payment_method_tab3 = st.selectbox(
+            "Méthode de paiement *",
+            ["💵 Liquide", "💳 En Ligne"],
+            help="Sélectionnez si le paiement est en liquide ou en ligne",
+            key="payment_method_tab3"
+        )
+
+        st.markdown("*Les champs marqués d'un astérisque sont obligatoires*")
+
+        submitted = st.form_submit_button("Enregistrer le paiement", use_container_width=True)
+
+        if submitted:
+            if selected_student and selected_enrollment and amount > 0:
+                try:
+                    student_data = selected_student
+                    enr_data = enrollment_options[selected_enrollment]
+
+                    # Convertir la méthode de paiement
+                    method_value = 'liquide' if '💵' in payment_method_tab3 else 'en_ligne'
+
+                    # Enregistrer le paiement lié à cette inscription
+                    new_payment = {
+                        'student_id': student_data['id'],
+                        'enrollment_id': enr_data['id'],
+                        'amount': amount,
+                        'payment_method': method_value,
+                        'receipt_link': receipt_link if receipt_link else None
+                    }
+
+                    response = supabase.table('payments').insert(new_payment).execute()
+                    publish_mutation('payments')
+
+                    if response.data:
+                        # Marquer les frais d'inscription comme payés si nécessaire
+                        student_reg_status = get_student_registration_status(supabase, student_data['id'])
+                        if not student_reg_status and amount >= INSCRIPTION_FEE:
+                            mark_registration_fee_as_paid(supabase, student_data['id'])
+
+                        # Vérifier si on doit activer cette inscription
+                        if not enr_data['enrollment_active']:
+                            # Total payé mis à jour par le trigger sur payments
+                            total_paid = get_enrollment_balance(supabase, enr_data['id'])['paid_total']
+
+                            group = enr_data.get('groups', {})
+                            mode = group.get('mode', '')
+
+                            should_activate = False
+
+                            if 'individual' in mode and 'online' in mode:
+                                # Vérifier si paiement intégral pour cours individuels en ligne
+                                if total_paid >= enr_data['total_course_fee']:
+                                    should_activate = True
+                            else:
+                                # Vérifier si minimum atteint
+                                # Si frais d'inscription déjà payés, activer immédiatement
+                                # Sinon, activer si total_paid >= 1000 DA
+                                if student_reg_status or total_paid >= INSCRIPTION_FEE:
+                                    should_activate = True
+
+                            if should_activate:
+                                supabase.table('enrollments').update({'enrollment_active': True}).eq('id', enr_data['id']).execute()
+                                publish_mutation('enrollments')
+                                st.success("✅ Paiement enregistré et inscription activée!")
+                            else:
+                                st.success("✅ Paiement enregistré avec succès!")
+                        else:
+                            st.success("✅ Paiement enregistré avec succès!")
+
+                        st.rerun()
+                    else:
+                        st.error("Erreur lors de l'enregistrement du paiement")
+
+                except Exception as e:
+                    st.error(f"Erreur : {str(e)}")
+            else:
+                st.warning("Veuillez sélectionner un étudiant, une inscription et saisir un montant")
@@ -1,5 +1,6 @@
 import streamlit as st
 from utils import get_supabase_client
+from cache import publish_mutation
 from auth import update_password
 
 def show():
@@ -48,6 +49,7 @@ def show():
                     }
 
                     supabase.table('users').update(update_data).eq('id', user_data['user_id']).execute()
+                    publish_mutation('users')
 
                     # Si enseignant, mettre à jour aussi dans teachers
                     if user_data['role'] == 'teacher' and user_data.get('teacher_id'):
@@ -56,6 +58,7 @@ def show():
                             'last_name': last_name
                         }
                         supabase.table('teachers').update(teacher_update).eq('id', user_data['teacher_id']).execute()
+                        publish_mutation('teachers')
 
                     # Mettre à jour la session
                     st.session_state.user_data['first_name'] = first_name
@@ -1,7 +1,10 @@
 import streamlit as st
 import pandas as pd
 from utils import get_supabase_client
-from datetime import datetime, time
+from cache import get_reference_data, publish_mutation, subscribe_mutations
+from schedule_conflicts import load_schedule_index, describe_conflict, is_schedule_conflict_error
+from schedule_planner import plan_from_csv, insert_planned_slots
+from datetime import time
 
 DAYS_OF_WEEK = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi', 'Dimanche']
 
@@ -16,6 +19,101 @@ def show():
     else:
         show_admin_schedule(supabase)
 
+@st.cache_data(ttl=600, show_spinner=False)
+def get_teacher_timetable(_supabase, teacher_id):
+    """
+    Planning hebdomadaire d'un enseignant, en une seule requête
+    (group_teacher -> groups -> schedule -> classrooms).
+
+    Le résultat est mis en cache par enseignant et évincé dès qu'un planning,
+    un groupe, une salle ou une affectation est modifié (voir subscribe_mutations).
+
+    Args:
+        _supabase: Client Supabase (exclu de la clé du cache)
+        teacher_id: ID de l'enseignant
+
+    Returns:
+        tuple: (jour -> liste des créneaux triés par heure de début (voir build_week_index),
+                nombre de groupes assignés)
+    """
+    response = _supabase.table('group_teacher').select(
+        'groups(name, level, mode, languages(name), schedule(*, classrooms(name, location)))'
+    ).eq('teacher_id', teacher_id).execute()
+
+    slots = []
+    for assignment in response.data or []:
+        group = assignment.get('groups') or {}
+        for sch in group.get('schedule') or []:
+            slots.append({**sch, 'groups': group})
+
+    return build_week_index(slots), len(response.data or [])
+
+
+subscribe_mutations('teacher_timetable', {'schedule', 'groups', 'group_teacher', 'classrooms'}, get_teacher_timetable.clear)
+
+
+def build_week_index(schedules):
+    """
+    Range les créneaux par jour en un seul passage, puis trie chaque jour une fois.
+
+    Args:
+        schedules: Lignes de schedule avec groups(name, level, mode, languages(name))
+                   et classrooms(name, location) embarqués
+
+    Returns:
+        dict: jour (dans l'ordre de DAYS_OF_WEEK) -> liste de créneaux
+              {id, group_id, day_of_week, start_time, end_time, group_name, language,
+              level, mode, classroom, location, is_online}
+    """
+    week = {day: [] for day in DAYS_OF_WEEK}
+
+    for sch in schedules:
+        group = sch.get('groups') or {}
+        classroom = sch.get('classrooms') or {}
+        week.setdefault(sch['day_of_week'], []).append({
+            'id': sch.get('id'),
+            'group_id': sch.get('group_id'),
+            'day_of_week': sch['day_of_week'],
+            'start_time': sch['start_time'],
+            'end_time': sch['end_time'],
+            'group_name': group.get('name', 'N/A'),
+            'language': (group.get('languages') or {}).get('name', 'N/A'),
+            'level': group.get('level', 'N/A'),
+            'mode': group.get('mode', 'N/A'),
+            'classroom': classroom.get('name', 'N/A'),
+            'location': classroom.get('location', 'N/A'),
+            'is_online': sch.get('is_online', False)
+        })
+
+    for day_slots in week.values():
+        day_slots.sort(key=lambda slot: slot['start_time'])
+
+    return week
+
+
+def week_grid(week):
+    """
+    Grille hebdomadaire imprimable : une ligne par horaire, une colonne par jour.
+
+    Args:
+        week: Index retourné par build_week_index
+
+    Returns:
+        DataFrame: cellules "Groupe (Langue) - Salle", vides si aucun cours
+    """
+    days = [day for day in week if week[day]]
+    hours = sorted({(slot['start_time'], slot['end_time']) for day in days for slot in week[day]})
+    grid = pd.DataFrame('', index=[f"{start[:5]} - {end[:5]}" for start, end in hours], columns=days)
+
+    for day in days:
+        for slot in week[day]:
+            cell = f"{slot['group_name']} ({slot['language']}) - {'En ligne' if slot['is_online'] else slot['classroom']}"
+            row = f"{slot['start_time'][:5]} - {slot['end_time'][:5]}"
+            grid.loc[row, day] = f"{grid.loc[row, day]}\n{cell}" if grid.loc[row, day] else cell
+
+    return grid
+
+
 def show_teacher_schedule(supabase):
     """Planning pour les enseignants"""
     st.subheader(f"Mon Planning - {st.session_state.user_name}")
@@ -27,54 +125,50 @@ def show_teacher_schedule(supabase):
             st.error("Impossible de récupérer votre identifiant enseignant")
             return
 
-        # Récupérer les groupes de l'enseignant
-        group_teacher = supabase.table('group_teacher').select('group_id').eq('teacher_id', teacher_id).execute()
-
-        if group_teacher.data:
-            group_ids = [gt['group_id'] for gt in group_teacher.data]
-
-            # Récupérer les plannings
-            schedules = supabase.table('schedule').select(
-                '*, groups(name, level, mode, languages(name)), classrooms(name, location)'
-            ).in_('group_id', group_ids).execute()
+        week, group_count = get_teacher_timetable(supabase, teacher_id)
 
-            if schedules.data:
-                # Créer un planning par jour
-                for day in DAYS_OF_WEEK:
-                    day_schedules = [s for s in schedules.data if s['day_of_week'] == day]
-
-                    if day_schedules:
-                        with st.expander(f"**{day}** ({len(day_schedules)} cours)", expanded=True):
-                            for sch in sorted(day_schedules, key=lambda x: x['start_time']):
-                                group = sch.get('groups', {})
-                                classroom = sch.get('classrooms', {})
-                                lang_name = group.get('languages', {}).get('name', 'N/A') if group.get('languages') else 'N/A'
-
-                                col1, col2, col3 = st.columns([2, 2, 1])
-
-                                with col1:
-                                    st.write(f"**{sch['start_time']} - {sch['end_time']}**")
-                                    st.write(f"{group.get('name', 'N/A')} ({lang_name})")
-
-                                with col2:
-                                    st.write(f"📍 {classroom.get('name', 'N/A')}")
-                                    st.write(f"Mode: {group.get('mode', 'N/A')}")
-
-                                with col3:
-                                    st.write(f"Niveau {group.get('level', 'N/A')}")
-
-                                st.divider()
-            else:
-                st.info("Aucun cours planifié pour le moment")
-        else:
+        if not group_count:
             st.info("Vous n'êtes assigné à aucun groupe")
+        elif any(week.values()):
+            # Créer un planning par jour
+            for day, day_schedules in week.items():
+                if day_schedules:
+                    with st.expander(f"**{day}** ({len(day_schedules)} cours)", expanded=True):
+                        for slot in day_schedules:
+                            col1, col2, col3 = st.columns([2, 2, 1])
+
+                            with col1:
+                                st.write(f"**{slot['start_time']} - {slot['end_time']}**")
+                                st.write(f"{slot['group_name']} ({slot['language']})")
+
+                            with col2:
+                                st.write(f"📍 {slot['classroom']}")
+                                st.write(f"Mode: {slot['mode']}")
+
+                            with col3:
+                                st.write(f"Niveau {slot['level']}")
+
+                            st.divider()
+
+            # Grille de la semaine à imprimer
+            grid = week_grid(week)
+            with st.expander("🖨️ Grille de la semaine"):
+                st.dataframe(grid, width="stretch")
+                st.download_button(
+                    "📥 Télécharger la grille (CSV)",
+                    grid.to_csv().encode('utf-8-sig'),
+                    file_name=f"planning_{st.session_state.user_name.replace(' ', '_')}.csv",
+                    mime="text/csv"
+                )
+        else:
+            st.info("Aucun cours planifié pour le moment")
 
     except Exception as e:
         st.error(f"Erreur : {str(e)}")
 
 def show_admin_schedule(supabase):
     """Planning pour les administrateurs"""
-    tab1, tab2, tab3 = st.tabs(["📋 Vue Générale", "➕ Ajouter un Cours", "🔍 Filtrer"])
+    tab1, tab2, tab3, tab4 = st.tabs(["📋 Vue Générale", "➕ Ajouter un Cours", "🔍 Filtrer", "📥 Import Groupé"])
 
     with tab1:
         st.subheader("Planning Général")
@@ -111,6 +205,7 @@ def show_admin_schedule(supabase):
                                     if st.button("🗑️", key=f"delete_{sch['id']}"):
                                         try:
                                             supabase.table('schedule').delete().eq('id', sch['id']).execute()
+                                            publish_mutation('schedule')
                                             st.success("Cours supprimé")
                                             st.rerun()
                                         except Exception as e:
@@ -145,9 +240,9 @@ def show_admin_schedule(supabase):
         with st.form("add_schedule_form"):
             # Sélectionner le groupe
             try:
-                groups = supabase.table('groups').select('*, languages(name)').execute()
-                if groups.data:
-                    group_options = {f"{g['name']} ({g['languages']['name'] if g.get('languages') else 'N/A'}, Niveau {g['level']})": g for g in groups.data}
+                groups = get_reference_data('groups', '*, languages(name)')
+                if groups:
+                    group_options = {f"{g['name']} ({g['languages']['name'] if g.get('languages') else 'N/A'}, Niveau {g['level']})": g for g in groups}
                     selected_group = st.selectbox("Groupe *", list(group_options.keys()))
                 else:
                     st.error("Aucun groupe disponible")
@@ -158,9 +253,9 @@ def show_admin_schedule(supabase):
 
             # Sélectionner la salle
             try:
-                classrooms = supabase.table('classrooms').select('*').execute()
-                if classrooms.data:
-                    classroom_options = {f"{c['name']} ({c.get('location', 'N/A')}) - Capacité: {c.get('capacity', 'N/A')}": c for c in classrooms.data}
+                classrooms = get_reference_data('classrooms')
+                if classrooms:
+                    classroom_options = {f"{c['name']} ({c.get('location', 'N/A')}) - Capacité: {c.get('capacity', 'N/A')}": c for c in classrooms}
                     selected_classroom = st.selectbox("Salle *", list(classroom_options.keys()))
                 else:
                     st.error("Aucune salle disponible")
@@ -192,21 +287,13 @@ def show_admin_schedule(supabase):
                             group_data = group_options[selected_group]
                             classroom_data = classroom_options[selected_classroom]
 
-                            # Vérifier les conflits de salle
-                            existing = supabase.table('schedule').select('*').eq('classroom_id', classroom_data['id']).eq('day_of_week', day_of_week).execute()
+                            # Vérifier les conflits de salle et d'enseignant
+                            index = load_schedule_index(supabase, day_of_week=day_of_week)
+                            conflicts = index.conflicts(group_data['id'], classroom_data['id'], day_of_week, start_time, end_time)
 
-                            has_conflict = False
-                            for sch in existing.data:
-                                existing_start = datetime.strptime(sch['start_time'], '%H:%M:%S').time()
-                                existing_end = datetime.strptime(sch['end_time'], '%H:%M:%S').time()
-
-                                # Vérifier si les horaires se chevauchent
-                                if not (end_time <= existing_start or start_time >= existing_end):
-                                    has_conflict = True
-                                    break
-
-                            if has_conflict:
-                                st.error("⚠️ Conflit d'horaire : cette salle est déjà occupée à cet horaire")
+                            if conflicts:
+                                for conflict in conflicts:
+                                    st.error(f"⚠️ Conflit d'horaire : {describe_conflict(conflict)}")
                             else:
                                 # Créer le planning
                                 new_schedule = {
@@ -218,6 +305,7 @@ def show_admin_schedule(supabase):
                                 }
 
                                 response = supabase.table('schedule').insert(new_schedule).execute()
+                                publish_mutation('schedule')
 
                                 if response.data:
                                     st.success("✅ Cours ajouté au planning avec succès!")
@@ -226,7 +314,11 @@ def show_admin_schedule(supabase):
                                     st.error("Erreur lors de l'ajout du cours")
 
                         except Exception as e:
-                            st.error(f"Erreur : {str(e)}")
+                            if is_schedule_conflict_error(e):
+                                # Un autre administrateur a réservé le créneau entre-temps
+                                st.error("⚠️ Conflit d'horaire : ce créneau vient d'être occupé")
+                            else:
+                                st.error(f"Erreur : {str(e)}")
                 else:
                     st.warning("Veuillez remplir tous les champs obligatoires")
 
@@ -238,9 +330,9 @@ def show_admin_schedule(supabase):
         with col1:
             # Filtrer par enseignant
             try:
-                teachers = supabase.table('teachers').select('*').execute()
-                if teachers.data:
-                    teacher_options = ["Tous"] + [f"{t['first_name']} {t['last_name']}" for t in teachers.data]
+                teachers = get_reference_data('teachers')
+                if teachers:
+                    teacher_options = ["Tous"] + [f"{t['first_name']} {t['last_name']}" for t in teachers]
                     selected_teacher = st.selectbox("Enseignant", teacher_options)
                 else:
                     selected_teacher = "Tous"
@@ -250,9 +342,9 @@ def show_admin_schedule(supabase):
         with col2:
             # Filtrer par groupe
             try:
-                groups = supabase.table('groups').select('*').execute()
-                if groups.data:
-                    group_filter_options = ["Tous"] + [g['name'] for g in groups.data]
+                groups = get_reference_data('groups')
+                if groups:
+                    group_filter_options = ["Tous"] + [g['name'] for g in groups]
                     selected_group_filter = st.selectbox("Groupe", group_filter_options)
                 else:
                     selected_group_filter = "Tous"
@@ -262,9 +354,9 @@ def show_admin_schedule(supabase):
         with col3:
             # Filtrer par salle
             try:
-                classrooms = supabase.table('classrooms').select('*').execute()
-                if classrooms.data:
-                    classroom_filter_options = ["Toutes"] + [c['name'] for c in classrooms.data]
+                classrooms = get_reference_data('classrooms')
+                if classrooms:
+                    classroom_filter_options = ["Toutes"] + [c['name'] for c in classrooms]
                     selected_classroom_filter = st.selectbox("Salle", classroom_filter_options)
                 else:
                     selected_classroom_filter = "Toutes"
@@ -288,7 +380,7 @@ def show_admin_schedule(supabase):
 
             if selected_teacher != "Tous":
                 # Récupérer les groupes de l'enseignant
-                teacher = [t for t in teachers.data if f"{t['first_name']} {t['last_name']}" == selected_teacher]
+                teacher = [t for t in teachers if f"{t['first_name']} {t['last_name']}" == selected_teacher]
                 if teacher:
                     group_teacher = supabase.table('group_teacher').select('group_id').eq('teacher_id', teacher[0]['id']).execute()
                     teacher_group_ids = [gt['group_id'] for gt in group_teacher.data]
@@ -322,3 +414,71 @@ def show_admin_schedule(supabase):
 
         except Exception as e:
             st.error(f"Erreur : {str(e)}")
+
+    with tab4:
+        show_bulk_import(supabase)
+
+def show_bulk_import(supabase):
+    """Import d'un CSV de besoins, placement automatique, aperçu puis insertion groupée"""
+    st.subheader("Import Groupé du Planning")
+    st.caption(
+        "CSV : groupe, heures_par_semaine, mode (optionnel), jours_preferes (ex. Samedi;Mardi), "
+        "duree_seance en heures (2 par défaut)"
+    )
+
+    uploaded = st.file_uploader("Besoins des groupes (CSV)", type=['csv'], key="schedule_import_file")
+
+    if uploaded and st.button("🧮 Calculer le placement", width="stretch"):
+        try:
+            planned, unplaced, errors = plan_from_csv(
+                supabase,
+                uploaded.getvalue(),
+                get_reference_data('groups'),
+                get_reference_data('classrooms'),
+                DAYS_OF_WEEK
+            )
+            st.session_state.schedule_import = {
+                'file_id': uploaded.file_id,
+                'planned': planned,
+                'unplaced': unplaced,
+                'errors': errors
+            }
+        except Exception as e:
+            st.error(f"Erreur : {str(e)}")
+
+    # Une proposition n'est valable que pour le fichier dont elle est issue
+    proposal = st.session_state.get('schedule_import')
+    if proposal and (not uploaded or proposal['file_id'] != uploaded.file_id):
+        del st.session_state.schedule_import
+        proposal = None
+    if not proposal:
+        return
+
+    for error in proposal['errors']:
+        st.warning(error)
+    for item in proposal['unplaced']:
+        st.warning(f"Non placé : {item['group']} ({item['reason']})")
+
+    if proposal['planned']:
+        preview = pd.DataFrame([{
+            'Groupe': slot['group_name'],
+            'Jour': slot['day_of_week'],
+            'Heure': f"{slot['start_time'][:5]} - {slot['end_time'][:5]}",
+            'Salle': slot['classroom_name']
+        } for slot in proposal['planned']])
+        st.dataframe(preview, width="stretch", hide_index=True)
+
+        if st.button(f"✅ Insérer {len(proposal['planned'])} créneau(x)", type="primary", width="stretch"):
+            try:
+                inserted = insert_planned_slots(supabase, proposal['planned'])
+                publish_mutation('schedule')
+                del st.session_state.schedule_import
+                st.success(f"✅ {len(inserted)} créneau(x) ajouté(s) au planning")
+                st.rerun()
+            except Exception as e:
+                if is_schedule_conflict_error(e):
+                    st.error("⚠️ Le planning a changé entre-temps : recalculez le placement")
+                else:
+                    st.error(f"Erreur : {str(e)}")
+    else:
+        st.info("Aucun créneau à insérer")
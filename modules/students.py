@@ -1,8 +1,128 @@
 import streamlit as st
 import pandas as pd
 from utils import get_supabase_client, get_current_academic_year
+from cache import get_reference_data, publish_mutation
 from datetime import datetime
 
+STUDENTS_PAGE_SIZE = 50
+STUDENT_PICKER_LIMIT = 20
+
+def _search_filter(search_term):
+    """
+    Construit le filtre PostgREST or=(...ilike...) sur nom, prénom, email et code
+    (servi par les index trigrammes de setup_student_search.sql).
+
+    Returns:
+        str: Filtre à passer à or_(), None si le texte recherché est vide
+    """
+    # Les virgules, parenthèses et * ont un sens dans la syntaxe des filtres PostgREST
+    term = ''.join(c for c in (search_term or '').strip() if c not in ',()*')
+    if not term:
+        return None
+
+    return ','.join(
+        f"{column}.ilike.*{term}*" for column in ('first_name', 'last_name', 'email', 'student_code')
+    )
+
+def search_students(supabase, search_term='', page=0, page_size=STUDENTS_PAGE_SIZE):
+    """
+    Récupère une page d'étudiants filtrée côté serveur (ilike sur nom, prénom, email et code).
+
+    Args:
+        search_term: Texte recherché (vide pour tous les étudiants)
+        page: Numéro de page (à partir de 0)
+        page_size: Nombre d'étudiants par page
+
+    Returns:
+        tuple: (liste des étudiants avec academic_years embarqué, nombre total de résultats)
+    """
+    query = supabase.table('students').select('*, academic_years(year_label, prefix)', count='exact')
+
+    search_filter = _search_filter(search_term)
+    if search_filter:
+        query = query.or_(search_filter)
+
+    response = query.order('created_at', desc=True).range(page * page_size, (page + 1) * page_size - 1).execute()
+    return response.data or [], response.count or 0
+
+def find_students(supabase, search_term='', limit=STUDENT_PICKER_LIMIT):
+    """
+    Retourne les meilleurs résultats pour un sélecteur d'étudiant (les plus récents si rien n'est saisi).
+
+    Args:
+        search_term: Début ou partie du nom, prénom, email ou code étudiant
+        limit: Nombre maximum de résultats
+
+    Returns:
+        list: Étudiants (id, first_name, last_name, email, student_code)
+    """
+    query = supabase.table('students').select('id, first_name, last_name, email, student_code')
+
+    search_filter = _search_filter(search_term)
+    if search_filter:
+        query = query.or_(search_filter)
+
+    response = query.order('created_at', desc=True).limit(limit).execute()
+    return response.data or []
+
+def student_picker(supabase, key, limit=STUDENT_PICKER_LIMIT):
+    """
+    Champ de recherche suivi de la liste des meilleurs résultats pour choisir un étudiant.
+    À placer hors d'un st.form pour que la liste se mette à jour pendant la saisie.
+
+    Args:
+        key: Préfixe des clés des widgets
+        limit: Nombre maximum de résultats proposés
+
+    Returns:
+        dict: Étudiant sélectionné (None si aucun résultat)
+    """
+    search_term = st.text_input(
+        "🔍 Rechercher un étudiant",
+        key=f"{key}_search",
+        placeholder="Nom, prénom, email ou code étudiant"
+    )
+
+    students = find_students(supabase, search_term, limit)
+    if not students:
+        st.warning("Aucun étudiant trouvé")
+        return None
+
+    student_options = {f"{s['first_name']} {s['last_name']} ({s.get('student_code', 'N/A')})": s for s in students}
+    selected_student = st.selectbox("Étudiant *", list(student_options.keys()), key=key)
+    return student_options[selected_student]
+
+def page_selector(total, key, page_size=STUDENTS_PAGE_SIZE):
+    """
+    Affiche le sélecteur de page et retourne la page courante (à partir de 0).
+    """
+    page_count = max(1, -(-total // page_size))
+    if st.session_state.get(key, 1) > page_count:
+        st.session_state[key] = 1
+
+    if page_count > 1:
+        st.number_input(f"Page (sur {page_count})", min_value=1, max_value=page_count, step=1, key=key)
+
+    return st.session_state.get(key, 1) - 1
+
+def load_students_page(supabase, key, search_term='', page_size=STUDENTS_PAGE_SIZE):
+    """
+    Charge la page courante (st.session_state[key], à partir de 1). Si elle est au-delà
+    de la dernière (moins de résultats qu'au rerun précédent), la dernière page est chargée.
+
+    Returns:
+        tuple: (étudiants de la page, nombre total d'étudiants correspondants)
+    """
+    page = st.session_state.get(key, 1) - 1
+    students, total = search_students(supabase, search_term, page=page, page_size=page_size)
+
+    page_count = max(1, -(-total // page_size))
+    if page >= page_count:
+        st.session_state[key] = page_count
+        students, total = search_students(supabase, search_term, page=page_count - 1, page_size=page_size)
+
+    return students, total
+
 def show():
     st.title("👥 Gestion des Étudiants")
 
@@ -14,8 +134,8 @@ def show():
         st.error("⚠️ Aucune année académique active trouvée dans Supabase. Veuillez configurer une année académique.")
         # Afficher les données de la table pour diagnostic
         try:
-            all_years = supabase.table('academic_years').select('*').execute()
-            st.write("**Années académiques disponibles :**", all_years.data)
+            all_years = get_reference_data('academic_years')
+            st.write("**Années académiques disponibles :**", all_years)
         except Exception as e:
             st.write(f"Erreur lors de la récupération des années: {e}")
         st.stop()
@@ -30,11 +150,11 @@ def show():
         st.subheader("Liste des Étudiants")
 
         try:
-            students_response = supabase.table('students').select('*, academic_years(year_label, prefix)').order('created_at', desc=True).execute()
+            students_page, total_students = load_students_page(supabase, 'students_page')
 
-            if students_response.data:
+            if students_page:
                 students_list = []
-                for student in students_response.data:
+                for student in students_page:
                     id_doc_link = student.get('id_document_link')
                     academic_year = student.get('academic_years', {})
                     year_label = academic_year.get('year_label', 'N/A') if academic_year else 'N/A'
@@ -65,19 +185,20 @@ def show():
                 # Statistiques rapides
                 col1, col2, col3 = st.columns(3)
                 with col1:
-                    st.metric("Total Étudiants", len(students_list))
+                    st.metric("Total Étudiants", total_students)
                 with col2:
                     # Compter les étudiants de l'année académique actuelle
-                    current_year_students = [s for s in students_response.data
-                                           if s.get('academic_year_id') == current_year['id']]
-                    st.metric(f"Étudiants {current_year['year_label']}", len(current_year_students))
+                    current_year_students = supabase.table('students').select('id', count='exact', head=True).eq('academic_year_id', current_year['id']).execute()
+                    st.metric(f"Étudiants {current_year['year_label']}", current_year_students.count)
                 with col3:
                     # Compter les inscriptions actives
-                    enrollments = supabase.table('enrollments').select('*', count='exact').eq('enrollment_active', True).execute()
+                    enrollments = supabase.table('enrollments').select('id', count='exact', head=True).eq('enrollment_active', True).execute()
                     st.metric("Inscriptions Actives", enrollments.count)
             else:
                 st.info("Aucun étudiant enregistré")
 
+            page_selector(total_students, 'students_page')
+
         except Exception as e:
             st.error(f"Erreur lors du chargement des étudiants : {str(e)}")
 
@@ -136,6 +257,7 @@ def show():
                             }
 
                             response = supabase.table('students').insert(new_student).execute()
+                            publish_mutation('students')
 
                             if response.data:
                                 st.success(f"✅ Étudiant ajouté avec succès! Code: {response.data[0].get('student_code', 'N/A')}")
@@ -155,42 +277,39 @@ def show():
 
         if search_term:
             try:
-                # Recherche multiple
-                students = supabase.table('students').select('*, academic_years(year_label, prefix)').execute()
-
-                if students.data:
-                    filtered = [
-                        s for s in students.data
-                        if search_term.lower() in s['first_name'].lower()
-                        or search_term.lower() in s['last_name'].lower()
-                        or search_term.lower() in s['email'].lower()
-                        or (s.get('student_code') and search_term.lower() in s['student_code'].lower())
-                    ]
-
-                    if filtered:
-                        for student in filtered:
-                            with st.expander(f"{student['first_name']} {student['last_name']} - {student.get('student_code', 'N/A')}"):
-                                col1, col2 = st.columns(2)
-
-                                with col1:
-                                    st.write(f"**Code Étudiant:** {student.get('student_code', 'N/A')}")
-                                    st.write(f"**Email:** {student['email']}")
-                                    st.write(f"**Téléphone:** {student.get('phone_number', 'N/A')}")
-                                    id_doc = student.get('id_document_link')
-                                    if id_doc:
-                                        st.write(f"**Pièce d'identité:** [📄 Voir le document]({id_doc})")
-                                    else:
-                                        st.write("**Pièce d'identité:** N/A")
-                                    st.write(f"**Date de naissance:** {student.get('birth_date', 'N/A')}")
-
-                                with col2:
-                                    academic_year = student.get('academic_years', {})
-                                    year_label = academic_year.get('year_label', 'N/A') if academic_year else 'N/A'
-                                    st.write(f"**Année académique:** {year_label}")
-                                    st.write(f"**Créé le:** {student.get('created_at', 'N/A')}")
-
-                                st.divider()
-
+                # Recherche côté serveur, paginée
+                if st.session_state.get('students_search_last_term') != search_term:
+                    st.session_state['students_search_last_term'] = search_term
+                    st.session_state['students_search_page'] = 1
+                filtered, total_found = load_students_page(supabase, 'students_search_page', search_term)
+
+                if filtered:
+                    st.caption(f"{total_found} étudiant(s) trouvé(s)")
+                    for student in filtered:
+                        with st.expander(f"{student['first_name']} {student['last_name']} - {student.get('student_code', 'N/A')}"):
+                            col1, col2 = st.columns(2)
+
+                            with col1:
+                                st.write(f"**Code Étudiant:** {student.get('student_code', 'N/A')}")
+                                st.write(f"**Email:** {student['email']}")
+                                st.write(f"**Téléphone:** {student.get('phone_number', 'N/A')}")
+                                id_doc = student.get('id_document_link')
+                                if id_doc:
+                                    st.write(f"**Pièce d'identité:** [📄 Voir le document]({id_doc})")
+                                else:
+                                    st.write("**Pièce d'identité:** N/A")
+                                st.write(f"**Date de naissance:** {student.get('birth_date', 'N/A')}")
+
+                            with col2:
+                                academic_year = student.get('academic_years', {})
+                                year_label = academic_year.get('year_label', 'N/A') if academic_year else 'N/A'
+                                st.write(f"**Année académique:** {year_label}")
+                                st.write(f"**Créé le:** {student.get('created_at', 'N/A')}")
+
+                            st.divider()
+
+                            # Inscriptions et paiements chargés seulement à la demande
+                            if st.toggle("Afficher inscriptions et paiements", key=f"student_details_{student['id']}"):
                                 # Afficher les inscriptions
                                 enrollments = supabase.table('enrollments').select('*, groups(name, level, mode, languages(name))').eq('student_id', student['id']).execute()
 
@@ -214,23 +333,24 @@ def show():
                                         for payment in payments.data:
                                             st.write(f"- {payment['amount']:,.0f} DA le {payment.get('payment_date', 'N/A')}")
 
-                                # Boutons d'action
-                                col1, col2 = st.columns(2)
-                                with col1:
-                                    if st.button(f"Modifier", key=f"edit_{student['id']}"):
-                                        st.info("Fonctionnalité à venir")
-                                with col2:
-                                    if st.button(f"Supprimer", key=f"delete_{student['id']}", type="primary"):
-                                        try:
-                                            supabase.table('students').delete().eq('id', student['id']).execute()
-                                            st.success("Étudiant supprimé")
-                                            st.rerun()
-                                        except Exception as e:
-                                            st.error(f"Erreur : {str(e)}")
-                    else:
-                        st.info("Aucun étudiant trouvé")
+                            # Boutons d'action
+                            col1, col2 = st.columns(2)
+                            with col1:
+                                if st.button(f"Modifier", key=f"edit_{student['id']}"):
+                                    st.info("Fonctionnalité à venir")
+                            with col2:
+                                if st.button(f"Supprimer", key=f"delete_{student['id']}", type="primary"):
+                                    try:
+                                        supabase.table('students').delete().eq('id', student['id']).execute()
+                                        publish_mutation('students', 'enrollments', 'payments')
+                                        st.success("Étudiant supprimé")
+                                        st.rerun()
+                                    except Exception as e:
+                                        st.error(f"Erreur : {str(e)}")
                 else:
-                    st.info("Aucun étudiant enregistré")
+                    st.info("Aucun étudiant trouvé")
+
+                page_selector(total_found, 'students_search_page')
 
             except Exception as e:
                 st.error(f"Erreur : {str(e)}")
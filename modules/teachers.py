@@ -1,6 +1,19 @@
 import streamlit as st
 import pandas as pd
 from utils import get_supabase_client
+from cache import publish_mutation
+
+def get_teachers_with_groups(supabase):
+    """
+    Récupère tous les enseignants avec leurs groupes assignés en une seule requête.
+
+    Returns:
+        list: Enseignants avec group_teacher(groups(name, level, mode, languages(name))) embarqué
+    """
+    response = supabase.table('teachers').select(
+        '*, group_teacher(groups(name, level, mode, languages(name)))'
+    ).order('last_name').execute()
+    return response.data or []
 
 def show():
     st.title("👨‍🏫 Gestion des Enseignants")
@@ -13,20 +26,17 @@ def show():
         st.subheader("Liste des Enseignants")
 
         try:
-            teachers_response = supabase.table('teachers').select('*').order('last_name').execute()
+            teachers = get_teachers_with_groups(supabase)
 
-            if teachers_response.data:
+            if teachers:
                 teachers_list = []
-                for teacher in teachers_response.data:
-                    # Compter les groupes assignés
-                    groups = supabase.table('group_teacher').select('*', count='exact').eq('teacher_id', teacher['id']).execute()
-
+                for teacher in teachers:
                     teachers_list.append({
                         'ID': teacher['id'],
                         'Prénom': teacher['first_name'],
                         'Nom': teacher['last_name'],
                         'Email': teacher['email'],
-                        'Groupes': groups.count
+                        'Groupes': len(teacher.get('group_teacher') or [])
                     })
 
                 df = pd.DataFrame(teachers_list)
@@ -38,7 +48,7 @@ def show():
                 st.divider()
                 st.subheader("Détails et Actions")
 
-                for teacher in teachers_response.data:
+                for teacher in teachers:
                     with st.expander(f"{teacher['first_name']} {teacher['last_name']}"):
                         col1, col2 = st.columns([2, 1])
 
@@ -46,12 +56,12 @@ def show():
                             st.write(f"**Email:** {teacher['email']}")
 
                             # Afficher les groupes
-                            group_teacher = supabase.table('group_teacher').select('*, groups(name, level, mode, languages(name))').eq('teacher_id', teacher['id']).execute()
+                            group_teacher = teacher.get('group_teacher') or []
 
-                            if group_teacher.data:
+                            if group_teacher:
                                 st.markdown("**Groupes assignés:**")
-                                for gt in group_teacher.data:
-                                    group = gt.get('groups', {})
+                                for gt in group_teacher:
+                                    group = gt.get('groups') or {}
                                     lang_name = group.get('languages', {}).get('name', 'N/A') if group.get('languages') else 'N/A'
                                     st.write(f"- {group.get('name', 'N/A')} ({lang_name}, Niveau {group.get('level', 'N/A')}, {group.get('mode', 'N/A')})")
                             else:
@@ -61,6 +71,7 @@ def show():
                             if st.button("Supprimer", key=f"delete_{teacher['id']}", type="primary"):
                                 try:
                                     supabase.table('teachers').delete().eq('id', teacher['id']).execute()
+                                    publish_mutation('teachers')
                                     st.success("Enseignant supprimé")
                                     st.rerun()
                                 except Exception as e:
@@ -101,6 +112,7 @@ def show():
                             }
 
                             response = supabase.table('teachers').insert(new_teacher).execute()
+                            publish_mutation('teachers')
 
                             if response.data:
                                 st.success("✅ Enseignant ajouté avec succès!")
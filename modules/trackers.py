@@ -1,8 +1,95 @@
 import streamlit as st
 import pandas as pd
-from utils import get_supabase_client
+from utils import get_supabase_client, get_cash_position, fetch_all_rows
+from cache import publish_mutation, subscribe_mutations
+from modules.payments import get_balance
+from modules.students import student_picker
 from datetime import datetime, timedelta
 
+# Prélèvement considéré comme important
+BIG_WITHDRAWAL_THRESHOLD = 20000
+# Fenêtre de la moyenne glissante (nombre de signatures)
+ROLLING_WINDOW = 5
+# Écart à la moyenne (en écarts-types) au-delà duquel un prélèvement est atypique
+OUTLIER_ZSCORE = 2
+
+def load_signature_history(supabase):
+    """
+    Charge l'historique des signatures de caisse (hors initialisation "Système") en une requête.
+
+    Returns:
+        pd.DataFrame: id, reset_by, reset_date (datetime), amount_in_register, amount_taken,
+                      amount_left, notes ; de la plus récente à la plus ancienne
+    """
+    rows = fetch_all_rows(lambda: supabase.table('cash_register_resets').select(
+        'id, reset_by, reset_date, amount_in_register, amount_taken, amount_left, notes', count='exact'
+    ).neq('reset_by', 'Système').order('reset_date', desc=True).order('id', desc=True))
+
+    history = pd.DataFrame(rows, columns=['id', 'reset_by', 'reset_date', 'amount_in_register', 'amount_taken', 'amount_left', 'notes'])
+    history['reset_date'] = pd.to_datetime(history['reset_date'], utc=True, format='ISO8601').dt.tz_localize(None)
+    for column in ['amount_in_register', 'amount_taken', 'amount_left']:
+        history[column] = pd.to_numeric(history[column]).fillna(0)
+    history['notes'] = history['notes'].fillna('-').replace('', '-')
+    return history
+
+def compute_signature_audit(history, now=None):
+    """
+    Calcule les indicateurs d'audit de la caisse sur l'historique des signatures.
+
+    Args:
+        history: Historique retourné par load_signature_history
+        now: Date de référence pour les signatures récentes (par défaut maintenant)
+
+    Returns:
+        dict: history (avec previous_date, delay_days, rolling_taken, zscore), recent,
+              big_withdrawals, verifications, outliers, avg_delay, by_person
+    """
+    now = pd.Timestamp(now or datetime.now())
+    history = history.copy()
+
+    # Délais et moyennes glissantes (l'historique est trié du plus récent au plus ancien)
+    history['previous_date'] = history['reset_date'].shift(-1)
+    history['delay_days'] = (history['reset_date'] - history['previous_date']).dt.days
+    history['rolling_taken'] = history['amount_taken'][::-1].rolling(ROLLING_WINDOW, min_periods=1).mean()[::-1]
+
+    std = history['amount_taken'].std()
+    history['zscore'] = (history['amount_taken'] - history['amount_taken'].mean()) / std if std else 0.0
+
+    # Agrégats par personne (dernier prélèvement = signature la plus récente de la personne)
+    by_person = history.groupby('reset_by').agg(
+        count=('id', 'size'),
+        total_taken=('amount_taken', 'sum'),
+        total_in_register=('amount_in_register', 'sum'),
+        last_amount=('amount_taken', 'first'),
+        last_date=('reset_date', 'max'),
+        min_taken=('amount_taken', 'min'),
+        max_taken=('amount_taken', 'max')
+    ).sort_values('total_taken', ascending=False)
+    by_person['share'] = by_person['count'] / len(history) if len(history) else 0.0
+
+    return {
+        'history': history,
+        'recent': history[history['reset_date'] >= now - timedelta(days=7)],
+        'big_withdrawals': history[history['amount_taken'] > BIG_WITHDRAWAL_THRESHOLD],
+        'verifications': history[history['amount_taken'] == 0],
+        'outliers': history[history['zscore'].abs() > OUTLIER_ZSCORE],
+        'avg_delay': history['delay_days'].mean() if history['delay_days'].notna().any() else None,
+        'by_person': by_person
+    }
+
+@st.cache_data(ttl=600, show_spinner=False)
+def get_signature_audit(_supabase):
+    """
+    Historique et indicateurs d'audit partagés par les onglets, en cache jusqu'à la
+    prochaine signature (éviction par le bus de mutations sur cash_register_resets).
+    """
+    return compute_signature_audit(load_signature_history(_supabase))
+
+subscribe_mutations('signature_audit', {'cash_register_resets'}, get_signature_audit.clear)
+
+def _amount(value):
+    return f"{value:,.0f} DA"
+
 def show():
     st.title("📊 Suivi de Caisse")
 
@@ -25,28 +112,13 @@ def show():
 
         # Calculer le montant actuel en caisse
         try:
-            # Récupérer la dernière signature
-            last_signature = supabase.table('cash_register_resets').select('*').order('reset_date', desc=True).limit(1).execute()
-
-            if last_signature.data:
-                last_sig = last_signature.data[0]
-                last_reset_date = last_sig['reset_date']
-                amount_left_last_time = last_sig.get('amount_left', 0) or 0
-                last_reset_by = last_sig.get('reset_by', 'N/A')
-
-                # Compter UNIQUEMENT les paiements LIQUIDES depuis la dernière signature
-                payments_since = supabase.table('payments').select('*').gte('payment_date', last_reset_date).eq('payment_method', 'liquide').execute()
-                payments_total = sum([p['amount'] for p in payments_since.data]) if payments_since.data else 0
-
-                current_amount = amount_left_last_time + payments_total
-            else:
-                # Pas de signature précédente, compter tous les paiements liquides
-                all_payments = supabase.table('payments').select('*').eq('payment_method', 'liquide').execute()
-                current_amount = sum([p['amount'] for p in all_payments.data]) if all_payments.data else 0
-                last_reset_date = None
-                last_reset_by = 'N/A'
-                payments_since = all_payments
-                amount_left_last_time = 0
+            # Position de caisse : montant laissé à la dernière signature + paiements liquides depuis
+            position = get_cash_position()
+            current_amount = position['current_amount']
+            last_reset_date = position['last_reset_date']
+            last_reset_by = position.get('last_reset_by') or 'N/A'
+            amount_left_last_time = position.get('amount_left', 0) or 0
+            has_any_signature = position['last_reset_id'] is not None
 
             # Affichage en grand du montant
             st.markdown("### 💵 Montant Actuel en Caisse")
@@ -58,9 +130,6 @@ def show():
             with col_amount2:
                 # Bouton d'initialisation UNIQUEMENT s'il n'y a JAMAIS eu de signature
                 # (pas même une signature "Système")
-                all_signatures = supabase.table('cash_register_resets').select('id').execute()
-                has_any_signature = len(all_signatures.data) > 0 if all_signatures.data else False
-
                 if not has_any_signature and current_amount > 0:
                     # Aucune signature n'a jamais été créée, mais il y a des paiements liquides
                     st.warning(f"⚠️ Initialisation requise")
@@ -75,6 +144,7 @@ def show():
                                 'amount_left': current_amount,
                                 'notes': f"🔄 Initialisation : {current_amount:,.0f} DA de paiements liquides en caisse"
                             }).execute()
+                            publish_mutation('cash_register_resets')
 
                             st.success(f"✅ Caisse initialisée avec {current_amount:,.0f} DA !")
                             st.rerun()
@@ -84,9 +154,6 @@ def show():
             st.divider()
 
             # Vérifier si la caisse a été initialisée
-            all_signatures = supabase.table('cash_register_resets').select('id').execute()
-            has_any_signature = len(all_signatures.data) > 0 if all_signatures.data else False
-
             if not has_any_signature:
                 # Caisse non initialisée - afficher seulement le message
                 st.divider()
@@ -111,10 +178,8 @@ def show():
 
                 with col2:
                     st.markdown("#### 💳 Nouveaux Paiements Liquides")
-                    payments_count = len(payments_since.data) if payments_since.data else 0
-                    payments_total = sum([p['amount'] for p in payments_since.data]) if payments_since.data else 0
-                    st.write(f"**Nombre de paiements:** {payments_count}")
-                    st.write(f"**Montant total:** {payments_total:,.0f} DA")
+                    st.write(f"**Nombre de paiements:** {position['cash_count_since_reset']}")
+                    st.write(f"**Montant total:** {position['cash_since_reset']:,.0f} DA")
 
                 st.divider()
 
@@ -161,6 +226,7 @@ def show():
                                     'amount_left': amount_left,
                                     'notes': notes.strip() if notes.strip() else None
                                 }).execute()
+                                publish_mutation('cash_register_resets')
 
                                 st.success("✅ Signature enregistrée avec succès!")
                                 st.session_state['show_signature_form'] = False
@@ -183,56 +249,51 @@ def show():
         st.subheader("➕ Enregistrer un Paiement")
         st.info("💡 Utilisez ce formulaire pour enregistrer un paiement (liquide ou en ligne)")
 
+        # Sélectionner l'étudiant (hors formulaire pour filtrer pendant la saisie)
+        try:
+            selected_student = student_picker(supabase, key="tracker_student")
+        except Exception as e:
+            st.error(f"Erreur : {str(e)}")
+            selected_student = None
+
         with st.form("add_payment_form_tracker"):
-            # Sélectionner l'étudiant
             try:
-                students = supabase.table('students').select('*').order('created_at', desc=True).execute()
-                if students.data:
-                    student_options = {f"{s['first_name']} {s['last_name']} ({s.get('student_code', 'N/A')})": s for s in students.data}
-                    selected_student = st.selectbox("Étudiant *", list(student_options.keys()), key="tracker_student")
-
-                    # Sélectionner l'inscription
-                    selected_enrollment = None
-                    enrollment_options = {}
-                    if selected_student:
-                        student_data = student_options[selected_student]
-                        enrollments = supabase.table('enrollments').select('*, groups(name, languages(name))').eq('student_id', student_data['id']).execute()
-
-                        if enrollments.data:
-                            for enr in enrollments.data:
-                                group = enr.get('groups', {})
-                                lang_name = group.get('languages', {}).get('name', 'N/A') if group.get('languages') else 'N/A'
-
-                                # Calculer le solde
-                                payments = supabase.table('payments').select('amount').eq('enrollment_id', enr['id']).execute()
-                                total_paid = sum([p['amount'] for p in payments.data]) if payments.data else 0
-                                remaining = enr['total_course_fee'] - total_paid
-
-                                status_icon = "✅" if enr['enrollment_active'] else "❌"
-                                label = f"{group.get('name', 'N/A')} ({lang_name}) - Restant: {remaining:,.0f} DA {status_icon}"
-                                enrollment_options[label] = enr
-
-                            selected_enrollment = st.selectbox("Inscription *", list(enrollment_options.keys()), key="tracker_enrollment")
-
-                            # Afficher le détail du solde
-                            if selected_enrollment:
-                                enr_data = enrollment_options[selected_enrollment]
-                                payments = supabase.table('payments').select('amount').eq('enrollment_id', enr_data['id']).execute()
-                                total_paid = sum([p['amount'] for p in payments.data]) if payments.data else 0
-                                remaining = enr_data['total_course_fee'] - total_paid
-
-                                if remaining > 0:
-                                    st.warning(f"💰 Montant restant pour cette inscription: {remaining:,.0f} DA")
-                                else:
-                                    st.success("✅ Cette inscription est entièrement payée")
-                        else:
-                            st.info("Aucune inscription pour cet étudiant")
-                else:
-                    st.error("Aucun étudiant disponible")
-                    selected_student = None
+                # Sélectionner l'inscription
+                selected_enrollment = None
+                enrollment_options = {}
+                if selected_student:
+                    student_data = selected_student
+                    enrollments = supabase.table('enrollments').select(
+                        '*, groups(name, languages(name)), enrollment_balances(paid_total, remaining, last_payment_date)'
+                    ).eq('student_id', student_data['id']).execute()
+
+                    if enrollments.data:
+                        for enr in enrollments.data:
+                            group = enr.get('groups', {})
+                            lang_name = group.get('languages', {}).get('name', 'N/A') if group.get('languages') else 'N/A'
+
+                            # Solde de l'inscription
+                            remaining = get_balance(enr)['remaining']
+
+                            status_icon = "✅" if enr['enrollment_active'] else "❌"
+                            label = f"{group.get('name', 'N/A')} ({lang_name}) - Restant: {remaining:,.0f} DA {status_icon}"
+                            enrollment_options[label] = enr
+
+                        selected_enrollment = st.selectbox("Inscription *", list(enrollment_options.keys()), key="tracker_enrollment")
+
+                        # Afficher le détail du solde
+                        if selected_enrollment:
+                            enr_data = enrollment_options[selected_enrollment]
+                            remaining = get_balance(enr_data)['remaining']
+
+                            if remaining > 0:
+                                st.warning(f"💰 Montant restant pour cette inscription: {remaining:,.0f} DA")
+                            else:
+                                st.success("✅ Cette inscription est entièrement payée")
+                    else:
+                        st.info("Aucune inscription pour cet étudiant")
             except Exception as e:
                 st.error(f"Erreur : {str(e)}")
-                selected_student = None
                 selected_enrollment = None
 
             col1, col2 = st.columns(2)
@@ -258,7 +319,7 @@ def show():
             if submitted:
                 if selected_student and selected_enrollment and amount > 0:
                     try:
-                        student_data = student_options[selected_student]
+                        student_data = selected_student
                         enr_data = enrollment_options[selected_enrollment]
 
                         # Convertir la méthode de paiement
@@ -274,6 +335,7 @@ def show():
                         }
 
                         response = supabase.table('payments').insert(new_payment).execute()
+                        publish_mutation('payments')
 
                         if response.data:
                             payment_type_text = "💵 liquide" if method_value == 'liquide' else "💳 en ligne"
@@ -293,27 +355,21 @@ def show():
         st.subheader("📋 Historique des Signatures de Comptage")
 
         try:
-            # Récupérer toutes les signatures (exclure l'initialisation)
-            signatures = supabase.table('cash_register_resets').select('*').neq('reset_by', 'Système').order('reset_date', desc=True).execute()
-
-            if signatures.data:
-                # Préparer les données pour l'affichage
-                history_data = []
-                for sig in signatures.data:
-                    reset_datetime = datetime.fromisoformat(sig['reset_date'].replace('Z', '+00:00'))
-
-                    history_data.append({
-                        'ID': sig['id'],
-                        'Date': reset_datetime.strftime('%d/%m/%Y'),
-                        'Heure': reset_datetime.strftime('%H:%M'),
-                        'Signé par': sig['reset_by'],
-                        'Total en Caisse': f"{sig['amount_in_register']:,.0f} DA",
-                        'Prélevé': f"{sig['amount_taken']:,.0f} DA",
-                        'Laissé': f"{sig['amount_left']:,.0f} DA",
-                        'Observations': sig.get('notes', '-') or '-'
-                    })
-
-                df_history = pd.DataFrame(history_data)
+            # Historique partagé par les onglets 3 à 5 (une requête, en cache)
+            audit = get_signature_audit(supabase)
+            history = audit['history']
+
+            if not history.empty:
+                df_history = pd.DataFrame({
+                    'ID': history['id'],
+                    'Date': history['reset_date'].dt.strftime('%d/%m/%Y'),
+                    'Heure': history['reset_date'].dt.strftime('%H:%M'),
+                    'Signé par': history['reset_by'],
+                    'Total en Caisse': history['amount_in_register'].map(_amount),
+                    'Prélevé': history['amount_taken'].map(_amount),
+                    'Laissé': history['amount_left'].map(_amount),
+                    'Observations': history['notes']
+                })
                 st.dataframe(df_history, use_container_width=True, hide_index=True)
 
                 # Métriques récapitulatives
@@ -321,21 +377,17 @@ def show():
                 col1, col2, col3, col4 = st.columns(4)
 
                 with col1:
-                    st.metric("Total Signatures", len(history_data))
+                    st.metric("Total Signatures", len(history))
 
                 with col2:
-                    total_preleve = sum([sig['amount_taken'] for sig in signatures.data])
-                    st.metric("Total Prélevé", f"{total_preleve:,.0f} DA")
+                    st.metric("Total Prélevé", _amount(history['amount_taken'].sum()))
 
                 with col3:
-                    moyenne_preleve = total_preleve / len(signatures.data) if signatures.data else 0
-                    st.metric("Moyenne par Signature", f"{moyenne_preleve:,.0f} DA")
+                    st.metric("Moyenne par Signature", _amount(history['amount_taken'].mean()))
 
                 with col4:
                     # Dernière signature
-                    last_sig = signatures.data[0]
-                    last_date = datetime.fromisoformat(last_sig['reset_date'].replace('Z', '+00:00'))
-                    st.metric("Dernière Signature", last_date.strftime('%d/%m/%Y %H:%M'))
+                    st.metric("Dernière Signature", history['reset_date'].iloc[0].strftime('%d/%m/%Y %H:%M'))
 
             else:
                 st.info("Aucune signature enregistrée pour le moment")
@@ -350,78 +402,72 @@ def show():
         st.subheader("📈 Statistiques et Analyses")
 
         try:
-            signatures = supabase.table('cash_register_resets').select('*').neq('reset_by', 'Système').order('reset_date', desc=True).execute()
+            audit = get_signature_audit(supabase)
+            history = audit['history']
 
-            if signatures.data:
+            if not history.empty:
                 # Section: Signatures récentes (7 derniers jours)
                 st.markdown("### 📅 Signatures Récentes (7 derniers jours)")
 
-                # Comparer avec la date actuelle
-                seven_days_ago = datetime.now() - timedelta(days=7)
-                recent_sigs = [sig for sig in signatures.data
-                              if datetime.fromisoformat(sig['reset_date'].replace('Z', '+00:00')) >= seven_days_ago]
-
-                if recent_sigs:
-                    recent_data = []
-                    for sig in recent_sigs:
-                        reset_datetime = datetime.fromisoformat(sig['reset_date'].replace('Z', '+00:00'))
-                        recent_data.append({
-                            'Date': reset_datetime.strftime('%d/%m/%Y %H:%M'),
-                            'Signé par': sig['reset_by'],
-                            'Total': f"{sig['amount_in_register']:,.0f} DA",
-                            'Prélevé': f"{sig['amount_taken']:,.0f} DA",
-                            'Laissé': f"{sig['amount_left']:,.0f} DA",
-                            'Observations': sig.get('notes', '-') or '-'
-                        })
-
-                    df_recent = pd.DataFrame(recent_data)
-                    st.dataframe(df_recent, use_container_width=True, hide_index=True)
+                recent = audit['recent']
+                if not recent.empty:
+                    st.dataframe(pd.DataFrame({
+                        'Date': recent['reset_date'].dt.strftime('%d/%m/%Y %H:%M'),
+                        'Signé par': recent['reset_by'],
+                        'Total': recent['amount_in_register'].map(_amount),
+                        'Prélevé': recent['amount_taken'].map(_amount),
+                        'Laissé': recent['amount_left'].map(_amount),
+                        'Observations': recent['notes']
+                    }), use_container_width=True, hide_index=True)
                 else:
                     st.info("Aucune signature dans les 7 derniers jours")
 
                 st.divider()
 
-                # Section: Prélèvements importants (> 20,000 DA)
-                st.markdown("### 💸 Prélèvements Importants (> 20,000 DA)")
-
-                big_withdrawals = [sig for sig in signatures.data if sig['amount_taken'] > 20000]
+                # Section: Prélèvements importants
+                st.markdown(f"### 💸 Prélèvements Importants (> {BIG_WITHDRAWAL_THRESHOLD:,} DA)")
+
+                big_withdrawals = audit['big_withdrawals']
+                if not big_withdrawals.empty:
+                    st.dataframe(pd.DataFrame({
+                        'Date': big_withdrawals['reset_date'].dt.strftime('%d/%m/%Y %H:%M'),
+                        'Signé par': big_withdrawals['reset_by'],
+                        'Montant Prélevé': big_withdrawals['amount_taken'].map(_amount),
+                        'Observations': big_withdrawals['notes']
+                    }), use_container_width=True, hide_index=True)
+                else:
+                    st.info("Aucun prélèvement important")
 
-                if big_withdrawals:
-                    big_data = []
-                    for sig in big_withdrawals:
-                        reset_datetime = datetime.fromisoformat(sig['reset_date'].replace('Z', '+00:00'))
-                        big_data.append({
-                            'Date': reset_datetime.strftime('%d/%m/%Y %H:%M'),
-                            'Signé par': sig['reset_by'],
-                            'Montant Prélevé': f"{sig['amount_taken']:,.0f} DA",
-                            'Observations': sig.get('notes', '-') or '-'
-                        })
+                st.divider()
 
-                    df_big = pd.DataFrame(big_data)
-                    st.dataframe(df_big, use_container_width=True, hide_index=True)
+                # Section: Prélèvements atypiques (loin de la moyenne)
+                st.markdown("### 🔎 Prélèvements Atypiques")
+
+                outliers = audit['outliers']
+                if not outliers.empty:
+                    st.dataframe(pd.DataFrame({
+                        'Date': outliers['reset_date'].dt.strftime('%d/%m/%Y %H:%M'),
+                        'Signé par': outliers['reset_by'],
+                        'Montant Prélevé': outliers['amount_taken'].map(_amount),
+                        f'Moyenne {ROLLING_WINDOW} Signatures': outliers['rolling_taken'].map(_amount),
+                        'Écart (σ)': outliers['zscore'].round(1)
+                    }), use_container_width=True, hide_index=True)
                 else:
-                    st.info("Aucun prélèvement important")
+                    st.info(f"Aucun prélèvement à plus de {OUTLIER_ZSCORE} écarts-types de la moyenne")
 
                 st.divider()
 
                 # Section: Vérifications sans prélèvement
                 st.markdown("### ✅ Vérifications Sans Prélèvement")
 
-                verifications = [sig for sig in signatures.data if sig['amount_taken'] == 0]
-
-                if verifications:
-                    verif_data = []
-                    for sig in verifications:
-                        reset_datetime = datetime.fromisoformat(sig['reset_date'].replace('Z', '+00:00'))
-                        verif_data.append({
-                            'Date': reset_datetime.strftime('%d/%m/%Y %H:%M'),
-                            'Signé par': sig['reset_by'],
-                            'Total Vérifié': f"{sig['amount_in_register']:,.0f} DA",
-                            'Observations': sig.get('notes', '-') or '-'
-                        })
-
-                    df_verif = pd.DataFrame(verif_data)
-                    st.dataframe(df_verif, use_container_width=True, hide_index=True)
+                verifications = audit['verifications']
+                if not verifications.empty:
+                    st.dataframe(pd.DataFrame({
+                        'Date': verifications['reset_date'].dt.strftime('%d/%m/%Y %H:%M'),
+                        'Signé par': verifications['reset_by'],
+                        'Total Vérifié': verifications['amount_in_register'].map(_amount),
+                        'Observations': verifications['notes']
+                    }), use_container_width=True, hide_index=True)
                 else:
                     st.info("Aucune vérification sans prélèvement")
 
@@ -430,30 +476,24 @@ def show():
                 # Section: Analyse des délais entre signatures
                 st.markdown("### ⏱️ Délais Entre Signatures")
 
-                if len(signatures.data) >= 2:
-                    delays_data = []
-                    for i in range(len(signatures.data) - 1):
-                        current_sig = signatures.data[i]
-                        previous_sig = signatures.data[i + 1]
-
-                        current_date = datetime.fromisoformat(current_sig['reset_date'].replace('Z', '+00:00'))
-                        previous_date = datetime.fromisoformat(previous_sig['reset_date'].replace('Z', '+00:00'))
-
-                        delay_days = (current_date - previous_date).days
-
-                        delays_data.append({
-                            'Signature': current_date.strftime('%d/%m/%Y'),
-                            'Signé par': current_sig['reset_by'],
-                            'Signature Précédente': previous_date.strftime('%d/%m/%Y'),
-                            'Délai': f"{delay_days} jours"
-                        })
-
-                    df_delays = pd.DataFrame(delays_data)
-                    st.dataframe(df_delays, use_container_width=True, hide_index=True)
+                if len(history) >= 2:
+                    delays = history.iloc[:-1]
+                    st.dataframe(pd.DataFrame({
+                        'Signature': delays['reset_date'].dt.strftime('%d/%m/%Y'),
+                        'Signé par': delays['reset_by'],
+                        'Signature Précédente': delays['previous_date'].dt.strftime('%d/%m/%Y'),
+                        'Délai': delays['delay_days'].astype(int).astype(str) + " jours"
+                    }), use_container_width=True, hide_index=True)
 
                     # Moyenne des délais
-                    avg_delay = sum([int(d['Délai'].split()[0]) for d in delays_data]) / len(delays_data)
-                    st.info(f"⏰ Délai moyen entre signatures : **{avg_delay:.1f} jours**")
+                    st.info(f"⏰ Délai moyen entre signatures : **{audit['avg_delay']:.1f} jours**")
+
+                    # Évolution des prélèvements (moyenne glissante)
+                    st.markdown(f"**Prélèvements et moyenne glissante ({ROLLING_WINDOW} signatures)**")
+                    st.line_chart(
+                        history.set_index('reset_date')[['amount_taken', 'rolling_taken']]
+                        .rename(columns={'amount_taken': 'Prélevé', 'rolling_taken': 'Moyenne glissante'})
+                    )
                 else:
                     st.info("Pas assez de signatures pour calculer les délais")
 
@@ -470,52 +510,18 @@ def show():
         st.subheader("👥 Statistiques par Personne")
 
         try:
-            signatures = supabase.table('cash_register_resets').select('*').neq('reset_by', 'Système').order('reset_date', desc=True).execute()
-
-            if signatures.data:
-                # Grouper par personne
-                stats_by_person = {}
-
-                for sig in signatures.data:
-                    person = sig['reset_by']
-                    if person not in stats_by_person:
-                        stats_by_person[person] = {
-                            'count': 0,
-                            'total_taken': 0,
-                            'total_in_register': 0,
-                            'amounts_taken': [],
-                            'last_amount': 0,
-                            'last_date': None
-                        }
-
-                    stats_by_person[person]['count'] += 1
-                    stats_by_person[person]['total_taken'] += sig['amount_taken']
-                    stats_by_person[person]['total_in_register'] += sig['amount_in_register']
-                    stats_by_person[person]['amounts_taken'].append(sig['amount_taken'])
-
-                    # Garder le dernier prélèvement (la première signature dans la liste car order desc)
-                    sig_date = datetime.fromisoformat(sig['reset_date'].replace('Z', '+00:00'))
-                    if stats_by_person[person]['last_date'] is None or sig_date > stats_by_person[person]['last_date']:
-                        stats_by_person[person]['last_amount'] = sig['amount_taken']
-                        stats_by_person[person]['last_date'] = sig_date
-
-                # Créer le DataFrame
-                person_data = []
-                for person, stats in stats_by_person.items():
-                    person_data.append({
-                        'Personne': person,
-                        'Nombre de Signatures': stats['count'],
-                        'Total Prélevé': f"{stats['total_taken']:,.0f} DA",
-                        'Dernier Prélèvement': f"{stats['last_amount']:,.0f} DA",
-                        'Min Prélevé': f"{min(stats['amounts_taken']):,.0f} DA",
-                        'Max Prélevé': f"{max(stats['amounts_taken']):,.0f} DA"
-                    })
-
-                df_person = pd.DataFrame(person_data)
-                # Trier par total prélevé (convertir en nombre pour le tri)
-                df_person['_sort'] = df_person['Total Prélevé'].str.replace(' DA', '').str.replace(',', '').astype(float)
-                df_person = df_person.sort_values('_sort', ascending=False).drop('_sort', axis=1)
-
+            audit = get_signature_audit(supabase)
+            by_person = audit['by_person']
+
+            if not by_person.empty:
+                df_person = pd.DataFrame({
+                    'Personne': by_person.index,
+                    'Nombre de Signatures': by_person['count'].values,
+                    'Total Prélevé': by_person['total_taken'].map(_amount).values,
+                    'Dernier Prélèvement': by_person['last_amount'].map(_amount).values,
+                    'Min Prélevé': by_person['min_taken'].map(_amount).values,
+                    'Max Prélevé': by_person['max_taken'].map(_amount).values
+                })
                 st.dataframe(df_person, use_container_width=True, hide_index=True)
 
                 st.divider()
@@ -523,10 +529,9 @@ def show():
                 # Graphique si possible (simple affichage textuel)
                 st.markdown("### 📊 Répartition des Signatures")
 
-                for person, stats in sorted(stats_by_person.items(), key=lambda x: x[1]['total_taken'], reverse=True):
-                    percentage = (stats['count'] / len(signatures.data)) * 100
-                    st.write(f"**{person}:** {stats['count']} signatures ({percentage:.1f}%)")
-                    st.progress(percentage / 100)
+                for person, stats in by_person.iterrows():
+                    st.write(f"**{person}:** {stats['count']} signatures ({stats['share'] * 100:.1f}%)")
+                    st.progress(float(stats['share']))
 
             else:
                 st.info("Aucune donnée disponible")
@@ -0,0 +1,120 @@
+"""
+Registre des pages de l'application.
+
+Chaque page déclare son libellé de navigation, le module qui l'affiche (importé
+seulement à la première visite), les rôles qui la voient et les ressources Supabase
+qu'elle lit (tables, vues et fonctions rpc/...), affichées dans le panneau de débogage.
+"""
+
+import importlib
+
+PAGES = [
+    {
+        'key': 'dashboard',
+        'label': "📊 Dashboard",
+        'module': 'modules.dashboard',
+        'roles': {'admin'},
+        'tables': {'rpc/get_dashboard_metrics', 'dashboard_ready_groups', 'languages', 'enrollment_balances'}
+    },
+    {
+        'key': 'students',
+        'label': "👥 Étudiants",
+        'module': 'modules.students',
+        'roles': {'admin'},
+        'tables': {'students', 'academic_years', 'enrollments', 'payments'}
+    },
+    {
+        'key': 'payments',
+        'label': "💰 Paiements",
+        'module': 'modules.payments',
+        'roles': {'admin'},
+        'tables': {'enrollments', 'payments', 'students', 'groups', 'enrollment_balances', 'cash_position'}
+    },
+    {
+        'key': 'trackers',
+        'label': "📈 Suivi de Caisse",
+        'module': 'modules.trackers',
+        'roles': {'admin'},
+        'tables': {'cash_register_resets', 'payments', 'enrollments', 'students', 'cash_position'}
+    },
+    {
+        'key': 'groups',
+        'label': "📚 Groupes",
+        'module': 'modules.groups',
+        'roles': {'admin'},
+        'tables': {'groups', 'group_teacher', 'languages', 'teachers', 'enrollments'}
+    },
+    {
+        'key': 'teachers',
+        'label': "👨‍🏫 Enseignants",
+        'module': 'modules.teachers',
+        'roles': {'admin'},
+        'tables': {'teachers', 'group_teacher'}
+    },
+    {
+        'key': 'classrooms',
+        'label': "🏫 Salles",
+        'module': 'modules.classrooms',
+        'roles': {'admin'},
+        'tables': {'classrooms', 'schedule'}
+    },
+    {
+        'key': 'schedule',
+        'label': "📅 Planning",
+        'module': 'modules.schedule',
+        'roles': {'admin'},
+        'tables': {'schedule', 'groups', 'classrooms', 'teachers', 'group_teacher', 'enrollments'}
+    },
+    {
+        'key': 'schedule',
+        'label': "📅 Mon Planning",
+        'module': 'modules.schedule',
+        'roles': {'teacher'},
+        'tables': {'group_teacher'}
+    },
+    {
+        'key': 'attendance',
+        'label': "✅ Présences",
+        'module': 'modules.attendance',
+        'roles': {'admin', 'teacher'},
+        'tables': {'attendance', 'enrollments', 'groups', 'group_teacher', 'rpc/get_attendance_rates'}
+    },
+    {
+        'key': 'profile',
+        'label': "👤 Mon Profil",
+        'module': 'modules.profile',
+        'roles': {'admin', 'teacher'},
+        'tables': {'users', 'teachers', 'group_teacher', 'schedule', 'enrollments'}
+    }
+]
+
+
+def pages_for_role(role):
+    """
+    Pages visibles pour un rôle, dans l'ordre du menu.
+
+    Args:
+        role: 'admin' ou 'teacher'
+
+    Returns:
+        list: Entrées de PAGES
+    """
+    return [page for page in PAGES if role in page['roles']]
+
+
+def get_page(label, role):
+    """Entrée du registre pour un libellé de navigation (None si absente ou interdite au rôle)."""
+    for page in pages_for_role(role):
+        if page['label'] == label:
+            return page
+    return None
+
+
+def load_page(page):
+    """
+    Importe le module d'une page à sa première visite (les suivantes réutilisent sys.modules).
+
+    Returns:
+        module: Module exposant show()
+    """
+    return importlib.import_module(page['module'])
@@ -0,0 +1,149 @@
+import time
+from contextvars import ContextVar
+
+# Nombre maximum de requêtes Supabase par affichage de page
+QUERY_BUDGETS = {
+    'dashboard': 12,  # créances : soldes restants paginés (1000 lignes), en cache 5 min
+    'students': 8,
+    'payments': 10,
+    'trackers': 10,
+    'groups': 6,
+    'teachers': 3,
+    'classrooms': 3,
+    'schedule': 8,
+    'attendance': 8,
+    'profile': 3
+}
+
+# Journal de la page en cours d'affichage (une valeur par thread de script Streamlit)
+_current_log = ContextVar('query_log', default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Levée quand une page dépasse son budget de requêtes."""
+
+
+def start_page_log(page):
+    """
+    Démarre le journal des requêtes d'un affichage de page.
+
+    Args:
+        page: Nom de la page (clé de QUERY_BUDGETS)
+
+    Returns:
+        dict: Journal {'page', 'started_at', 'queries'} rempli au fil des requêtes
+    """
+    log = {'page': page, 'started_at': time.perf_counter(), 'queries': []}
+    _current_log.set(log)
+    return log
+
+
+def stop_page_log():
+    """Arrête l'enregistrement et retourne le journal courant (None si aucun)."""
+    log = _current_log.get()
+    _current_log.set(None)
+    if log is not None:
+        log['duration_ms'] = (time.perf_counter() - log['started_at']) * 1000
+    return log
+
+
+def record_query(record):
+    """
+    Ajoute une requête au journal de la page en cours (appelé par le transport HTTP de utils).
+
+    Args:
+        record: dict method, table, filters, status, rows, bytes, latency_ms
+    """
+    log = _current_log.get()
+    if log is not None:
+        log['queries'].append(record)
+
+
+def summarize_page_log(log):
+    """
+    Agrège le journal d'une page.
+
+    Returns:
+        dict: queries, latency_ms, bytes, rows, budget, by_table (DataFrame)
+    """
+    import pandas as pd
+
+    queries = log['queries']
+    df = pd.DataFrame(queries, columns=['method', 'table', 'filters', 'status', 'rows', 'bytes', 'latency_ms'])
+
+    by_table = df.groupby('table').agg(
+        requetes=('table', 'size'),
+        lignes=('rows', 'sum'),
+        octets=('bytes', 'sum'),
+        latence_ms=('latency_ms', 'sum')
+    ).sort_values('latence_ms', ascending=False) if not df.empty else pd.DataFrame()
+
+    return {
+        'page': log['page'],
+        'queries': len(queries),
+        'latency_ms': float(df['latency_ms'].sum()) if not df.empty else 0.0,
+        'bytes': int(df['bytes'].sum()) if not df.empty else 0,
+        'rows': int(df['rows'].fillna(0).sum()) if not df.empty else 0,
+        'budget': QUERY_BUDGETS.get(log['page']),
+        'by_table': by_table
+    }
+
+
+def check_query_budget(log, budgets=None):
+    """
+    Vérifie qu'une page reste dans son budget de requêtes.
+
+    Args:
+        log: Journal retourné par start_page_log / stop_page_log
+        budgets: Budgets à utiliser (par défaut QUERY_BUDGETS)
+
+    Raises:
+        QueryBudgetExceeded: Si la page a fait plus de requêtes que son budget
+    """
+    budget = (budgets or QUERY_BUDGETS).get(log['page'])
+    count = len(log['queries'])
+
+    if budget is not None and count > budget:
+        calls = {}
+        for q in log['queries']:
+            calls[f"{q['method']} {q['table']}"] = calls.get(f"{q['method']} {q['table']}", 0) + 1
+        tables = ', '.join(f"{call} ×{n}" for call, n in sorted(calls.items(), key=lambda item: -item[1]))
+        raise QueryBudgetExceeded(
+            f"Page '{log['page']}' : {count} requêtes pour un budget de {budget} ({tables})"
+        )
+
+
+def show_debug_panel(log, expected_tables=None):
+    """
+    Affiche dans la sidebar le détail des requêtes de la page (réservé aux admins).
+
+    Args:
+        log: Journal de la page
+        expected_tables: Ressources déclarées par la page dans page_registry (optionnel) ;
+                         les autres ressources interrogées sont signalées
+    """
+    import pandas as pd
+    import streamlit as st
+
+    summary = summarize_page_log(log)
+    budget = summary['budget']
+    over_budget = budget is not None and summary['queries'] > budget
+
+    with st.sidebar.expander(f"🐞 Requêtes : {summary['queries']}" + (f" / {budget}" if budget else ""), expanded=over_budget):
+        if over_budget:
+            st.error(f"Budget dépassé ({summary['queries']} > {budget})")
+
+        if expected_tables is not None:
+            undeclared = sorted({q['table'] for q in log['queries']} - set(expected_tables))
+            if undeclared:
+                st.warning(f"Ressources non déclarées dans page_registry : {', '.join(undeclared)}")
+
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("Latence", f"{summary['latency_ms']:,.0f} ms")
+        with col2:
+            st.metric("Données", f"{summary['bytes'] / 1024:,.1f} Ko")
+
+        if not summary['by_table'].empty:
+            st.dataframe(summary['by_table'], width="stretch")
+            st.dataframe(pd.DataFrame(log['queries']), hide_index=True, width="stretch")
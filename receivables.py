@@ -0,0 +1,132 @@
+"""
+Créances : soldes restants par inscription et ancienneté depuis le dernier paiement.
+
+Le montant payé, le reste à payer et la date du dernier paiement viennent du registre
+enrollment_balances (tenu à jour par triggers, voir setup_enrollment_balances.sql) :
+une seule requête, filtrée côté serveur sur les inscriptions qui doivent encore de
+l'argent. pandas ne sert plus qu'aux tranches d'ancienneté et au rapport CSV.
+"""
+
+from datetime import date
+import pandas as pd
+import streamlit as st
+from cache import subscribe_mutations
+from utils import fetch_all_rows
+
+# Tranches d'ancienneté (jours depuis le dernier paiement, ou depuis l'inscription)
+AGING_BUCKETS = ['0-30 j', '30-60 j', '60+ j']
+AGING_BINS = [-float('inf'), 30, 60, float('inf')]
+
+REPORT_COLUMNS = {
+    'student_code': 'Code',
+    'student': 'Étudiant',
+    'email': 'Email',
+    'group': 'Groupe',
+    'language': 'Langue',
+    'total_course_fee': 'Total Cours (DA)',
+    'paid': 'Payé (DA)',
+    'remaining': 'Restant (DA)',
+    'last_payment_date': 'Dernier Paiement',
+    'days_since': 'Jours',
+    'aging': 'Ancienneté'
+}
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def load_receivables_data(_supabase):
+    """
+    Charge les soldes restants (remaining > 0) avec l'inscription, l'étudiant et le groupe.
+
+    Args:
+        _supabase: Client Supabase (exclu de la clé du cache)
+
+    Returns:
+        list: Lignes enrollment_balances avec enrollments(...) embarqué
+    """
+    return fetch_all_rows(lambda: _supabase.table('enrollment_balances').select(
+        'enrollment_id, total_course_fee, paid_total, remaining, last_payment_date, '
+        'enrollments(student_id, enrollment_date, enrollment_active, '
+        'students(first_name, last_name, email, student_code), groups(name, mode, level, languages(name)))',
+        count='exact'
+    ).gt('remaining', 0).order('enrollment_id'))
+
+
+subscribe_mutations('receivables', {'enrollment_balances', 'enrollments', 'students', 'groups'}, load_receivables_data.clear)
+
+
+def compute_receivables(balances, today=None):
+    """
+    Met en forme les soldes restants et calcule leur ancienneté.
+
+    Args:
+        balances: Lignes retournées par load_receivables_data
+        today: Date de référence pour l'ancienneté (par défaut aujourd'hui)
+
+    Returns:
+        pd.DataFrame: Une ligne par inscription avec un reste à payer, triée par montant restant
+                      (enrollment_id, student_id, student, email, student_code, group, language,
+                      mode, level, enrollment_year, total_course_fee, paid, remaining,
+                      last_payment_date, days_since, aging)
+    """
+    columns = ['enrollment_id', 'student_id', 'student', 'email', 'student_code', 'group', 'language', 'mode',
+               'level', 'enrollment_year', 'total_course_fee', 'paid', 'remaining', 'last_payment_date',
+               'days_since', 'aging']
+    if not balances:
+        return pd.DataFrame(columns=columns)
+
+    today = pd.Timestamp(today or date.today())
+
+    df = pd.json_normalize(balances)
+    df = df.rename(columns={
+        'paid_total': 'paid',
+        'enrollments.student_id': 'student_id',
+        'enrollments.enrollment_date': 'enrollment_date',
+        'enrollments.students.email': 'email',
+        'enrollments.students.student_code': 'student_code',
+        'enrollments.groups.name': 'group',
+        'enrollments.groups.mode': 'mode',
+        'enrollments.groups.level': 'level',
+        'enrollments.groups.languages.name': 'language',
+        'enrollments.students.first_name': 'first_name',
+        'enrollments.students.last_name': 'last_name'
+    })
+    for column in ['student_id', 'enrollment_date', 'email', 'student_code', 'group', 'mode', 'level', 'language',
+                   'first_name', 'last_name']:
+        if column not in df:
+            df[column] = None
+    df['student'] = df['first_name'].fillna('N/A') + ' ' + df['last_name'].fillna('N/A')
+    for column in ['total_course_fee', 'paid', 'remaining']:
+        df[column] = pd.to_numeric(df[column]).fillna(0)
+
+    enrolled_at = pd.to_datetime(df['enrollment_date'], format='ISO8601', errors='coerce', utc=True).dt.tz_localize(None)
+    df['enrollment_year'] = enrolled_at.dt.year
+    df['last_payment_date'] = pd.to_datetime(
+        df['last_payment_date'], format='ISO8601', errors='coerce', utc=True
+    ).dt.tz_localize(None)
+
+    # Ancienneté depuis le dernier paiement (ou l'inscription si aucun paiement)
+    reference = df['last_payment_date'].fillna(enrolled_at)
+    df['days_since'] = (today - reference).dt.days.fillna(0).astype(int)
+    df['aging'] = pd.cut(df['days_since'], bins=AGING_BINS, labels=AGING_BUCKETS, right=False)
+
+    return df[columns].sort_values('remaining', ascending=False).reset_index(drop=True)
+
+
+def aging_summary(receivables):
+    """
+    Agrège les créances par tranche d'ancienneté.
+
+    Returns:
+        pd.DataFrame: index tranche (toutes présentes), colonnes count et remaining
+    """
+    return receivables.groupby('aging', observed=False).agg(
+        count=('enrollment_id', 'size'),
+        remaining=('remaining', 'sum')
+    ).reindex(AGING_BUCKETS, fill_value=0)
+
+
+def receivables_report_csv(receivables):
+    """Rapport des créances au format CSV (séparateur ';', compatible Excel)."""
+    report = receivables[list(REPORT_COLUMNS)].rename(columns=REPORT_COLUMNS)
+    report['Dernier Paiement'] = report['Dernier Paiement'].dt.strftime('%d/%m/%Y').fillna('')
+    return report.to_csv(index=False, sep=';').encode('utf-8-sig')
@@ -0,0 +1,146 @@
+"""
+Détection des conflits de planning : salle occupée ou enseignant déjà en cours.
+
+Les créneaux sont rangés par (salle, jour) et par (enseignant, jour) dans des listes
+triées par heure de début, avec pour chaque position la fin la plus tardive des
+créneaux qui la précèdent. Les créneaux d'une même clé peuvent se chevaucher (données
+antérieures aux contraintes de setup_schedule_conflicts.sql, créneaux ajoutés par le
+planificateur) : la recherche dichotomique trouve les créneaux qui commencent avant la
+fin proposée, et la fin maximale arrête le parcours dès qu'aucun ne peut plus chevaucher.
+"""
+
+from bisect import bisect_left
+from datetime import datetime
+from utils import fetch_all_rows
+
+SCHEDULE_COLUMNS = 'id, group_id, classroom_id, day_of_week, start_time, end_time, is_online'
+
+
+def to_minutes(value):
+    """Convertit une heure ('HH:MM', 'HH:MM:SS' ou time) en minutes depuis minuit."""
+    if isinstance(value, str):
+        value = datetime.strptime(value[:5], '%H:%M').time()
+    return value.hour * 60 + value.minute
+
+
+class ScheduleIndex:
+    """
+    Index des créneaux existants par salle et par enseignant.
+
+    Usage:
+        index = load_schedule_index(supabase, day_of_week='Lundi')
+        conflicts = index.conflicts(group_id, classroom_id, 'Lundi', time(9), time(11))
+    """
+
+    def __init__(self, group_teachers=None):
+        # clé -> (heures de début triées, créneaux dans le même ordre,
+        #         fin maximale des créneaux jusqu'à chaque position incluse)
+        self._intervals = {}
+        # group_id -> set des teacher_id
+        self.teachers_by_group = {}
+        for gt in group_teachers or []:
+            self.teachers_by_group.setdefault(gt['group_id'], set()).add(gt['teacher_id'])
+
+    def _keys(self, group_id, classroom_id, day_of_week, is_online=False):
+        """Clés d'index occupées par un créneau."""
+        keys = [('enseignant', teacher_id, day_of_week) for teacher_id in self.teachers_by_group.get(group_id, ())]
+        if classroom_id and not is_online:
+            keys.append(('salle', classroom_id, day_of_week))
+        return keys
+
+    def add(self, slot):
+        """
+        Ajoute un créneau (ligne de schedule) à l'index.
+
+        Args:
+            slot: dict avec group_id, classroom_id, day_of_week, start_time, end_time, is_online
+        """
+        start, end = to_minutes(slot['start_time']), to_minutes(slot['end_time'])
+        for key in self._keys(slot['group_id'], slot.get('classroom_id'), slot['day_of_week'], slot.get('is_online')):
+            starts, slots, max_ends = self._intervals.setdefault(key, ([], [], []))
+            position = bisect_left(starts, start)
+            starts.insert(position, start)
+            slots.insert(position, (start, end, slot))
+            max_ends.insert(position, end)
+            for i in range(position, len(max_ends)):
+                max_ends[i] = max(slots[i][1], max_ends[i - 1] if i else 0)
+
+    def conflicts(self, group_id, classroom_id, day_of_week, start_time, end_time, is_online=False):
+        """
+        Liste les créneaux existants qui chevauchent le créneau proposé.
+
+        Args:
+            group_id: Groupe du créneau proposé (ses enseignants sont vérifiés)
+            classroom_id: Salle (None pour un cours en ligne)
+            day_of_week: Jour de la semaine
+            start_time: Heure de début
+            end_time: Heure de fin
+            is_online: Cours en ligne (pas de vérification de salle)
+
+        Returns:
+            list: dicts {'type': 'salle' | 'enseignant', 'id': salle ou enseignant, 'slot': créneau existant}
+        """
+        start, end = to_minutes(start_time), to_minutes(end_time)
+        found = []
+
+        for key in self._keys(group_id, classroom_id, day_of_week, is_online):
+            starts, slots, max_ends = self._intervals.get(key, ([], [], []))
+            # Créneaux commençant avant la fin proposée ; on remonte tant qu'un créneau
+            # précédent peut encore se terminer après le début proposé
+            position = bisect_left(starts, end) - 1
+            while position >= 0 and max_ends[position] > start:
+                if slots[position][1] > start:
+                    found.append({'type': key[0], 'id': key[1], 'slot': slots[position][2]})
+                position -= 1
+
+        return found
+
+
+def build_schedule_index(schedules, group_teachers):
+    """
+    Construit l'index à partir des lignes de schedule et de group_teacher.
+
+    Returns:
+        ScheduleIndex
+    """
+    index = ScheduleIndex(group_teachers)
+    for slot in schedules:
+        index.add(slot)
+    return index
+
+
+def load_schedule_index(supabase, day_of_week=None):
+    """
+    Charge les créneaux (éventuellement d'un seul jour) et les affectations
+    enseignant-groupe en deux requêtes.
+
+    Args:
+        supabase: Client Supabase
+        day_of_week: Limiter l'index à un jour (optionnel)
+
+    Returns:
+        ScheduleIndex
+    """
+    def schedule_query():
+        query = supabase.table('schedule').select(SCHEDULE_COLUMNS, count='exact').order('id')
+        if day_of_week:
+            query = query.eq('day_of_week', day_of_week)
+        return query
+
+    schedules = fetch_all_rows(schedule_query)
+    group_teachers = fetch_all_rows(lambda: supabase.table('group_teacher').select('group_id, teacher_id', count='exact').order('id'))
+    return build_schedule_index(schedules, group_teachers)
+
+
+def describe_conflict(conflict):
+    """Message lisible pour un conflit retourné par ScheduleIndex.conflicts."""
+    slot = conflict['slot']
+    hours = f"{str(slot['start_time'])[:5]} - {str(slot['end_time'])[:5]}"
+    if conflict['type'] == 'salle':
+        return f"Salle déjà occupée le {slot['day_of_week']} de {hours} (groupe {slot['group_id']})"
+    return f"Enseignant déjà en cours le {slot['day_of_week']} de {hours} (groupe {slot['group_id']})"
+
+
+def is_schedule_conflict_error(error):
+    """Vrai si l'erreur Supabase vient de la contrainte d'exclusion ou du trigger enseignant."""
+    return getattr(error, 'code', None) == '23P01' or 'schedule_no_room_overlap' in str(error)
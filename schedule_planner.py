@@ -0,0 +1,230 @@
+"""
+Import groupé du planning : placement automatique des créneaux hebdomadaires.
+
+Le fichier CSV décrit les besoins de chaque groupe :
+
+    groupe,heures_par_semaine,mode,jours_preferes,duree_seance
+    JAP-N1-A,4,presential_group,Samedi;Mardi,2
+    CHI-N2-B,2,online_group,,
+
+- groupe : nom (ou ID) du groupe
+- heures_par_semaine : volume hebdomadaire, découpé en séances de duree_seance heures (2 par défaut)
+- mode : optionnel, sinon celui du groupe ; les modes "online_*" ne prennent pas de salle
+- jours_preferes : optionnel, jours séparés par ";" essayés en premier
+
+Le placement est glouton, les groupes les plus contraints d'abord : pour chaque séance,
+on essaie les jours préférés puis les autres (jamais deux séances du même groupe le même
+jour), les heures d'ouverture par pas de 30 minutes, et la plus petite salle assez grande
+pour le groupe, en respectant les créneaux existants et ceux déjà placés (ScheduleIndex).
+"""
+
+import io
+from datetime import time
+import pandas as pd
+from schedule_conflicts import load_schedule_index, to_minutes
+from utils import fetch_rows_in
+
+OPENING_TIME = time(9, 0)
+CLOSING_TIME = time(20, 0)
+STEP_MINUTES = 30
+DEFAULT_SESSION_HOURS = 2
+
+REQUIRED_COLUMNS = ['groupe', 'heures_par_semaine']
+
+
+def parse_requirements_csv(file, groups):
+    """
+    Lit le CSV des besoins et le rapproche des groupes existants.
+
+    Args:
+        file: Fichier CSV (chemin, bytes ou objet fichier)
+        groups: Lignes de la table groups
+
+    Returns:
+        tuple: (besoins valides, erreurs) ; un besoin est un dict group, hours, mode,
+               preferred_days, session_minutes
+    """
+    if isinstance(file, bytes):
+        file = io.BytesIO(file)
+
+    df = pd.read_csv(file, dtype=str, sep=None, engine='python').fillna('')
+    df.columns = [column.strip().lower() for column in df.columns]
+
+    missing = [column for column in REQUIRED_COLUMNS if column not in df.columns]
+    if missing:
+        return [], [f"Colonnes manquantes : {', '.join(missing)}"]
+
+    groups_by_key = {}
+    for group in groups:
+        groups_by_key[str(group['id'])] = group
+        groups_by_key[group['name'].strip().lower()] = group
+
+    requirements, errors = [], []
+    for line, row in enumerate(df.to_dict('records'), start=2):
+        group = groups_by_key.get(row['groupe'].strip().lower())
+        if not group:
+            errors.append(f"Ligne {line} : groupe '{row['groupe']}' introuvable")
+            continue
+
+        try:
+            hours = float(row['heures_par_semaine'].replace(',', '.'))
+            session_hours = float((row.get('duree_seance') or str(DEFAULT_SESSION_HOURS)).replace(',', '.'))
+        except ValueError:
+            errors.append(f"Ligne {line} : durée invalide")
+            continue
+
+        if hours <= 0 or session_hours <= 0:
+            errors.append(f"Ligne {line} : durée invalide")
+            continue
+
+        requirements.append({
+            'group': group,
+            'hours': hours,
+            'mode': row.get('mode', '').strip() or group.get('mode') or '',
+            'preferred_days': [day.strip().capitalize() for day in row.get('jours_preferes', '').split(';') if day.strip()],
+            'session_minutes': int(session_hours * 60)
+        })
+
+    return requirements, errors
+
+
+def _sessions(requirement):
+    """Durées (minutes) des séances hebdomadaires d'un besoin."""
+    total = int(requirement['hours'] * 60)
+    length = requirement['session_minutes']
+    sessions = [length] * (total // length)
+    if total % length:
+        sessions.append(total % length)
+    return sessions
+
+
+def _format(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}:00"
+
+
+def plan_timetable(requirements, classrooms, index, group_sizes, days):
+    """
+    Place les séances des besoins dans la semaine.
+
+    Args:
+        requirements: Besoins retournés par parse_requirements_csv
+        classrooms: Lignes de la table classrooms (capacity)
+        index: ScheduleIndex des créneaux existants (complété au fil du placement)
+        group_sizes: group_id -> nombre d'étudiants actifs
+        days: Jours ouvrés, dans l'ordre
+
+    Returns:
+        tuple: (créneaux à insérer, besoins non placés avec la raison) ; un groupe dont une
+               séance ne trouve pas de créneau n'a aucun créneau retenu
+    """
+    opening, closing = to_minutes(OPENING_TIME), to_minutes(CLOSING_TIME)
+    rooms = sorted(classrooms, key=lambda c: c.get('capacity') or 0)
+
+    # Les plus contraints d'abord : beaucoup d'heures, peu de jours préférés, grands groupes
+    ordered = sorted(
+        requirements,
+        key=lambda r: (-r['hours'], len(r['preferred_days']) or len(days), -group_sizes.get(r['group']['id'], 0))
+    )
+
+    planned, unplaced = [], []
+    for requirement in ordered:
+        group = requirement['group']
+        is_online = requirement['mode'].startswith('online')
+        size = max(group_sizes.get(group['id'], 0), group.get('min_students') or 0)
+        fitting_rooms = [None] if is_online else [room for room in rooms if (room.get('capacity') or 0) >= size]
+        day_order = [day for day in requirement['preferred_days'] if day in days] + \
+                    [day for day in days if day not in requirement['preferred_days']]
+
+        if not fitting_rooms:
+            unplaced.append({'group': group['name'], 'reason': f"aucune salle de {size} places"})
+            continue
+
+        # Séances du groupe placées en tout ou rien : elles tombent sur des jours distincts
+        # et ne peuvent donc pas se chevaucher entre elles, l'index n'est complété qu'à la fin
+        group_slots, used_days, missing = [], set(), None
+        for length in _sessions(requirement):
+            slot = None
+            for day in day_order:
+                if day in used_days:
+                    continue
+                for start in range(opening, closing - length + 1, STEP_MINUTES):
+                    for room in fitting_rooms:
+                        candidate = {
+                            'group_id': group['id'],
+                            'classroom_id': room['id'] if room else None,
+                            'day_of_week': day,
+                            'start_time': _format(start),
+                            'end_time': _format(start + length),
+                            'is_online': is_online
+                        }
+                        if not index.conflicts(group['id'], candidate['classroom_id'], day,
+                                               candidate['start_time'], candidate['end_time'], is_online):
+                            slot = {**candidate, 'group_name': group['name'], 'classroom_name': room['name'] if room else 'En ligne'}
+                            break
+                    if slot:
+                        break
+                if slot:
+                    break
+
+            if slot is None:
+                missing = length
+                break
+
+            used_days.add(slot['day_of_week'])
+            group_slots.append(slot)
+
+        if missing is not None:
+            placed = f" ({len(group_slots)} séance(s) possible(s), aucune retenue)" if group_slots else ""
+            unplaced.append({'group': group['name'], 'reason': f"aucun créneau libre de {missing // 60}h{missing % 60:02d}{placed}"})
+            continue
+
+        for slot in group_slots:
+            index.add(slot)
+        planned.extend(group_slots)
+
+    return planned, unplaced
+
+
+def plan_from_csv(supabase, file, groups, classrooms, days):
+    """
+    Lit le CSV et calcule le placement contre le planning existant.
+
+    Args:
+        supabase: Client Supabase
+        file: Fichier CSV des besoins
+        groups: Lignes de la table groups
+        classrooms: Lignes de la table classrooms
+        days: Jours ouvrés
+
+    Returns:
+        tuple: (créneaux proposés, non placés, erreurs du fichier)
+    """
+    requirements, errors = parse_requirements_csv(file, groups)
+    if not requirements:
+        return [], [], errors
+
+    group_ids = [r['group']['id'] for r in requirements]
+    enrollments = fetch_rows_in(
+        lambda: supabase.table('enrollments').select('id, group_id', count='exact').eq('enrollment_active', True).order('id'),
+        'group_id', group_ids
+    )
+    group_sizes = {}
+    for enrollment in enrollments:
+        group_sizes[enrollment['group_id']] = group_sizes.get(enrollment['group_id'], 0) + 1
+
+    index = load_schedule_index(supabase)
+    planned, unplaced = plan_timetable(requirements, classrooms, index, group_sizes, days)
+    return planned, unplaced, errors
+
+
+def insert_planned_slots(supabase, planned):
+    """
+    Insère les créneaux proposés en une seule requête (tout ou rien côté base :
+    la contrainte d'exclusion rejette le lot si un créneau est entre-temps occupé).
+
+    Returns:
+        list: Lignes insérées
+    """
+    columns = ['group_id', 'classroom_id', 'day_of_week', 'start_time', 'end_time', 'is_online']
+    response = supabase.table('schedule').insert([{column: slot[column] for column in columns} for slot in planned]).execute()
+    return response.data or []
@@ -0,0 +1,52 @@
+-- ============================================
+-- Présences : contrainte d'unicité pour l'enregistrement groupé (upsert)
+-- À exécuter dans Supabase SQL Editor
+-- ============================================
+
+-- Supprimer les doublons éventuels (on garde la ligne la plus récente)
+DELETE FROM attendance a
+USING attendance b
+WHERE a.enrollment_id = b.enrollment_id
+  AND a.date = b.date
+  AND a.id < b.id;
+
+-- Une seule présence par inscription et par jour
+CREATE UNIQUE INDEX IF NOT EXISTS attendance_enrollment_date_key ON attendance(enrollment_id, date);
+
+-- Taux de présence par étudiant, optionnellement pour un groupe et une période
+CREATE INDEX IF NOT EXISTS idx_attendance_date ON attendance(date);
+CREATE INDEX IF NOT EXISTS idx_enrollments_student_id ON enrollments(student_id);
+
+-- Un seul tableau jsonb : une fonction qui retourne un scalaire n'est pas tronquée par max-rows
+-- (le type de retour change : l'ancienne version RETURNS TABLE doit être supprimée)
+DROP FUNCTION IF EXISTS get_attendance_rates(BIGINT, DATE, DATE);
+
+CREATE OR REPLACE FUNCTION get_attendance_rates(
+    p_group_id BIGINT DEFAULT NULL,
+    p_start_date DATE DEFAULT NULL,
+    p_end_date DATE DEFAULT NULL
+)
+RETURNS jsonb
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT COALESCE(jsonb_agg(to_jsonb(t) ORDER BY t.last_name, t.first_name, t.student_id), '[]'::jsonb)
+    FROM (
+        SELECT
+            s.id AS student_id,
+            s.first_name,
+            s.last_name,
+            s.student_code,
+            COUNT(*) AS total,
+            COUNT(*) FILTER (WHERE a.present) AS present,
+            COUNT(*) FILTER (WHERE NOT a.present) AS absent,
+            ROUND(100.0 * COUNT(*) FILTER (WHERE a.present) / COUNT(*), 1) AS rate
+        FROM attendance a
+        JOIN enrollments e ON a.enrollment_id = e.id
+        JOIN students s ON e.student_id = s.id
+        WHERE (p_group_id IS NULL OR e.group_id = p_group_id)
+          AND (p_start_date IS NULL OR a.date >= p_start_date)
+          AND (p_end_date IS NULL OR a.date <= p_end_date)
+        GROUP BY s.id, s.first_name, s.last_name, s.student_code
+    ) t;
+$$;
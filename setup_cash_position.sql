@@ -0,0 +1,108 @@
+-- ============================================
+-- Position de caisse incrémentale
+-- Montant laissé à la dernière signature + paiements reçus depuis,
+-- maintenu par triggers : la lecture du montant en caisse est une seule ligne
+-- À exécuter dans Supabase SQL Editor
+-- ============================================
+
+CREATE INDEX IF NOT EXISTS idx_payments_method_date ON payments(payment_method, payment_date);
+CREATE INDEX IF NOT EXISTS idx_cash_register_resets_date ON cash_register_resets(reset_date DESC);
+
+-- Ligne unique (id = 1)
+CREATE TABLE IF NOT EXISTS cash_position (
+    id INT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    last_reset_id BIGINT,
+    last_reset_date TIMESTAMPTZ,
+    last_reset_by TEXT,
+    amount_left NUMERIC NOT NULL DEFAULT 0,
+    cash_since_reset NUMERIC NOT NULL DEFAULT 0,
+    cash_count_since_reset INT NOT NULL DEFAULT 0,
+    online_since_reset NUMERIC NOT NULL DEFAULT 0,
+    online_count_since_reset INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+ALTER TABLE cash_position DISABLE ROW LEVEL SECURITY;
+
+-- Recalcule la position depuis la dernière signature (parcours indexé des seuls paiements récents)
+CREATE OR REPLACE FUNCTION rebuild_cash_position()
+RETURNS void
+LANGUAGE sql
+AS $$
+    INSERT INTO cash_position (
+        id, last_reset_id, last_reset_date, last_reset_by, amount_left,
+        cash_since_reset, cash_count_since_reset, online_since_reset, online_count_since_reset, updated_at
+    )
+    SELECT
+        1,
+        r.id,
+        r.reset_date,
+        r.reset_by,
+        COALESCE(r.amount_left, 0),
+        COALESCE(SUM(p.amount) FILTER (WHERE p.payment_method = 'liquide'), 0),
+        COUNT(p.id) FILTER (WHERE p.payment_method = 'liquide'),
+        COALESCE(SUM(p.amount) FILTER (WHERE p.payment_method = 'en_ligne'), 0),
+        COUNT(p.id) FILTER (WHERE p.payment_method = 'en_ligne'),
+        NOW()
+    FROM (SELECT 1) AS one
+    LEFT JOIN LATERAL (
+        SELECT id, reset_date, reset_by, amount_left
+        FROM cash_register_resets
+        ORDER BY reset_date DESC
+        LIMIT 1
+    ) r ON true
+    LEFT JOIN payments p ON r.id IS NULL OR p.payment_date >= r.reset_date
+    GROUP BY r.id, r.reset_date, r.reset_by, r.amount_left
+    ON CONFLICT (id) DO UPDATE SET
+        last_reset_id = EXCLUDED.last_reset_id,
+        last_reset_date = EXCLUDED.last_reset_date,
+        last_reset_by = EXCLUDED.last_reset_by,
+        amount_left = EXCLUDED.amount_left,
+        cash_since_reset = EXCLUDED.cash_since_reset,
+        cash_count_since_reset = EXCLUDED.cash_count_since_reset,
+        online_since_reset = EXCLUDED.online_since_reset,
+        online_count_since_reset = EXCLUDED.online_count_since_reset,
+        updated_at = EXCLUDED.updated_at;
+$$;
+
+-- Nouveau paiement : on applique seulement le delta ; modification/suppression : recalcul
+CREATE OR REPLACE FUNCTION cash_position_on_payment()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE cash_position SET
+            cash_since_reset = cash_since_reset + CASE WHEN NEW.payment_method = 'liquide' THEN NEW.amount ELSE 0 END,
+            cash_count_since_reset = cash_count_since_reset + CASE WHEN NEW.payment_method = 'liquide' THEN 1 ELSE 0 END,
+            online_since_reset = online_since_reset + CASE WHEN NEW.payment_method = 'en_ligne' THEN NEW.amount ELSE 0 END,
+            online_count_since_reset = online_count_since_reset + CASE WHEN NEW.payment_method = 'en_ligne' THEN 1 ELSE 0 END,
+            updated_at = NOW()
+        WHERE id = 1
+          AND (last_reset_date IS NULL OR NEW.payment_date >= last_reset_date);
+    ELSE
+        PERFORM rebuild_cash_position();
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS cash_position_on_payment ON payments;
+CREATE TRIGGER cash_position_on_payment
+    AFTER INSERT OR UPDATE OR DELETE ON payments
+    FOR EACH ROW EXECUTE FUNCTION cash_position_on_payment();
+
+-- Nouvelle signature : le montant laissé devient le nouveau point de départ
+CREATE OR REPLACE FUNCTION cash_position_on_reset()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM rebuild_cash_position();
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS cash_position_on_reset ON cash_register_resets;
+CREATE TRIGGER cash_position_on_reset
+    AFTER INSERT OR UPDATE OR DELETE ON cash_register_resets
+    FOR EACH STATEMENT EXECUTE FUNCTION cash_position_on_reset();
+
+-- Initialisation
+SELECT rebuild_cash_position();
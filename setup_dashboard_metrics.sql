@@ -0,0 +1,69 @@
+-- ============================================
+-- Métriques du Dashboard calculées côté serveur
+-- À exécuter dans Supabase SQL Editor
+-- ============================================
+
+-- Index utilisés par les agrégats
+CREATE INDEX IF NOT EXISTS idx_payments_enrollment_id ON payments(enrollment_id);
+CREATE INDEX IF NOT EXISTS idx_enrollments_group_active ON enrollments(group_id) WHERE enrollment_active = true;
+
+-- KPIs, étudiants par langue (inscriptions actives), types de cours et répartition des paiements en un seul appel
+CREATE OR REPLACE FUNCTION get_dashboard_metrics()
+RETURNS jsonb
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT jsonb_build_object(
+        'total_students', (SELECT COUNT(*) FROM students),
+        'total_payments', (SELECT COALESCE(SUM(amount), 0) FROM payments),
+        'total_groups', (SELECT COUNT(*) FROM groups),
+        'active_enrollments', (SELECT COUNT(*) FROM enrollments WHERE enrollment_active = true),
+        'students_by_language', COALESCE((
+            SELECT jsonb_agg(jsonb_build_object('language', t.name, 'students', t.count) ORDER BY t.name)
+            FROM (
+                SELECT l.name, COUNT(*) AS count
+                FROM enrollments e
+                JOIN groups g ON e.group_id = g.id
+                JOIN languages l ON g.language_id = l.id
+                WHERE e.enrollment_active = true
+                GROUP BY l.name
+            ) t
+        ), '[]'::jsonb),
+        'groups_by_mode', COALESCE((
+            SELECT jsonb_agg(jsonb_build_object('mode', t.mode, 'groups', t.count) ORDER BY t.mode)
+            FROM (
+                SELECT mode, COUNT(*) AS count
+                FROM groups
+                GROUP BY mode
+            ) t
+        ), '[]'::jsonb),
+        'payments_by_method', COALESCE((
+            SELECT jsonb_agg(jsonb_build_object('method', t.payment_method, 'total', t.total) ORDER BY t.payment_method)
+            FROM (
+                SELECT payment_method, SUM(amount) AS total
+                FROM payments
+                GROUP BY payment_method
+            ) t
+        ), '[]'::jsonb)
+    );
+$$;
+
+-- Groupes ayant atteint le nombre minimum d'étudiants actifs
+-- (LEFT JOIN : un groupe sans inscription active est prêt si min_students = 0)
+CREATE OR REPLACE VIEW dashboard_ready_groups AS
+SELECT
+    g.id,
+    g.name,
+    l.name AS language,
+    g.level,
+    g.mode,
+    COUNT(e.id) AS enrolled_count,
+    g.min_students
+FROM groups g
+LEFT JOIN languages l ON g.language_id = l.id
+LEFT JOIN enrollments e ON e.group_id = g.id AND e.enrollment_active = true
+GROUP BY g.id, l.name
+HAVING COUNT(e.id) >= g.min_students;
+
+-- Remplacée par receivables.py (créances calculées avec pandas, filtres et ancienneté)
+DROP VIEW IF EXISTS dashboard_outstanding_balances;
@@ -0,0 +1,103 @@
+-- ============================================
+-- Solde par inscription maintenu par triggers
+-- À exécuter dans Supabase SQL Editor
+-- ============================================
+
+CREATE INDEX IF NOT EXISTS idx_payments_enrollment_id ON payments(enrollment_id);
+
+-- Une ligne par inscription : total payé, reste à payer, date du dernier paiement
+CREATE TABLE IF NOT EXISTS enrollment_balances (
+    enrollment_id BIGINT PRIMARY KEY REFERENCES enrollments(id) ON DELETE CASCADE,
+    total_course_fee NUMERIC NOT NULL DEFAULT 0,
+    paid_total NUMERIC NOT NULL DEFAULT 0,
+    remaining NUMERIC NOT NULL DEFAULT 0,
+    last_payment_date TIMESTAMPTZ,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+ALTER TABLE enrollment_balances DISABLE ROW LEVEL SECURITY;
+
+-- Recalcule le solde d'une inscription (lecture indexée sur payments.enrollment_id).
+-- Le verrou consultatif sérialise les recalculs d'une même inscription jusqu'à la fin
+-- de la transaction : deux paiements simultanés ne peuvent plus écrire chacun un total
+-- calculé sans voir l'autre (l'agrégat est lu après l'obtention du verrou).
+CREATE OR REPLACE FUNCTION refresh_enrollment_balance(p_enrollment_id BIGINT)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('enrollment_balances'), p_enrollment_id::INT);
+
+    INSERT INTO enrollment_balances (enrollment_id, total_course_fee, paid_total, remaining, last_payment_date, updated_at)
+    SELECT
+        e.id,
+        e.total_course_fee,
+        COALESCE(SUM(p.amount), 0),
+        e.total_course_fee - COALESCE(SUM(p.amount), 0),
+        MAX(p.payment_date),
+        NOW()
+    FROM enrollments e
+    LEFT JOIN payments p ON p.enrollment_id = e.id
+    WHERE e.id = p_enrollment_id
+    GROUP BY e.id, e.total_course_fee
+    ON CONFLICT (enrollment_id) DO UPDATE SET
+        total_course_fee = EXCLUDED.total_course_fee,
+        paid_total = EXCLUDED.paid_total,
+        remaining = EXCLUDED.remaining,
+        last_payment_date = EXCLUDED.last_payment_date,
+        updated_at = EXCLUDED.updated_at;
+END;
+$$;
+
+-- Trigger sur payments : insertion, modification ou suppression d'un paiement
+CREATE OR REPLACE FUNCTION payments_refresh_balance()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.enrollment_id IS NOT NULL THEN
+        PERFORM refresh_enrollment_balance(NEW.enrollment_id);
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.enrollment_id IS NOT NULL
+       AND (TG_OP = 'DELETE' OR OLD.enrollment_id IS DISTINCT FROM NEW.enrollment_id) THEN
+        PERFORM refresh_enrollment_balance(OLD.enrollment_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS payments_refresh_balance ON payments;
+CREATE TRIGGER payments_refresh_balance
+    AFTER INSERT OR UPDATE OR DELETE ON payments
+    FOR EACH ROW EXECUTE FUNCTION payments_refresh_balance();
+
+-- Trigger sur enrollments : création d'inscription ou changement du montant du cours
+CREATE OR REPLACE FUNCTION enrollments_refresh_balance()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM refresh_enrollment_balance(NEW.id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS enrollments_refresh_balance ON enrollments;
+CREATE TRIGGER enrollments_refresh_balance
+    AFTER INSERT OR UPDATE OF total_course_fee ON enrollments
+    FOR EACH ROW EXECUTE FUNCTION enrollments_refresh_balance();
+
+-- Initialisation pour les inscriptions existantes
+INSERT INTO enrollment_balances (enrollment_id, total_course_fee, paid_total, remaining, last_payment_date, updated_at)
+SELECT
+    e.id,
+    e.total_course_fee,
+    COALESCE(SUM(p.amount), 0),
+    e.total_course_fee - COALESCE(SUM(p.amount), 0),
+    MAX(p.payment_date),
+    NOW()
+FROM enrollments e
+LEFT JOIN payments p ON p.enrollment_id = e.id
+GROUP BY e.id, e.total_course_fee
+ON CONFLICT (enrollment_id) DO UPDATE SET
+    total_course_fee = EXCLUDED.total_course_fee,
+    paid_total = EXCLUDED.paid_total,
+    remaining = EXCLUDED.remaining,
+    last_payment_date = EXCLUDED.last_payment_date,
+    updated_at = EXCLUDED.updated_at;
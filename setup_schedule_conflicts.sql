@@ -0,0 +1,94 @@
+-- ============================================
+-- Planning : pas de chevauchement de salle ni d'enseignant
+-- Garantie côté base (y compris entre administrateurs simultanés et pour les imports groupés)
+-- À exécuter dans Supabase SQL Editor
+-- ============================================
+
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+-- Créneaux en conflit existants, à corriger avant d'ajouter la contrainte :
+-- SELECT a.id, b.id, a.classroom_id, a.day_of_week, a.start_time, a.end_time, b.start_time, b.end_time
+-- FROM schedule a
+-- JOIN schedule b ON b.classroom_id = a.classroom_id AND b.day_of_week = a.day_of_week AND b.id > a.id
+-- WHERE a.start_time < b.end_time AND b.start_time < a.end_time
+--   AND NOT COALESCE(a.is_online, FALSE) AND NOT COALESCE(b.is_online, FALSE);
+
+-- Salle : deux cours présentiels ne peuvent pas se chevaucher le même jour dans la même salle
+-- (intervalle [début, fin) en secondes depuis minuit)
+ALTER TABLE schedule DROP CONSTRAINT IF EXISTS schedule_no_room_overlap;
+ALTER TABLE schedule ADD CONSTRAINT schedule_no_room_overlap
+    EXCLUDE USING gist (
+        classroom_id WITH =,
+        day_of_week WITH =,
+        int4range(EXTRACT(EPOCH FROM start_time)::INT, EXTRACT(EPOCH FROM end_time)::INT, '[)') WITH &&
+    )
+    WHERE (classroom_id IS NOT NULL AND NOT COALESCE(is_online, FALSE));
+
+-- Enseignant : l'affectation est dans group_teacher, une contrainte d'exclusion ne peut pas
+-- la traverser. Un trigger vérifie le chevauchement sous un verrou par enseignant.
+CREATE INDEX IF NOT EXISTS idx_group_teacher_teacher_id ON group_teacher(teacher_id);
+CREATE INDEX IF NOT EXISTS idx_schedule_group_day ON schedule(group_id, day_of_week);
+
+CREATE OR REPLACE FUNCTION check_teacher_schedule_overlap(p_teacher_id BIGINT, p_group_id BIGINT)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_conflict RECORD;
+BEGIN
+    -- Sérialise les écritures concernant le même enseignant jusqu'à la fin de la transaction
+    PERFORM pg_advisory_xact_lock(hashtext('teacher_schedule'), p_teacher_id::INT);
+
+    SELECT mine.day_of_week, mine.start_time, other.group_id AS other_group_id
+    INTO v_conflict
+    FROM schedule mine
+    JOIN group_teacher gt ON gt.teacher_id = p_teacher_id AND gt.group_id <> p_group_id
+    JOIN schedule other ON other.group_id = gt.group_id
+        AND other.day_of_week = mine.day_of_week
+        AND other.start_time < mine.end_time
+        AND mine.start_time < other.end_time
+    WHERE mine.group_id = p_group_id
+    LIMIT 1;
+
+    IF FOUND THEN
+        RAISE EXCEPTION 'Enseignant % déjà en cours le % à % (groupe %)',
+            p_teacher_id, v_conflict.day_of_week, v_conflict.start_time, v_conflict.other_group_id
+            USING ERRCODE = 'exclusion_violation';
+    END IF;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION trg_schedule_teacher_overlap()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_teacher_id BIGINT;
+BEGIN
+    FOR v_teacher_id IN SELECT teacher_id FROM group_teacher WHERE group_id = NEW.group_id LOOP
+        PERFORM check_teacher_schedule_overlap(v_teacher_id, NEW.group_id);
+    END LOOP;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION trg_group_teacher_overlap()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM check_teacher_schedule_overlap(NEW.teacher_id, NEW.group_id);
+    RETURN NULL;
+END;
+$$;
+
+-- Triggers AFTER : la ligne insérée est visible par la vérification
+DROP TRIGGER IF EXISTS schedule_teacher_overlap ON schedule;
+CREATE TRIGGER schedule_teacher_overlap
+    AFTER INSERT OR UPDATE OF group_id, day_of_week, start_time, end_time ON schedule
+    FOR EACH ROW EXECUTE FUNCTION trg_schedule_teacher_overlap();
+
+DROP TRIGGER IF EXISTS group_teacher_overlap ON group_teacher;
+CREATE TRIGGER group_teacher_overlap
+    AFTER INSERT OR UPDATE OF teacher_id, group_id ON group_teacher
+    FOR EACH ROW EXECUTE FUNCTION trg_group_teacher_overlap();
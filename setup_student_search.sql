@@ -0,0 +1,16 @@
+-- ============================================
+-- Recherche d'étudiants côté serveur
+-- Index trigrammes pour les filtres ilike '%texte%' (nom, prénom, email, code)
+-- À exécuter dans Supabase SQL Editor
+-- ============================================
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_students_first_name_trgm ON students USING gin (first_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_students_last_name_trgm ON students USING gin (last_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_students_email_trgm ON students USING gin (email gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_students_student_code_trgm ON students USING gin (student_code gin_trgm_ops);
+
+-- Pagination par date de création et comptage par année académique
+CREATE INDEX IF NOT EXISTS idx_students_created_at ON students(created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_students_academic_year ON students(academic_year_id);
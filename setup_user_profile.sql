@@ -0,0 +1,41 @@
+-- ============================================
+-- Profil de l'utilisateur connecté en un seul appel (users + teacher_id)
+-- Utilisé par auth.sign_in et auth.get_current_user via supabase.rpc('get_my_profile')
+-- À exécuter dans Supabase SQL Editor
+-- ============================================
+
+CREATE INDEX IF NOT EXISTS idx_teachers_user_id ON teachers(user_id);
+
+CREATE OR REPLACE FUNCTION get_my_profile()
+RETURNS TABLE (
+    user_id UUID,
+    email TEXT,
+    first_name TEXT,
+    last_name TEXT,
+    role TEXT,
+    email_confirmed BOOLEAN,
+    teacher_id BIGINT
+)
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    SELECT
+        u.id,
+        u.email::TEXT,
+        u.first_name::TEXT,
+        u.last_name::TEXT,
+        u.role::TEXT,
+        COALESCE(u.email_confirmed, FALSE),
+        t.id::BIGINT
+    FROM users u
+    LEFT JOIN LATERAL (
+        SELECT id FROM teachers WHERE teachers.user_id = u.id ORDER BY id LIMIT 1
+    ) t ON u.role = 'teacher'
+    WHERE u.id = auth.uid();
+$$;
+
+-- Seul un utilisateur authentifié peut lire son propre profil
+REVOKE ALL ON FUNCTION get_my_profile() FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION get_my_profile() TO authenticated;
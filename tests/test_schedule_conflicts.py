@@ -0,0 +1,55 @@
+from datetime import time
+
+from schedule_conflicts import build_schedule_index
+
+
+def slot(slot_id, group_id, start_time, end_time, classroom_id=None, day_of_week='Lundi'):
+    return {
+        'id': slot_id,
+        'group_id': group_id,
+        'classroom_id': classroom_id,
+        'day_of_week': day_of_week,
+        'start_time': start_time,
+        'end_time': end_time,
+        'is_online': classroom_id is None
+    }
+
+
+def conflicting_ids(index, group_id, start_time, end_time, classroom_id=None, day_of_week='Lundi'):
+    conflicts = index.conflicts(group_id, classroom_id, day_of_week, start_time, end_time, is_online=classroom_id is None)
+    return sorted(conflict['slot']['id'] for conflict in conflicts)
+
+
+def test_overlapping_slots_on_same_teacher():
+    # Le créneau long (8h-12h) commence avant le court (9h-10h) qui se termine plus tôt :
+    # le parcours ne doit pas s'arrêter sur le créneau court
+    index = build_schedule_index(
+        [slot(1, 10, '08:00', '12:00'), slot(2, 11, '09:00', '10:00')],
+        [{'group_id': 10, 'teacher_id': 1}, {'group_id': 11, 'teacher_id': 1}, {'group_id': 12, 'teacher_id': 1}]
+    )
+
+    assert conflicting_ids(index, 12, time(10, 30), time(11, 30)) == [1]
+    assert conflicting_ids(index, 12, time(9, 30), time(11)) == [1, 2]
+    assert conflicting_ids(index, 12, time(12), time(13)) == []
+
+
+def test_overlap_after_insertion_in_the_middle():
+    # L'ajout d'un créneau long au milieu de la liste met à jour les fins des suivants
+    index = build_schedule_index(
+        [slot(1, 10, '08:00', '09:00'), slot(2, 10, '10:00', '10:30'), slot(3, 11, '09:00', '18:00')],
+        [{'group_id': 10, 'teacher_id': 1}, {'group_id': 11, 'teacher_id': 1}, {'group_id': 12, 'teacher_id': 1}]
+    )
+
+    assert conflicting_ids(index, 12, time(16), time(17)) == [3]
+    assert conflicting_ids(index, 12, time(8, 30), time(10, 15)) == [1, 2, 3]
+
+
+def test_adjacent_slots_and_other_keys_do_not_conflict():
+    index = build_schedule_index(
+        [slot(1, 10, '08:00', '10:00', classroom_id=5), slot(2, 11, '10:00', '12:00', classroom_id=6, day_of_week='Mardi')],
+        [{'group_id': 10, 'teacher_id': 1}, {'group_id': 11, 'teacher_id': 2}, {'group_id': 12, 'teacher_id': 3}]
+    )
+
+    assert conflicting_ids(index, 12, time(10), time(11), classroom_id=5) == []
+    assert conflicting_ids(index, 12, time(9), time(11), classroom_id=6) == []
+    assert conflicting_ids(index, 12, time(9), time(11), classroom_id=5) == [1]
@@ -1,25 +1,233 @@
 import os
-import streamlit as st
-from supabase import create_client, Client
+import sys
+import threading
+import time
+import httpx
+from supabase import create_client, Client, ClientOptions
 from dotenv import load_dotenv
+from query_monitor import record_query
 
 load_dotenv()
 
-def get_supabase_client() -> Client:
+# Pool HTTP partagé par tout le processus (une seule pile de connexions keep-alive)
+_http_client = None
+_script_client = None
+_registry_lock = threading.Lock()
+_pool_stats = {
+    'clients_created': 0,
+    'clients_reused': 0,
+    'requests': 0,
+    'connections_opened': 0
+}
+
+
+def _count_request(request):
+    """Hook httpx : compte chaque requête et trace l'ouverture des connexions TCP."""
+    with _registry_lock:
+        _pool_stats['requests'] += 1
+
+    def trace(event_name, info):
+        if event_name == 'connection.connect_tcp.complete':
+            with _registry_lock:
+                _pool_stats['connections_opened'] += 1
+
+    request.extensions['trace'] = trace
+
+
+class _InstrumentedTransport(httpx.HTTPTransport):
+    """Transport httpx qui mesure chaque appel (table, filtres, lignes, octets, latence)."""
+
+    def handle_request(self, request):
+        started = time.perf_counter()
+        response = super().handle_request(request)
+        content = response.read()
+        latency_ms = (time.perf_counter() - started) * 1000
+
+        # Content-Range "0-49/1234" ou "*/0" : nombre de lignes renvoyées
+        rows = None
+        returned = response.headers.get('content-range', '').split('/')[0]
+        if returned == '*':
+            rows = 0
+        elif '-' in returned:
+            first, last = returned.split('-')
+            rows = int(last) - int(first) + 1
+
+        path = request.url.path
+        record_query({
+            'method': request.method,
+            'table': path.split('/rest/v1/', 1)[1] if '/rest/v1/' in path else path.lstrip('/'),
+            'filters': '&'.join(f"{k}={v}" for k, v in request.url.params.multi_items() if k != 'select'),
+            'status': response.status_code,
+            'rows': rows,
+            'bytes': len(content),
+            'latency_ms': latency_ms
+        })
+
+        return response
+
+
+def _get_http_client() -> httpx.Client:
+    """Retourne le client httpx partagé, créé au premier appel."""
+    global _http_client
+
+    with _registry_lock:
+        if _http_client is None:
+            _http_client = httpx.Client(
+                transport=_InstrumentedTransport(
+                    http2=True,
+                    limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+                ),
+                follow_redirects=True,
+                timeout=httpx.Timeout(120),
+                event_hooks={'request': [_count_request]}
+            )
+        return _http_client
+
+
+def _streamlit_session():
     """
-    Récupère le client Supabase.
+    Module streamlit si le code s'exécute dans une session Streamlit, sinon None.
+    Les scripts (generate_group_sheets.py et ses processus) n'importent jamais streamlit.
+    """
+    if 'streamlit' not in sys.modules:
+        return None
+
+    import streamlit as st
+    from streamlit import runtime
+    return st if runtime.exists() else None
+
+
+def _get_credentials():
+    """
+    Lit l'URL et la clé Supabase.
     Lit depuis secrets.toml (Streamlit Cloud) ou .env (local)
     """
     # Essayer d'abord depuis Streamlit secrets (pour Streamlit Cloud)
-    if hasattr(st, 'secrets') and 'SUPABASE_URL' in st.secrets:
+    st = _streamlit_session()
+    if st and 'SUPABASE_URL' in st.secrets:
         url = st.secrets["SUPABASE_URL"]
         key = st.secrets["SUPABASE_KEY"]
     else:
-        # Sinon, lire depuis .env (pour développement local)
+        # Sinon, lire depuis .env (pour développement local et scripts)
         url = os.getenv("SUPABASE_URL")
         key = os.getenv("SUPABASE_KEY")
 
-    return create_client(url, key)
+    if not url or not key:
+        raise ValueError("SUPABASE_URL et SUPABASE_KEY doivent être définis dans .env ou secrets.toml")
+
+    return url, key
+
+
+def _new_client() -> Client:
+    """Crée un client Supabase branché sur le pool HTTP partagé."""
+    url, key = _get_credentials()
+    options = ClientOptions(httpx_client=_get_http_client())
+
+    with _registry_lock:
+        _pool_stats['clients_created'] += 1
+
+    return create_client(url, key, options)
+
+
+def get_supabase_client() -> Client:
+    """
+    Récupère le client Supabase.
+
+    Toutes les instances partagent le même pool de connexions HTTP du processus.
+    Dans Streamlit, chaque session a son propre client (l'état d'authentification
+    n'est donc jamais partagé entre utilisateurs) ; hors Streamlit (scripts),
+    un seul client est utilisé pour tout le processus.
+    """
+    global _script_client
+
+    st = _streamlit_session()
+    if st:
+        client = st.session_state.get('_supabase_client')
+        if client is None:
+            client = _new_client()
+            st.session_state['_supabase_client'] = client
+            return client
+    else:
+        with _registry_lock:
+            client = _script_client
+        if client is None:
+            client = _new_client()
+            with _registry_lock:
+                _script_client = client
+            return client
+
+    with _registry_lock:
+        _pool_stats['clients_reused'] += 1
+    return client
+
+
+def get_connection_stats():
+    """
+    Retourne les compteurs du pool de connexions.
+
+    Returns:
+        dict: clients créés/réutilisés, requêtes HTTP envoyées,
+              connexions TCP ouvertes et requêtes servies par une connexion réutilisée
+    """
+    with _registry_lock:
+        stats = dict(_pool_stats)
+
+    stats['connections_reused'] = stats['requests'] - stats['connections_opened']
+    return stats
+
+
+def fetch_all_rows(build_query, page_size=1000):
+    """
+    Exécute une requête select en paginant avec range().
+
+    Le serveur peut renvoyer moins de lignes que demandé (max-rows de PostgREST inférieur
+    à page_size) : une page courte ne signifie donc pas la fin. Avec count='exact' dans le
+    select, le total de Content-Range indique la dernière page sans requête supplémentaire ;
+    sans count, seule une page vide l'indique.
+
+    Args:
+        build_query: Fonction sans argument qui retourne une nouvelle requête (avec un order()
+                     stable, et de préférence count='exact')
+        page_size: Nombre de lignes demandées par page
+
+    Returns:
+        list: Toutes les lignes
+    """
+    rows = []
+    start = 0
+
+    while True:
+        response = build_query().range(start, start + page_size - 1).execute()
+        if not response.data:
+            return rows
+
+        rows.extend(response.data)
+        start += len(response.data)
+        if response.count is not None and start >= response.count:
+            return rows
+
+
+def fetch_rows_in(build_query, column, values, chunk_size=200):
+    """
+    Exécute une requête filtrée par in_(column, values) par paquets pour garder des URLs courtes.
+
+    Args:
+        build_query: Fonction sans argument qui retourne une nouvelle requête (avec un order() stable)
+        column: Colonne filtrée
+        values: Valeurs recherchées
+        chunk_size: Nombre de valeurs par requête
+
+    Returns:
+        list: Toutes les lignes
+    """
+    values = list(dict.fromkeys(values))
+    rows = []
+
+    for i in range(0, len(values), chunk_size):
+        chunk = values[i:i + chunk_size]
+        rows.extend(fetch_all_rows(lambda: build_query().in_(column, chunk)))
+
+    return rows
 
 
 def get_current_academic_year():
@@ -30,12 +238,14 @@ def get_current_academic_year():
         dict: Dictionnaire contenant id, year_label, prefix de l'année active
         None: Si aucune année académique active n'est trouvée
     """
+    # Import local : cache dépend lui-même de utils
+    from cache import get_reference_data
+
     try:
-        supabase = get_supabase_client()
-        response = supabase.table('academic_years').select('*').eq('is_current', True).execute()
+        current_years = [year for year in get_reference_data('academic_years') if year.get('is_current')]
 
-        if response.data and len(response.data) > 0:
-            year_data = response.data[0]
+        if current_years:
+            year_data = current_years[0]
             # Vérifier que toutes les données nécessaires sont présentes
             if year_data.get('id') and year_data.get('year_label') and year_data.get('prefix'):
                 return year_data
@@ -49,4 +259,34 @@ def get_current_academic_year():
         print(f"Erreur lors de la récupération de l'année académique: {str(e)}")
         import traceback
         traceback.print_exc()
-        return None
\ No newline at end of file
+        return None
+
+
+def get_cash_position():
+    """
+    Récupère la position de caisse courante (table cash_position maintenue par triggers).
+
+    Returns:
+        dict: current_amount (montant laissé à la dernière signature + paiements liquides depuis),
+              amount_left, last_reset_id, last_reset_date, last_reset_by,
+              cash_since_reset, cash_count_since_reset, online_since_reset, online_count_since_reset
+    """
+    supabase = get_supabase_client()
+    response = supabase.table('cash_position').select('*').eq('id', 1).execute()
+
+    if response.data:
+        position = response.data[0]
+    else:
+        position = {
+            'last_reset_id': None,
+            'last_reset_date': None,
+            'last_reset_by': None,
+            'amount_left': 0,
+            'cash_since_reset': 0,
+            'cash_count_since_reset': 0,
+            'online_since_reset': 0,
+            'online_count_since_reset': 0
+        }
+
+    position['current_amount'] = (position.get('amount_left') or 0) + (position.get('cash_since_reset') or 0)
+    return position